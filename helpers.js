@@ -375,8 +375,6 @@ let markersLayer = {};
 let currentMarkers = [];
 let arrowsLayer = {};
 let currentArrows = [];
-// Data is fetched only once
-let cachedCsvData = null; // Variable to store the data
 let eventsLayer = {};
 let currentEvents = [];
 // Events data fetch (cached single fetch like kehilot)
@@ -511,73 +509,158 @@ async function loadHistoricalArrows() {
     }
 }
 
-async function loadData(year) {
-    try {
-        // Check if data is already loaded
-    //    if (!cachedCsvData) {
-    //        console.log("Fetching data for the first time...");
-    //        const response = await fetch('kehilot.csv');
-    //        cachedCsvData = await response.text(); //  Store the data
-    //        console.log("Data fetched and cached.");
-    //        }
-       console.log("Requesting data...");
-         const csvData = await getData(); // This will only fetch the first time
-         const csvText = csvData;
+// Parse the rows of kehilot.csv into typed records (actual_pop is computed per year)
+function parseKehilotCsv(csvText) {
+    const rows = csvText.split('\n').slice(1); // Skip header
+    return rows
+        .filter(row => row.trim()) // Skip empty rows
+        .map(row => {
+            const [
+                country, city, long, lat, year_estab, year_start, year_end,
+                pop_start, pop_end, probability, type, symbol,
+                city_english, city_hebrew, city_yid, city_german,
+                city_other, source, comment
+            ] = parseCSVLine(row).slice(0, 19);
+
+            // If year_end is empty, the community is still active
+            const actualYearEnd = year_end == undefined || year_end.trim() === '' ? undefined : parseInt(year_end);
+            const actualPopEnd = pop_end == undefined || pop_end.trim() === '' ? parseInt(pop_start) : parseInt(pop_end);
+
+            return {
+                name: city, // Fallback to city if English name not available
+                name_he: city_hebrew,
+                lat: lat,
+                lon: long,
+                year_estab: parseInt(year_estab),
+                year_start: parseInt(year_start),
+                year_end: actualYearEnd,
+                population_start: parseInt(pop_start),
+                population_end: actualPopEnd,
+                confidence: probability, // Using probability as confidence indicator
+                type: parseInt(type),
+                symbol: parseInt(symbol),
+                country,
+                names: {
+                    english: city_english,
+                    yiddish: city_yid,
+                    german: city_german,
+                    other: city_other
+                },
+                source: source ? source.replace(/"/g, '') : '', // Remove quotes from source, handle undefined
+                comment
+            };
+        });
+}
 
-        // Parse CSV
-        const rows = csvText.split('\n').slice(1); // Skip header
-        const kehilot = rows
-            .filter(row => row.trim()) // Skip empty rows
-            .map(row => {
-                const [
-                    country, city, long, lat, year_estab, year_start, year_end,
-                    pop_start, pop_end, probability, type, symbol,
-                    city_english, city_hebrew, city_yid, city_german,
-                    city_other, source, comment
-                ] = parseCSVLine(row).slice(0, 19);
+// kehilot.csv parsed once, used when the shards are not available
+const getCsvKehilot = (() => {
+    let kehilotPromise = null;
+    return async () => {
+        if (!kehilotPromise) {
+            kehilotPromise = getData().then(parseKehilotCsv);
+        }
+        return kehilotPromise;
+    };
+})();
 
+// Shards of kehilot.csv by the century of year_start, built by utils/build_shards.py
+const SHARD_NUMBER_FIELDS = ['year_estab', 'year_start', 'population_start', 'population_end', 'type', 'symbol'];
 
-                // If year_end is empty, use current year
-                const actualYearEnd = year_end == undefined || year_end.trim() === '' ? undefined : parseInt(year_end);
-                const actualPopEnd = pop_end == undefined || pop_end.trim() === '' ? parseInt(pop_start) : parseInt(pop_end);
-                if (actualYearEnd == undefined) {
-                    actualPop = parseInt(pop_start);
-                } else {    
-                    const year_start_int = parseInt(year_start);
-                    const years_span = actualYearEnd - year_start_int;
-                    var actualPop = Math.floor(((actualYearEnd - year)*parseInt(pop_start) + (year - year_start_int)*actualPopEnd)/years_span);
+// Size of kehilot.csv as served, or null when the server does not say (or sends it compressed)
+function getCsvSize() {
+    return fetch('kehilot.csv', { method: 'HEAD' })
+        .then(response => {
+            const length = response.headers.get('Content-Length');
+            return response.ok && length !== null && !response.headers.get('Content-Encoding') ? Number(length) : null;
+        })
+        .catch(() => null);
+}
+
+// The manifest, or null when it is missing or was built from a kehilot.csv of another size (edited since);
+// edits that keep the size are caught before deployment by build_shards.py --check in CI
+const getShardManifest = (() => {
+    let manifestPromise = null;
+    return async () => {
+        if (!manifestPromise) {
+            manifestPromise = Promise.all([
+                fetch('shards/manifest.json').then(response => response.ok ? response.json() : null).catch(() => null),
+                getCsvSize()
+            ]).then(([manifest, csvSize]) => {
+                if (manifest && csvSize !== null && manifest.source_size !== csvSize) {
+                    console.warn('Kehilot shards are out of date, using kehilot.csv');
+                    return null;
                 }
-                
-                return {
-                    name: city, // Fallback to city if English name not available
-                    name_he: city_hebrew,
-                    lat: lat,
-                    lon: long,
-                    year_estab: parseInt(year_estab),
-                    year_start: parseInt(year_start),
-                    year_end: actualYearEnd,
-                    population_start: parseInt(pop_start),
-                    population_end: actualPopEnd,
-                    actual_pop: actualPop,
-                    confidence: probability, // Using probability as confidence indicator
-                    type: parseInt(type),
-                    symbol: parseInt(symbol),
-                    country,
-                    names: {
-                        english: city_english,
-                        yiddish: city_yid,
-                        german: city_german,
-                        other: city_other
-                    },
-                    source: source ? source.replace(/"/g, '') : '', // Remove quotes from source, handle undefined
-                    comment
-                };
+                return manifest;
             });
+        }
+        return manifestPromise;
+    };
+})();
 
-        // Filter data based on the given year
-        const relevantKehilot = kehilot.filter(kehila =>
-            kehila.year_start <= year && (kehila.year_end === undefined || kehila.year_end >= year)
+const shardPromises = {};
+function getShard(shard) {
+    if (!shardPromises[shard.file]) {
+        shardPromises[shard.file] = fetch(`shards/${shard.file}`).then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        }).then(records => {
+            records.forEach(kehila => {
+                SHARD_NUMBER_FIELDS.forEach(field => {
+                    if (kehila[field] === null) kehila[field] = NaN; // JSON has no NaN
+                });
+            });
+            return records;
+        }).catch(error => {
+            delete shardPromises[shard.file]; // Try again next time
+            throw error;
+        });
+    }
+    return shardPromises[shard.file];
+}
+
+// Records that may be active in a year: those of the shards that started before it and still have a community
+async function getKehilotCandidates(year) {
+    const manifest = await getShardManifest();
+    if (manifest) {
+        const shards = manifest.shards.filter(shard =>
+            shard.start <= year && (shard.latest_end === null || shard.latest_end >= year)
         );
+        try {
+            return (await Promise.all(shards.map(getShard))).flat();
+        } catch (error) {
+            console.error('Error loading kehilot shards, using kehilot.csv:', error);
+        }
+    }
+    return getCsvKehilot();
+}
+
+// Population in a year, interpolated between pop_start and pop_end
+function actualPopulation(kehila, year) {
+    if (kehila.year_end == undefined) {
+        return kehila.population_start;
+    }
+    const years_span = kehila.year_end - kehila.year_start;
+    return Math.floor(((kehila.year_end - year)*kehila.population_start + (year - kehila.year_start)*kehila.population_end)/years_span);
+}
+
+let latestDataYear = null; // Year of the last loadData call, so a slower earlier one does not overwrite it
+
+async function loadData(year) {
+    latestDataYear = year;
+    try {
+        const kehilot = await getKehilotCandidates(year);
+        if (year !== latestDataYear) {
+            return;
+        }
+
+        // Filter data based on the given year
+        const relevantKehilot = kehilot
+            .filter(kehila =>
+                kehila.year_start <= year && (kehila.year_end === undefined || kehila.year_end >= year)
+            )
+            .map(kehila => ({ ...kehila, actual_pop: actualPopulation(kehila, year) }));
 
         updateMarkers(relevantKehilot);
     } catch (error) {
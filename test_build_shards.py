@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+import build_shards as shards_module
+from build_shards import (SHARDS_DIR, MANIFEST_NAME, build_shards, js_parse_int, parse_csv_line, refresh_shards,
+                          source_hash, stale_shards)
+from dataset import KEHILOT_PATH
+
+
+def test_rows_are_parsed_like_helpers_js():
+    assert parse_csv_line('a,"b,c",d""e') == ['a', 'b,c', 'de']
+    assert [js_parse_int(text) for text in [' -1300', '34500 ', '000', '12abc', '0x1A', '?', '', 'NA']] == \
+        [-1300, 34500, 0, 12, 26, None, None, None]
+
+    header = 'country,city,long,lat,year_estab,year_start,year_end,pop_start,pop_end\n'
+    rows = ['Egypt,Elephantine,32.8,24.0,-650,-650,-550,100,\r',
+            'Poland,Lublin,22.5,51,?,1317,,200,300',
+            'Poland,Nowhere,22,51,,1500,NA,1,1',  # parseInt('NA') is NaN: never shown
+            'Poland,Krakow,19.9,50,,?,,1,1']  # No year_start: never shown
+    manifest, files = build_shards(header + '\n'.join(rows) + '\n\n', bucket_years=100)
+    assert [(shard['start'], shard['count'], shard['latest_end']) for shard in manifest['shards']] == \
+        [(-700, 1, -550), (1300, 1, None)]
+    egypt, = files['kehilot_-700.json']
+    assert egypt['population_end'] == 100 and egypt['year_estab'] == -650  # Empty pop_end: pop_start
+    lublin, = files['kehilot_1300.json']
+    assert 'year_end' not in lublin and lublin['year_estab'] is None and lublin['lat'] == '51'
+
+
+def test_shards_are_up_to_date_with_kehilot_csv():
+    with open(os.path.join(SHARDS_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert manifest['source_hash'] == source_hash(KEHILOT_PATH), "Run utils/build_shards.py"
+    assert manifest['source_size'] == os.path.getsize(KEHILOT_PATH)
+    assert stale_shards() == [], "Run utils/build_shards.py"
+
+
+def test_writing_kehilot_csv_rebuilds_the_shards(tmp_path, monkeypatch):
+    path = tmp_path / 'kehilot.csv'
+    path.write_text('country,city,long,lat,year_estab,year_start\nPoland,Lublin,22,51,,1316\n', encoding='utf-8')
+    output = str(tmp_path / 'shards')
+    assert refresh_shards(str(path), output) is None  # Not the project's kehilot.csv
+    monkeypatch.setattr(shards_module, 'KEHILOT_PATH', str(path))
+    manifest = refresh_shards(str(path), output)
+    assert manifest['source_size'] == path.stat().st_size
+    assert sorted(os.listdir(output)) == ['kehilot_1300.json', MANIFEST_NAME]
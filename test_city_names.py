@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from city_names import CityNamesLookup
+from http_client import HttpClient
+
+PAGE = """<html><body>
+<p>{city} is a city.</p>
+<div id="p-lang"><ul>
+<li class="interlanguage-link"><a href="https://de.wikipedia.org/wiki/{city}" title="{city}stadt – Deutsch" lang="de">Deutsch</a></li>
+<li class="interlanguage-link"><a href="https://he.wikipedia.org/wiki/x" title="עיר – עברית" lang="he">עברית</a></li>
+</ul></div>
+</body></html>"""
+
+
+class WikiStandIn(BaseHTTPRequestHandler):
+    """Serves a fake English Wikipedia article for any city, slowly"""
+    hits = {}
+    delay = 0.3
+
+    def do_GET(self):
+        WikiStandIn.hits[self.path] = WikiStandIn.hits.get(self.path, 0) + 1
+        time.sleep(self.delay)
+        city = self.path.rsplit('/', 1)[-1]
+        body = PAGE.format(city=city).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Shape of a recorded en.wikipedia.org langlinks response (formatversion=2), trimmed
+RECORDED_LANGLINKS = {
+    "batchcomplete": True,
+    "query": {
+        "normalized": [{"fromencoded": False, "from": "prague", "to": "Prague"}],
+        "redirects": [{"from": "Lemberg", "to": "Lviv"}],
+        "pages": [
+            {"pageid": 23597, "ns": 0, "title": "Prague", "langlinks": [
+                {"lang": "cs", "title": "Praha"},
+                {"lang": "de", "title": "Prag"},
+                {"lang": "he", "title": "פראג"},
+                {"lang": "pl", "title": "Praga"},
+                {"lang": "yi", "title": "פראג"}]},
+            {"pageid": 18297, "ns": 0, "title": "Lviv", "langlinks": [
+                {"lang": "de", "title": "Lwiw"},
+                {"lang": "he", "title": "לבוב"},
+                {"lang": "uk", "title": "Львів"},
+                {"lang": "yi", "title": "לעמבערג"}]},
+            {"ns": 0, "title": "Atlantis Minor", "missing": True},
+            {"pageid": 99, "ns": 0, "title": "Quiet Town"},
+        ]
+    }
+}
+
+
+class ApiStandIn(WikiStandIn):
+    """Answers langlinks queries with the recorded response and scrapes like WikiStandIn"""
+    queries = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/w/api.php':
+            return WikiStandIn.do_GET(self)
+        ApiStandIn.queries.append(parse_qs(url.query)['titles'][0].split('|'))
+        body = json.dumps(RECORDED_LANGLINKS).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(handler=WikiStandIn):
+    WikiStandIn.hits = {}
+    ApiStandIn.queries = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_prefetch_runs_misses_in_parallel(tmp_path):
+    server, base_url = start_server()
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), max_workers=10, wiki_base_url=base_url + '/wiki/',
+                              use_api=False)
+    try:
+        cities = [(f'Town{i}', 'Poland') for i in range(10)]
+        start = time.perf_counter()
+        lookup.prefetch(cities)
+        assert time.perf_counter() - start < 10 * WikiStandIn.delay / 2
+
+        names = lookup.get_city_names('Town3', 'Poland')
+        assert names['german'] == 'Town3stadt'
+        assert names['hebrew'] == 'עיר'
+        assert sum(WikiStandIn.hits.values()) == 10
+    finally:
+        lookup.close()
+        server.shutdown()
+
+
+def test_concurrent_requests_for_one_key_fetch_once(tmp_path):
+    server, base_url = start_server()
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), max_workers=4, wiki_base_url=base_url + '/wiki/',
+                              use_api=False)
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(lookup.get_city_names('Lublin', 'Poland')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert WikiStandIn.hits == {'/wiki/Lublin': 1}
+        assert len(results) == 8
+        assert all(names['german'] == 'Lublinstadt' for names in results)
+    finally:
+        lookup.close()
+        server.shutdown()
+
+
+def test_langlinks_api_batches_titles_and_falls_back_to_pages(tmp_path):
+    server, base_url = start_server(ApiStandIn)
+    WikiStandIn.delay = 0
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), wiki_base_url=base_url + '/wiki/',
+                             api_url=base_url + '/w/api.php')
+    try:
+        cities = [('prague', 'Czech Republic'), ('Lemberg', 'Ukraine'), ('Atlantis Minor', 'Greece'),
+                  ('Quiet Town', 'Poland')] + [(f'Town{i}', 'Poland') for i in range(56)]
+        lookup.prefetch(cities)
+
+        assert sorted(len(titles) for titles in ApiStandIn.queries) == [10, 50]
+        assert lookup.get_city_names('prague', 'Czech Republic') == {
+            'english': 'prague', 'hebrew': 'פראג', 'yiddish': 'פראג', 'german': 'Prag', 'other': 'Praha'}
+        assert lookup.get_city_names('Lemberg', 'Ukraine')['yiddish'] == 'לעמבערג'
+        # Missing articles are not scraped, pages without links are
+        assert '/wiki/Atlantis_Minor' not in WikiStandIn.hits
+        assert lookup.get_city_names('Quiet Town', 'Poland')['german'] == 'Quiet_Townstadt'
+        assert len(ApiStandIn.queries) == 2
+    finally:
+        WikiStandIn.delay = 0.3
+        lookup.close()
+        server.shutdown()
+
+
+def test_json_cache_is_migrated_once_into_the_store(tmp_path):
+    cache_file = tmp_path / 'cache.json'
+    cache_file.write_text(json.dumps({'prague|czech republic': {
+        'english': 'Prague', 'hebrew': 'פראג', 'yiddish': 'פראג', 'german': 'Prag', 'other': 'Praha'}}),
+        encoding='utf-8')
+    lookup = CityNamesLookup(str(cache_file), online=False)
+    assert lookup.get_city_names('Prague', 'Czech Republic')['other'] == 'Praha'
+    lookup.get_city_names('Vienna', 'Austria')
+    lookup.close()
+
+    cache_file.unlink()  # Later sessions only need the store
+    reopened = CityNamesLookup(str(cache_file), online=False)
+    assert len(reopened.store) == 2
+    assert reopened.get_city_names('Vienna', 'Austria')['german'] == 'Wien'
+    reopened.close()
+
+
+class FlakyWikiStandIn(WikiStandIn):
+    """Fails with 500 until told otherwise, and has no article for 'Nowhere'"""
+    failing = True
+
+    def do_GET(self):
+        status = 404 if self.path.endswith('/Nowhere') else 500 if FlakyWikiStandIn.failing else None
+        if status is None:
+            return WikiStandIn.do_GET(self)
+        WikiStandIn.hits[self.path] = WikiStandIn.hits.get(self.path, 0) + 1
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def test_errors_expire_quickly_and_misses_are_kept(tmp_path):
+    server, base_url = start_server(FlakyWikiStandIn)
+    WikiStandIn.delay = 0
+    FlakyWikiStandIn.failing = True
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), wiki_base_url=base_url + '/wiki/', use_api=False,
+                             error_ttl=0.2, http_client=HttpClient(max_retries=0))
+    try:
+        assert lookup.get_city_names('Lublin', 'Poland')['german'] == ''
+        assert lookup.get_city_names('Nowhere', 'Poland')['german'] == ''
+        lookup.get_city_names('Lublin', 'Poland')  # Still within the error TTL
+        assert WikiStandIn.hits == {'/wiki/Lublin': 1, '/wiki/Nowhere': 1}
+
+        FlakyWikiStandIn.failing = False
+        time.sleep(0.3)
+        assert lookup.get_city_names('Lublin', 'Poland')['german'] == 'Lublinstadt'
+        lookup.get_city_names('Nowhere', 'Poland')  # A confirmed miss is not retried
+        assert WikiStandIn.hits == {'/wiki/Lublin': 2, '/wiki/Nowhere': 1}
+        assert lookup.store.get('nowhere|poland').status == 'miss'
+    finally:
+        WikiStandIn.delay = 0.3
+        lookup.close()
+        server.shutdown()
+
+
+def test_memory_tier_keeps_recent_entries_only(tmp_path):
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), online=False, memory_cache_size=3)
+    for city in ['Vienna', 'Paris', 'Rome', 'Berlin', 'London']:
+        lookup.get_city_names(city, 'Europe')
+    assert list(lookup.city_names_cache) == ['rome|europe', 'berlin|europe', 'london|europe']
+    assert lookup.get_city_names('Vienna', 'Europe')['german'] == 'Wien'  # Read back from the store
+    lookup.close()
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from city_names import CityNamesLookup
+from conversion_job import ConversionJob, PROGRESS, DONE, CANCELLED
+from kehilot_converter import convert_rows
+from test_city_names import WikiStandIn, start_server
+
+
+def input_rows(cities):
+    return [['Poland', city, '22.5', '51.2', '1500', '1900', '100', '', 'test'] for city in cities]
+
+
+def run_job(job, lookup, rows):
+    try:
+        job.finish(convert_rows(rows, lookup.get_city_names, job.report, prefetch=lookup.prefetch,
+                                cancelled=lambda: job.cancelled))
+    except Exception as e:
+        job.fail(str(e))
+
+
+def test_progress_is_coalesced_and_reports_hit_ratio(tmp_path):
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), online=False)
+    lookup.get_city_names('Vienna', 'Poland')  # Cached before the job
+    job = ConversionJob(lookup, progress_interval=60)
+    run_job(job, lookup, input_rows(['Vienna', 'Paris', 'Rome', 'Berlin']))
+    lookup.close()
+
+    messages = job.drain()
+    assert [kind for kind, _ in messages] == [PROGRESS, DONE]
+    assert messages[0][1] == (4, 4)
+    assert len(messages[1][1]) == 4
+    assert job.hit_ratio() == 0.25
+    assert job.status_text().startswith('Converting line 4/4 - ')
+
+
+def test_cancel_stops_waiting_for_pending_lookups(tmp_path):
+    server, base_url = start_server()
+    lookup = CityNamesLookup(str(tmp_path / 'cache.json'), max_workers=2, wiki_base_url=base_url + '/wiki/',
+                             use_api=False)
+    job = ConversionJob(lookup)
+    worker = threading.Thread(target=run_job, args=(job, lookup, input_rows([f'Town{i}' for i in range(40)])))
+    try:
+        worker.start()
+        time.sleep(WikiStandIn.delay / 2)
+        start = time.perf_counter()
+        job.cancel()
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+        assert time.perf_counter() - start < WikiStandIn.delay * 2  # Not 20 rounds of lookups
+        assert [kind for kind, _ in job.drain()][-1] == CANCELLED
+        assert sum(WikiStandIn.hits.values()) <= 4
+    finally:
+        lookup.close()
+        server.shutdown()
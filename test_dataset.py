@@ -0,0 +1,90 @@
+import os
+import sys
+import csv
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from dataset import KehilotDataset, KEHILOT_PATH
+from export import export_string
+
+HEADER = 'country,city,long,lat,year_estab,year_start,year_end,pop_start,pop_end,probability,comment\n'
+
+
+def load(text):
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8-sig', delete=False) as f:
+        f.write(text)
+    try:
+        return KehilotDataset.load(f.name)
+    finally:
+        os.remove(f.name)
+
+
+def test_typed_columns_keep_the_original_text():
+    rows = [['Egypt', 'Elephantine', '32.8870', '24.0855', '-650', '-650', '-550', '100', '200', 'high', 'a'],
+            ['Poland', 'Lublin', '22.5', '51', '?', ' -1300', '', '34500 ', '000', '', 'b'],
+            ['Poland', 'Krakow', '19.9', '50.06', '1300', '1800', '', '', 'NA', 'medium', 'c,d']]
+    dataset = load(HEADER + ''.join(','.join(f'"{cell}"' for cell in row) + '\n' for row in rows))
+    assert [dataset.text_row(row) for row in range(len(dataset))] == rows
+    assert dataset.column('year_start')[0] == -650 and dataset.column('year_start')[1] == -1300
+    assert dataset.column('year_estab')[1] is None and dataset.column('long')[0] == 32.887
+    assert dataset.column('probability').categories == ['high', '', 'medium']
+
+    assert dataset.select(dataset.equals('country', 'Poland')) == [1, 2]
+    assert dataset.select(dataset.active_in(1900)) == [1, 2]  # No year_end: still active
+    assert dataset.select(dataset.between('lat', 50, 52), dataset.equals('probability', 'medium')) == [2]
+
+
+def test_kehilot_csv_uses_a_fraction_of_the_memory_of_dict_rows():
+    tracemalloc.start()
+    with open(KEHILOT_PATH, encoding='utf-8-sig', newline='') as f:
+        dict_rows = list(csv.DictReader(f))
+    dict_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    dataset = KehilotDataset.load()
+    dataset_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(dataset) == len(dict_rows)
+    assert dict_memory > 5 * dataset_memory
+
+
+def test_compact_file_round_trip_and_group_by_codes():
+    dataset = KehilotDataset.load()
+    fd, path = tempfile.mkstemp(suffix='.kds')
+    os.close(fd)
+    try:
+        dataset.save(path)
+        assert os.path.getsize(path) < os.path.getsize(KEHILOT_PATH)
+        compact = KehilotDataset.read(path)
+    finally:
+        os.remove(path)
+    assert len(compact) == len(dataset)
+    assert all(compact.text_row(row) == dataset.text_row(row) for row in range(len(dataset)))
+    assert compact.column('country').codes.typecode == 'B'  # About a hundred countries fit in a byte
+
+    counts = compact.count_by('country')
+    assert sum(counts.values()) == len(dataset)
+    polish = compact.group_by('country')['Poland']
+    assert len(polish) == counts['Poland']
+    assert compact.count_by('city', rows=polish) == dataset.count_by('city', rows=dataset.select(
+        dataset.equals('country', 'Poland')))
+
+
+def test_text_rows_reproduce_kehilot_csv_including_ragged_rows():
+    with open(KEHILOT_PATH, encoding='utf-8-sig', newline='') as f:
+        header, *rows = [row for row in csv.reader(f) if row]
+    dataset = KehilotDataset.load()
+    assert any(len(row) > len(header) for row in rows) and any(len(row) < len(header) for row in rows)
+    assert list(dataset.text_rows()) == rows
+
+    fd, path = tempfile.mkstemp(suffix='.kds')
+    os.close(fd)
+    try:
+        dataset.save(path)
+        assert list(KehilotDataset.read(path).text_rows()) == rows
+    finally:
+        os.remove(path)
+    written = export_string(dataset.text_rows(), dataset.columns)
+    assert list(csv.reader(written.splitlines()[1:])) == rows  # Short rows get no trailing commas
@@ -0,0 +1,81 @@
+import os
+import sys
+import csv
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from row_model import RowModel
+from edit_journal import EditJournal, CsvPatcher, record_offsets
+from file_loader import FileLoader, ROWS
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CONTENT = ('\ufeffcountry,city,comment\r\n'
+           'Poland,Lublin,"Two\r\nlines, with a comma"\r\n'
+           'Poland,Krakow,\r\n'
+           'Czech Republic,Prague,last').encode('utf-8')
+
+
+def test_undo_redo_and_changed_rows():
+    model = RowModel(['city', 'comment'], [['Lublin', ''], ['Krakow', '']])
+    journal = EditJournal(model)
+    journal.edit(0, 1, 'first')
+    journal.edit(0, 1, 'second')
+    assert journal.edit(1, 0, 'Krakow') is None  # Unchanged cells are not logged
+    assert journal.undo().new == 'second' and model.get_cell(0, 1) == 'first'
+    assert journal.redo().new == 'second' and model.get_cell(0, 1) == 'second'
+    journal.undo()
+    journal.edit(1, 1, 'other')  # A new edit drops what could be redone
+    assert journal.redo() is None
+    assert journal.changed_rows == {0, 1}
+    model.reset([['Prague', '']])
+    assert journal.undo() is None and not journal.changed_rows
+
+
+def test_patch_replaces_only_the_changed_rows():
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+        f.write(CONTENT)
+    try:
+        patcher = CsvPatcher(f.name, encoding='utf-8-sig')
+        patcher.patch({0: ['Poland', 'Lublin', 'one line']})
+        patcher.patch({1: ['Poland', 'Kraków', 'with "quotes"'], 2: ['Czech Republic', 'Prague', 'end']})
+        with open(f.name, 'rb') as patched:
+            data = patched.read()
+        assert data == ('\ufeffcountry,city,comment\r\n'
+                        'Poland,Lublin,one line\r\n'
+                        'Poland,Kraków,"with ""quotes"""\r\n'
+                        'Czech Republic,Prague,end').encode('utf-8')
+        with open(f.name, encoding='utf-8-sig', newline='') as patched:
+            assert list(csv.reader(patched))[2] == ['Poland', 'Kraków', 'with "quotes"']
+
+        with open(f.name, 'ab') as other_program:
+            other_program.write(b'\r\nPoland,Lodz,')
+        try:
+            patcher.patch({0: ['Poland', 'Lublin', '']})
+            assert False, "a file changed on disk must not be patched"
+        except ValueError:
+            pass
+    finally:
+        os.remove(f.name)
+
+
+def test_late_row_of_kehilot_csv_is_patched_into_its_own_record(tmp_path):
+    # kehilot.csv has a '"' inside an unquoted field (כפר מל"ל) long before this row
+    path = str(tmp_path / 'kehilot.csv')
+    shutil.copy(os.path.join(PROJECT_DIR, 'kehilot.csv'), path)
+    loader = FileLoader(path)
+    rows = loader.open()
+    loader.start().join(10)
+    rows.extend(cells for kind, value in loader.drain() if kind == ROWS for cells in value)
+    assert loader.offsets == record_offsets(path)
+    assert len(loader.offsets) == len(rows) + 1
+
+    edited = rows[3001][:]
+    edited[7] = '12345'
+    CsvPatcher(path, encoding=loader.encoding, offsets=loader.offsets).patch({3000: edited})
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        patched = list(csv.reader(f))
+    assert patched[3001] == edited
+    assert patched[:3001] == rows[:3001] and patched[3002:] == rows[3002:]
@@ -0,0 +1,36 @@
+import os
+import sys
+import csv
+import io
+import json
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from kehilot_converter import KEHILOT_COLUMNS
+from export import export_file, export_string
+
+ROW = ['Poland', 'Lublin', '22.5667', '51.25', '1316', '1316', '1336', '', '', 'high', '1', '1',
+       'Lublin', 'לובלין', '', 'Lublin', '', 'https://example.org', 'Invited by "Kazimierz", the Great\nsecond line']
+
+
+def test_csv_quotes_commas_quotes_and_newlines():
+    text = export_string([ROW])
+    assert text.startswith(','.join(KEHILOT_COLUMNS) + '\r\n')
+    assert list(csv.reader(io.StringIO(text))) == [KEHILOT_COLUMNS, ROW]
+
+
+def test_json_and_ndjson_files_share_the_columns():
+    directory = tempfile.mkdtemp()
+    short_row = ROW[:5]  # Missing cells are exported empty
+    json_path = os.path.join(directory, 'out.json')
+    ndjson_path = os.path.join(directory, 'out.ndjson')
+    export_file(json_path, [ROW, short_row])
+    export_file(ndjson_path, [ROW, {'city': 'Prague'}])
+    with open(json_path, encoding='utf-8') as f:
+        objects = json.load(f)
+    assert objects[0] == dict(zip(KEHILOT_COLUMNS, ROW))
+    assert objects[1]['country'] == 'Poland' and objects[1]['comment'] == ''
+    with open(ndjson_path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 2 and lines[1]['city'] == 'Prague' and list(lines[1]) == KEHILOT_COLUMNS
@@ -0,0 +1,75 @@
+import os
+import sys
+import codecs
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from file_loader import FileLoader, ROWS, RELOAD, DONE
+
+
+def load(data, **kwargs):
+    """Load a file with the given bytes; returns (loader, all rows, kinds of the messages)"""
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+        f.write(data)
+    try:
+        loader = FileLoader(f.name, **kwargs)
+        rows = loader.open()
+        loader.start().join(5)
+        messages = loader.drain()
+        for kind, value in messages:
+            if kind == RELOAD:
+                rows = list(value)
+            elif kind == ROWS:
+                rows.extend(value)
+        assert messages[-1] == (DONE, len(rows))
+        return loader, rows, [kind for kind, value in messages]
+    finally:
+        os.remove(f.name)
+
+
+def test_bom_is_stripped_and_delimiter_sniffed():
+    loader, rows, kinds = load(codecs.BOM_UTF8 + 'city;year\nלבוב;1900\n'.encode('utf-8'))
+    assert loader.delimiter == ';'
+    assert rows == [['city', 'year'], ['לבוב', '1900']]
+
+
+def test_non_utf8_falls_back_to_hebrew_windows():
+    loader, rows, kinds = load('עיר\tשנה\nלבוב\t1900\n'.encode('cp1255'))
+    assert loader.encoding == 'cp1255'
+    assert loader.delimiter == '\t'
+    assert rows[1] == ['לבוב', '1900']
+
+
+def test_legacy_bytes_past_the_first_chunk_are_not_replaced():
+    data = 'city,year\n'.encode('utf-8') + b'Lviv,1900\n' * 10000 + 'לבוב,1900\n'.encode('cp1255')
+    loader, rows, kinds = load(data)
+    assert RELOAD in kinds  # Found by the loading thread, not by open()
+    assert loader.encoding == 'cp1255'
+    assert len(rows) == 10002 and rows[-1] == ['לבוב', '1900']
+    assert loader.offsets[-1] == len(data)
+
+
+def test_legacy_bytes_within_the_first_rows_are_read_in_the_fallback_encoding():
+    data = 'city,year\n'.encode('utf-8') + b'Lviv,' + b'1' * 70000 + 'a\nלבוב,1900\n'.encode('cp1255')
+    loader, rows, kinds = load(data)
+    assert RELOAD not in kinds
+    assert loader.encoding == 'cp1255' and rows[-1] == ['לבוב', '1900']
+
+
+def test_undecodable_file_fails_and_is_closed(tmp_path):
+    path = tmp_path / 'broken.csv'
+    path.write_bytes(b'city,year\n\x81,1900\n')  # Not UTF-8, and undefined in cp1255
+    loader = FileLoader(str(path))
+    try:
+        loader.open()
+        assert False, 'open should have failed'
+    except UnicodeDecodeError:
+        pass
+    assert loader._file.closed
+
+
+def test_rest_of_file_arrives_in_chunks():
+    data = ''.join(f'{i},row {i}\n' for i in range(1000)).encode('utf-8')
+    loader, rows, kinds = load(data, first_rows=10, chunk_rows=100)
+    assert [row[0] for row in rows] == [str(i) for i in range(1000)]
@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from http_client import HttpClient
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """/page answers with an ETag and honours If-None-Match, /flaky fails twice first"""
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+    flaky_failures = 2
+
+    def do_GET(self):
+        StandIn.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/flaky' and StandIn.flaky_failures > 0:
+            StandIn.flaky_failures -= 1
+            self.reply(503, b'busy')
+        elif self.headers.get('If-None-Match') == '"v1"':
+            self.reply(304, b'', etag='"v1"')
+        else:
+            self.reply(200, 'פראג'.encode('utf-8'), etag='"v1"')
+
+    def reply(self, status, body, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    StandIn.requests_seen = []
+    StandIn.flaky_failures = 2
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_retries_transient_failures():
+    server, base_url = start_server()
+    client = HttpClient(backoff=0.01)
+    try:
+        response = client.get(base_url + '/flaky', revalidate=False)
+        assert response.status_code == 200
+        assert [path for path, _ in StandIn.requests_seen] == ['/flaky'] * 3
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_unchanged_page_is_revalidated_across_clients(tmp_path):
+    server, base_url = start_server()
+    try:
+        first = HttpClient(cache_dir=str(tmp_path))
+        assert first.get(base_url + '/page').text == 'פראג'
+        first.close()
+
+        second = HttpClient(cache_dir=str(tmp_path))
+        response = second.get(base_url + '/page')
+        second.close()
+        assert response.status_code == 200
+        assert response.from_cache
+        assert response.text == 'פראג'
+        assert StandIn.requests_seen == [('/page', None), ('/page', '"v1"')]
+    finally:
+        server.shutdown()
+
+
+def test_body_without_its_metadata_is_not_used(tmp_path):
+    server, base_url = start_server()
+    try:
+        first = HttpClient(cache_dir=str(tmp_path))
+        first.get(base_url + '/page')
+        first.close()
+        body, = [path for path in tmp_path.iterdir() if path.suffix == '.body']
+        assert sorted(path.suffix for path in tmp_path.iterdir()) == ['.body', '.json']  # No temporary files left
+        body.write_bytes(b'written just before a crash')
+
+        second = HttpClient(cache_dir=str(tmp_path))
+        response = second.get(base_url + '/page')
+        second.close()
+        assert not response.from_cache and response.text == 'פראג'
+        assert StandIn.requests_seen[-1] == ('/page', None)  # Fetched without the old ETag
+    finally:
+        server.shutdown()
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from city_names import empty_city_names
+from interlanguage import extract_city_names, extract_with_soup, interlanguage_links
+from benchmark_interlanguage import load_pages
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_temp', 'wiki_pages')
+
+# Trimmed from a saved en.wikipedia.org article (Vector 2022 skin)
+VECTOR_PAGE = """<!DOCTYPE html><html><head><script>RLCONF={"wgTitle":"Prague"};</script></head><body>
+<div id="p-lang-btn" class="vector-dropdown"><div class="vector-menu-content"><ul class="vector-menu-content-list">
+<li class="interlanguage-link interwiki-cs mw-list-item"><a href="https://cs.wikipedia.org/wiki/Praha" title="Praha – Czech" lang="cs" hreflang="cs" class="interlanguage-link-target"><span>Čeština</span></a></li>
+<li class="interlanguage-link interwiki-de mw-list-item"><a href="https://de.wikipedia.org/wiki/Prag" title="Prag – German" lang="de" hreflang="de" class="interlanguage-link-target"><span>Deutsch</span></a></li>
+<li class="interlanguage-link interwiki-fr mw-list-item"><a href="https://fr.wikipedia.org/wiki/Prague" title="Prague – French" lang="fr" hreflang="fr" class="interlanguage-link-target"><span>Français</span></a></li>
+<li class="interlanguage-link interwiki-he mw-list-item"><a href="https://he.wikipedia.org/wiki/%D7%A4%D7%A8%D7%90%D7%92" title="פראג – Hebrew" lang="he" hreflang="he" class="interlanguage-link-target"><span>עברית</span></a></li>
+<li class="interlanguage-link interwiki-sh mw-list-item"><a href="https://sh.wikipedia.org/wiki/Prag" title="Prag &amp; okolica – Serbo-Croatian" lang="sh" hreflang="sh" class="interlanguage-link-target"><span>Srpskohrvatski</span></a></li>
+<li class="interlanguage-link interwiki-yi mw-list-item"><a href="https://yi.wikipedia.org/wiki/%D7%A4%D7%A8%D7%90%D7%92" title="פראג – Yiddish" lang="yi" hreflang="yi" class="interlanguage-link-target"><span>ייִדיש</span></a></li>
+</ul></div></div>
+<div id="mw-content-text"><p><b>Prague</b> is the capital of the <a href="/wiki/Czech_Republic" title="Czech Republic">Czech Republic</a>.</p></div>
+</body></html>"""
+
+INFOBOX_PAGE = """<html><body>
+<table class="infobox"><tr><th>German name</th><td>Lemberg</td></tr><tr><th>Native name</th><td>Львів</td></tr></table>
+<p>Lviv is a city in western Ukraine.</p>
+</body></html>"""
+
+
+def extract(extractor, html, city):
+    city_names = empty_city_names(city)
+    extractor(html, city, city_names)
+    return city_names
+
+
+def test_targeted_scan_matches_full_parse():
+    for html in [VECTOR_PAGE, VECTOR_PAGE.encode('utf-8')]:
+        assert extract(extract_city_names, html, 'Prague') == extract(extract_with_soup, html, 'Prague') == {
+            'english': 'Prague', 'hebrew': 'פראג', 'yiddish': 'פראג', 'german': 'Prag', 'other': 'Praha'}
+    assert ('sh', 'Prag & okolica – Serbo-Croatian') in interlanguage_links(VECTOR_PAGE)
+
+
+def test_pages_without_interlanguage_list_use_the_infobox():
+    assert interlanguage_links(INFOBOX_PAGE) is None
+    assert extract(extract_city_names, INFOBOX_PAGE, 'Lviv') == {
+        'english': 'Lviv', 'hebrew': '', 'yiddish': '', 'german': 'Lemberg', 'other': 'Львів'}
+
+
+def test_saved_pages_give_the_same_names_as_the_full_parse():
+    pages = load_pages(CORPUS_DIR)
+    assert len(pages) >= 5
+    for city, html in pages:
+        assert extract(extract_city_names, html, city) == extract(extract_with_soup, html, city), city
+    # Links to other Wikipedias in the article body count too, after the language list
+    prague = dict(pages)['Prague']
+    assert extract(extract_city_names, prague, 'Prague')['other'] == 'Pinkasova synagoga'
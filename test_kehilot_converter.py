@@ -0,0 +1,171 @@
+import os
+import sys
+import csv
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from kehilot_converter import convert_rows, iter_kehilot_rows, convert_file, ScatteredCityError
+from checkpoint import ConversionCheckpoint
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_temp')
+
+NAMES = {
+    'Prague': {'english': 'Prague', 'hebrew': 'פראג', 'yiddish': 'פראג', 'german': 'Prag', 'other': 'Praha'},
+    'Los Angeles': {'english': 'Los Angeles', 'hebrew': "לוס אנג'לס", 'yiddish': 'לאס אנדזשעלעס',
+                    'german': 'Los Angeles', 'other': 'Los Angeles'},
+}
+
+
+def lookup_names(city, country):
+    return dict(NAMES.get(city, {'english': city}))
+
+
+def forward_scan_convert(rows):
+    """The original per-row forward scan, kept as the reference output"""
+    if rows and any(word in rows[0][0].lower() for word in ['country', 'town', 'name']):
+        rows = rows[1:]
+    converted = []
+    for i, row in enumerate(rows):
+        if len(row) < 9:
+            continue
+        country, city, longitude, latitude, year_estab, year_data, population, notes, source = \
+            [cell.strip() for cell in row[:9]]
+        year_start = year_data if year_data and year_data != 'NA' else year_estab
+        year_end, pop_end = "2024", ""
+        for j in range(i + 1, len(rows)):
+            if len(rows[j]) >= 7 and rows[j][1].strip() == city:
+                next_year, next_pop = rows[j][5].strip(), rows[j][6].strip()
+                if next_year and next_year != 'NA':
+                    try:
+                        year_end = str(int(next_year) - 1)
+                    except ValueError:
+                        year_end = "2024"
+                if next_pop and next_pop != 'NA':
+                    pop_end = next_pop
+                break
+        probability = "high"
+        if notes and any(word in notes.lower() for word in ['uncertain', 'unknown', 'estimated', 'approx']):
+            probability = "medium"
+        names = lookup_names(city, country)
+        converted.append([country, city, longitude, latitude, year_estab, year_start, year_end,
+                          population if population != 'NA' else "", pop_end, probability, "1", "1",
+                          names.get('english', city), names.get('hebrew', ''), names.get('yiddish', ''),
+                          names.get('german', ''), names.get('other', ''), source, notes])
+    return converted
+
+
+def read_rows(file_name):
+    with open(os.path.join(DATA_DIR, file_name), 'r', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_matches_forward_scan_on_sample_files():
+    for file_name in ['prague.csv', 'Los Angeles.csv', 'Lublin.csv']:
+        rows = read_rows(file_name)
+        assert convert_rows(rows, lookup_names) == forward_scan_convert(rows), file_name
+
+
+def test_matches_golden_prague_output():
+    with open(os.path.join(DATA_DIR, 'prague_kehilot_new.csv'), 'r', encoding='utf-8') as f:
+        golden = list(csv.reader(f))[1:]
+    converted = convert_rows(read_rows('prague.csv'), lookup_names)
+    assert len(converted) == len(golden)
+    # Row 0 pop_start was filled in by hand after conversion
+    assert converted[1:] == golden[1:]
+
+
+def test_interleaved_cities_are_grouped_and_ordered():
+    rows = [
+        ['Poland', 'Lublin', '22.5', '51.2', '1316', '1400', '100', '', 'src'],
+        ['Czech Republic', 'Prague', '14.4', '50.0', '970', '1100', '50', '', 'src'],
+        ['Poland', 'Lublin', '22.5', '51.2', '1316', '1336', 'NA', '', 'src'],
+        ['Poland', 'Lublin', '22.5', '51.2', '1316', '1500', '300', '', 'src'],
+    ]
+    converted = convert_rows(rows, lookup_names)
+    assert [(row[1], row[5], row[6], row[7], row[8]) for row in converted] == [
+        ('Lublin', '1336', '1399', '', '100'),
+        ('Lublin', '1400', '1499', '100', '300'),
+        ('Lublin', '1500', '2024', '300', ''),
+        ('Prague', '1100', '2024', '50', ''),
+    ]
+
+
+def test_large_input_is_linear():
+    rows = [['Poland', 'City %d' % (i // 20), '1.0', '1.0', '1000', str(1000 + i % 20), str(i), '', 'src']
+            for i in range(100000)]
+    start = time.perf_counter()
+    converted = convert_rows(rows, lookup_names)
+    assert len(converted) == 100000
+    assert time.perf_counter() - start < 5
+
+
+def test_sources_point_at_the_row_each_period_starts_from():
+    rows = [['Country', 'Town Name', 'Longitude', 'Latitude', 'Year Established', 'Year', 'Population', 'Notes',
+             'Source'],
+            ['Czechia', 'Prague', '14.4', '50.1', '1000', '1900', '30000', '', 'src'],
+            ['Germany', 'Berlin', '13.4', '52.5', '1295', '1800', '3300', '', 'src'],
+            ['Czechia', 'Prague', '14.4', '50.1', '1000', '1800', '8000', '', 'src'],
+            ['Czechia', 'Prague', '14.4', '50.1', '1000', '1850', '10000', ''],  # Only closes a period
+            ['Germany', 'Berlin', '13.4', '52.5', '1295', '1900', '92000', '', 'src']]
+    sources = []
+    converted = convert_rows(rows, lookup_names, sources=sources)
+    assert sources == [3, 1, 2, 5]
+    assert [row[5] for row in converted] == [rows[source][5] for source in sources]
+
+
+def test_streaming_refuses_a_city_split_across_the_input():
+    rows = [['Poland', 'Lublin', '22.5', '51.2', '1316', '1800', '100', '', 'src'],
+            ['Poland', 'Krakow', '19.9', '50.1', '1304', '1800', '200', '', 'src'],
+            ['Poland', 'Lublin', '22.5', '51.2', '1316', '1900', '300', '', 'src']]
+    try:
+        list(iter_kehilot_rows(iter(rows), lookup_names))
+        assert False, 'scattered rows should not become overlapping periods'
+    except ScatteredCityError as e:
+        assert '--group-all' in str(e)
+    assert len(list(iter_kehilot_rows(iter(rows), lookup_names, group_all=True))) == 3
+
+
+def test_streaming_matches_batch_conversion():
+    rows = read_rows('prague.csv') + read_rows('Los Angeles.csv')
+    streamed = iter_kehilot_rows(iter(rows), lookup_names)
+    assert list(streamed) == convert_rows(rows, lookup_names)
+
+
+class Crash(BaseException):
+    pass
+
+
+def test_interrupted_conversion_resumes_from_checkpoint(tmp_path):
+    input_path = str(tmp_path / 'input.csv')
+    rows = [['Poland', 'Town %d' % (i // 3), '1.0', '1.0', '1500', str(1500 + i % 3 * 50), str(i), '', 'src']
+            for i in range(60)]
+    with open(input_path, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+    def crash_after_12_cities(city, country):
+        if city == 'Town 12':
+            raise Crash()
+        return lookup_names(city, country)
+
+    checkpoint = ConversionCheckpoint.for_file(input_path, 'runs', directory=str(tmp_path), every=6)
+    try:
+        convert_file(input_path, str(tmp_path / 'out.csv'), crash_after_12_cities, checkpoint=checkpoint)
+        assert False, 'conversion should have crashed'
+    except Crash:
+        pass
+
+    with open(checkpoint.path, 'a', encoding='utf-8') as f:
+        f.write('[12, [["Poland", "Town 1')  # A line cut short by the crash
+
+    looked_up = []
+    checkpoint = ConversionCheckpoint.for_file(input_path, 'runs', directory=str(tmp_path), every=6)
+    assert len(checkpoint.completed) == 12
+    assert all(isinstance(offset, int) for offset in checkpoint.completed.values())  # Rows stay on disk
+    convert_file(input_path, str(tmp_path / 'out.csv'),
+                 lambda city, country: looked_up.append(city) or lookup_names(city, country),
+                 checkpoint=checkpoint)
+    assert looked_up == ['Town %d' % i for i in range(12, 20)]
+    assert not os.path.exists(checkpoint.path)
+    with open(tmp_path / 'out.csv', 'r', encoding='utf-8') as f:
+        assert list(csv.reader(f))[1:] == convert_rows(rows, lookup_names)
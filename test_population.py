@@ -0,0 +1,60 @@
+import os
+import sys
+import math
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from build_shards import kehila_record
+from population import PopulationEngine
+
+
+def actual_pop_like_helpers_js(record, year):
+    """loadData's actual_pop, in Python floats (JavaScript's doubles)"""
+    start, end = record['population_start'], record['population_end']
+    start = math.nan if start is None else float(start)
+    end = math.nan if end is None else float(end)
+    if 'year_end' not in record:
+        return start
+    numerator = (record['year_end'] - year) * start + (year - record['year_start']) * end
+    span = record['year_end'] - record['year_start']
+    if span == 0 or math.isnan(numerator):
+        return math.nan  # 0/0 and NaN: Math.floor(NaN)
+    return float(math.floor(numerator / span))
+
+
+def test_matches_the_page_formula_including_empty_fields():
+    lines = ['Poland,A,1,1,,1800,1900,1000,3001',   # Interpolated, floored
+             'Poland,B,1,1,,1800,,500,900',        # Open-ended: pop_start
+             'Poland,C,1,1,,1800,1900,700,',       # Empty pop_end: pop_start
+             'Poland,D,1,1,,1850,1850,100,200',    # One-year period: 0/0 is NaN
+             'Poland,E,1,1,,1800,1900,?,200',      # NaN pop_start
+             'Poland,F,1,1,,1800,1900,3001,1000',  # Decreasing
+             'Poland,G,1,1,,1800,NA,5,5']          # Never shown
+    engine = PopulationEngine([kehila_record(line) for line in lines])
+    years = [1900, 1799, 1850, 1833, 1800, 2000]
+    table = engine.populations(years)
+    for row, line in enumerate(lines):
+        record = kehila_record(line)
+        for column, year in enumerate(years):
+            shown = record is not None and record['year_start'] <= year <= record.get('year_end', math.inf)
+            expected = actual_pop_like_helpers_js(record, year) if shown else math.nan
+            assert (math.isnan(expected) and math.isnan(table[row, column])) or table[row, column] == expected, \
+                (line, year)
+    assert table[0, years.index(1833)] == math.floor((67 * 1000 + 33 * 3001) / 100)
+    assert engine.totals(years).tolist() == np.nansum(table, axis=0).tolist()
+    assert engine.series(5, years).tolist()[:1] == [1000]
+
+
+def test_kehilot_totals_match_row_by_row_sums():
+    engine = PopulationEngine.load()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kehilot.csv'), encoding='utf-8') as f:
+        records = [kehila_record(line) for line in f.read().split('\n')[1:] if line.strip()]
+    years = np.array([-586, 70, 1096, 1492, 1648, 1881, 1939, 2023])
+    totals = engine.totals(years)
+    for year, total in zip(years.tolist(), totals.tolist()):
+        pops = [actual_pop_like_helpers_js(record, year) for record in records
+                if record and record['year_start'] is not None
+                and record['year_start'] <= year <= record.get('year_end', math.inf)]
+        assert total == sum(pop for pop in pops if pop)  # NaN and 0 add nothing, as in the cluster sums
@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from row_model import RowModel, RESET, UPDATE, INSERT
+
+
+def test_changes_are_reported_per_row():
+    model = RowModel(['country', 'city', 'comment'])
+    changes = []
+    model.subscribe(lambda kind, indices: changes.append((kind, indices if indices is None else list(indices))))
+
+    model.reset([['Poland', 'Lublin', ''], ['Czech Republic', 'Prague']])
+    model.append([['Austria', 'Vienna', '']])
+    assert model.set_cell(1, 2, 'capital') == ''  # Short rows are padded
+    assert model.set_cell(1, 2, 'capital') == 'capital'  # Unchanged, nothing reported
+    assert model.get_cell(1, model.column_index('comment')) == 'capital'
+
+    assert changes == [(RESET, None), (INSERT, [2]), (UPDATE, [1])]
+    assert len(model) == 3
@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from kehilot_converter import KEHILOT_COLUMNS
+from schemas import detect_schema, Schema, register_schema, remap_columns
+
+
+def test_header_row_picks_the_schema():
+    schema, has_header = detect_schema(['\ufeffcountry'] + KEHILOT_COLUMNS[1:])
+    assert (schema.name, has_header) == ('kehilot', True)
+    # An older kehilot.csv without year_estab, with trailing empty cells as Excel writes them
+    legacy_header = [name for name in KEHILOT_COLUMNS if name != 'year_estab'] + ['', '']
+    schema, has_header = detect_schema(legacy_header)
+    assert (schema.name, has_header) == ('kehilot_legacy', True)
+    row = schema.convert([['Germany', 'Aach', '8.8', '47.8', '1518', '1942'] + [''] * 14])[0]
+    assert row[:7] == ['Germany', 'Aach', '8.8', '47.8', '', '1518', '1942']
+    assert len(row) == len(KEHILOT_COLUMNS)
+
+
+def test_kehilot_rows_short_of_its_columns_are_dropped():
+    schema, _ = detect_schema(KEHILOT_COLUMNS)
+    full_row = ['Poland', 'Lublin', '22.5', '51.2', '1316', '1316', ''] + [''] * 12
+    sources = []
+    assert schema.convert([full_row, full_row[:7], full_row + ['extra']], sources=sources) == \
+        [full_row, full_row + ['extra']]
+    assert sources == [0, 2]  # Where each kept row is in the file, to patch edits into the right record
+
+
+def test_files_without_header_go_by_column_count():
+    row = ['Poland', 'Lublin', '22.5667', '51.2500', '1316', '1316', 'NA', 'First invitation', 'https://he.wikipedia.org']
+    schema, has_header = detect_schema(row)
+    assert (schema.name, has_header, schema.needs_names) == ('input', False, True)
+    assert detect_schema(['a', 'b', 'c']) == (None, False)
+
+
+def test_new_schema_only_needs_registering():
+    columns = ['city', 'country', 'lat', 'long']
+    schema = Schema('points', "points", columns, remap_columns(columns))
+    register_schema(schema)
+    assert detect_schema(['City', 'Country', 'Lat', 'Long']) == (schema, True)
+    assert schema.convert([['Prague', 'Czech Republic', '50.08', '14.42']])[0][:4] == \
+        ['Czech Republic', 'Prague', '14.42', '50.08']
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from kehilot_converter import KEHILOT_COLUMNS
+from row_model import RowModel
+from search_index import SearchIndex
+
+
+def kehilot_row(country, city, hebrew='', german=''):
+    row = [''] * len(KEHILOT_COLUMNS)
+    row[0], row[1], row[13], row[15] = country, city, hebrew, german
+    return row
+
+
+def test_search_ignores_case_diacritics_and_niqqud():
+    model = RowModel(KEHILOT_COLUMNS, [kehilot_row('Poland', 'Kraków', 'קרקוב', 'Krakau'),
+                                       kehilot_row('Poland', 'Lublin', 'לובלין'),
+                                       kehilot_row('Czech Republic', 'Prague', 'פראג', 'Prag')])
+    index = SearchIndex(model)
+    assert index.search('krak') == [0]
+    assert index.search('קְרָקוֹב') == [0]
+    assert index.search('POL lub') == [1]
+    assert index.search('pra') == [2]
+    assert index.search('  ') is None
+
+
+def test_index_follows_edits_and_new_rows():
+    model = RowModel(KEHILOT_COLUMNS, [kehilot_row('Poland', 'Lublin')])
+    index = SearchIndex(model)
+    assert index.search('lub') == [0]
+    model.set_cell(0, 1, 'Lodz')
+    model.append([kehilot_row('Poland', 'Lublin')])
+    assert index.search('lub') == [1]
+    assert index.search('lodz') == [0]
+    assert index.search('poland') == [0, 1]
+
+
+def test_search_is_fast_on_large_tables():
+    model = RowModel(KEHILOT_COLUMNS, [kehilot_row(f'Country{i % 50}', f'Town{i}', f'עיר{i}')
+                                       for i in range(100000)])
+    index = SearchIndex(model)
+    index.search('town')  # Builds the index
+    started = time.perf_counter()
+    assert index.search('town12345') == [12345]
+    assert len(index.search('country7 town99')) == 22
+    assert time.perf_counter() - started < 0.05
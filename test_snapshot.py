@@ -0,0 +1,33 @@
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from snapshot import SOURCES, PROJECT_DIR, load_tables, load_sources, read_snapshot, source_hash
+
+
+def test_snapshot_is_mapped_and_rebuilt_when_a_source_changes():
+    with tempfile.TemporaryDirectory() as root:
+        for file_name, _ in SOURCES.values():
+            shutil.copy(os.path.join(PROJECT_DIR, file_name), root)
+        path = os.path.join(root, 'data.snapshot')
+
+        built = load_tables(root, path)
+        digest, mapped = read_snapshot(path)
+        assert digest == source_hash(root)
+        sources = load_sources(root)
+        for name, dataset in sources.items():
+            assert mapped[name].columns == dataset.columns
+            assert list(mapped[name].text_rows()) == list(dataset.text_rows())
+        assert isinstance(mapped['kehilot'].column('year_start').values, memoryview)  # Read in place
+        arrows = mapped['historical_arrows']
+        assert arrows.column('yearStart')[0] == sources['historical_arrows'].column('yearStart')[0]
+
+        with open(os.path.join(root, 'events.csv'), 'a', encoding='utf-8') as f:
+            f.write('35.2,31.7,1000,1000,0,#000000,#000000,0.1,1999,2000,Test,בדיקה,,1\n')
+        rebuilt = load_tables(root, path)
+        assert len(rebuilt['events']) == len(built['events']) + 1
+        assert read_snapshot(path)[0] == source_hash(root)
+        assert mapped['events'].select(mapped['events'].active_in(1999)) == []  # Old mapping still readable
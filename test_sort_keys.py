@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from kehilot_converter import KEHILOT_COLUMNS
+from row_model import RowModel
+from sort_keys import SortKeys
+
+COUNTRY, CITY, YEAR_START, POP_START = 0, 1, 5, 7
+
+
+def kehilot_row(country, city, year_start, pop_start=''):
+    row = [''] * len(KEHILOT_COLUMNS)
+    row[COUNTRY], row[CITY], row[YEAR_START], row[POP_START] = country, city, year_start, pop_start
+    return row
+
+
+def test_numbers_sort_as_numbers_and_keys_follow_edits():
+    model = RowModel(KEHILOT_COLUMNS, [kehilot_row('Egypt', 'Elephantine', '70', '000'),
+                                       kehilot_row('Egypt', 'Elephantine', '-650', '100'),
+                                       kehilot_row('Egypt', 'Elephantine', 'NA', '30'),
+                                       kehilot_row('Egypt', 'Elephantine', '-550', '')])
+    keys = SortKeys(model)
+    assert keys.sorted_rows([(YEAR_START, False)]) == [1, 3, 0, 2]
+    assert keys.sorted_rows([(POP_START, True)]) == [3, 1, 2, 0]  # Empty cells sort last, so first descending
+    model.set_cell(2, YEAR_START, '-1000')
+    assert keys.sorted_rows([(YEAR_START, False)]) == [2, 1, 3, 0]
+
+
+def test_multi_column_sort_of_a_subset():
+    model = RowModel(KEHILOT_COLUMNS, [kehilot_row('Poland', 'lublin', '1500'),
+                                       kehilot_row('Czech Republic', 'Prague', '970'),
+                                       kehilot_row('Poland', 'Krakow', '1300'),
+                                       kehilot_row('Poland', 'Lublin', '1316')])
+    keys = SortKeys(model)
+    columns = [(COUNTRY, False), (CITY, False), (YEAR_START, True)]
+    assert keys.sorted_rows(columns) == [1, 2, 0, 3]
+    assert keys.sorted_rows(columns, rows=[3, 0, 2]) == [2, 0, 3]
+
+
+def test_resorting_large_tables_is_fast():
+    model = RowModel(KEHILOT_COLUMNS, [kehilot_row(f'Country{i % 40}', f'Town{i % 997}', str(2000 - i % 3000))
+                                       for i in range(100000)])
+    keys = SortKeys(model)
+    columns = [(COUNTRY, False), (CITY, False), (YEAR_START, False)]
+    keys.sorted_rows(columns)  # Parses the keys
+    started = time.perf_counter()
+    rows = keys.sorted_rows(columns)
+    assert time.perf_counter() - started < 0.5
+    ordered = [(model[row][COUNTRY], model[row][CITY], int(model[row][YEAR_START])) for row in rows]
+    assert ordered == sorted(ordered, key=lambda key: (key[0].casefold(), key[1].casefold(), key[2]))
@@ -0,0 +1,37 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from dataset import KehilotDataset
+from spatial_index import SpatialIndex, haversine_km
+
+
+def test_queries_match_a_full_scan():
+    dataset = KehilotDataset.load()
+    index = SpatialIndex(dataset)
+    longs, lats = dataset.column('long'), dataset.column('lat')
+    located = [row for row in range(len(dataset)) if longs[row] is not None and lats[row] is not None]
+    generator = random.Random(3)
+    for _ in range(30):
+        lat, lon = generator.uniform(25, 60), generator.uniform(-10, 45)
+        year = generator.choice([None, 1500, 1900])
+        active = set(dataset.select(dataset.active_in(year))) if year is not None else set(located)
+        distances = sorted((haversine_km(lat, lon, lats[row], longs[row]), row) for row in located if row in active)
+
+        assert index.within(lat, lon, 100, year) == [(km, row) for km, row in distances if km <= 100]
+        assert [km for km, _ in index.nearest(lat, lon, 5, year)] == [km for km, _ in distances[:5]]
+        west, south = lon - 2, lat - 1
+        assert index.bbox(west, south, lon + 2, lat + 1, year) == sorted(
+            row for row in located if row in active and west <= longs[row] <= lon + 2 and south <= lats[row] <= lat + 1)
+
+
+def test_bbox_and_nearest_across_the_180th_meridian():
+    dataset = KehilotDataset(['city', 'long', 'lat', 'year_start', 'year_end'])
+    for city, lon, lat in [('Suva', 178.44, -18.14), ('Apia', -171.76, -13.83), ('Auckland', 174.76, -36.85)]:
+        dataset.append({'city': city, 'long': str(lon), 'lat': str(lat), 'year_start': '1900'})
+    index = SpatialIndex(dataset)
+    assert index.bbox(170, -20, -170, -10) == [0, 1]
+    assert [row for _, row in index.nearest(-15.0, 179.9, k=2)] == [0, 1]
+    assert index.nearest(-15.0, 179.9, k=3, year=1800) == []
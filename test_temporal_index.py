@@ -0,0 +1,72 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from build_shards import js_parse_int, js_trim, parse_csv_line, kehila_record
+from temporal_index import IntervalIndex, OPEN_END, PROJECT_DIR, TEMPORAL_SOURCES, build_indexes
+
+
+def rows(name):
+    """Non-blank data lines of a source file"""
+    with open(os.path.join(PROJECT_DIR, TEMPORAL_SOURCES[name][0]), encoding='utf-8-sig', newline='') as f:
+        return [row for row in f.read().split('\n')[1:] if js_trim(row)]
+
+
+KEHILOT_RECORDS = [kehila_record(line) for line in rows('kehilot')]
+
+
+def shown_like_helpers_js(name, year):
+    """Rows shown in a year, by the filters of helpers.js written out literally"""
+    shown = []
+    if name == 'kehilot':
+        for number, record in enumerate(KEHILOT_RECORDS):
+            if record and record['year_start'] is not None and record['year_start'] <= year and \
+                    record.get('year_end', OPEN_END) >= year:
+                shown.append(number)
+    elif name == 'historical_arrows':
+        for number, line in enumerate(rows(name)):
+            cells = parse_csv_line(line) + [''] * 8
+            start, end = js_parse_int(cells[6]), js_parse_int(cells[7])
+            if start is not None and end is not None and (start <= year <= end or start == end == year - 1):
+                shown.append(number)
+    else:
+        start_column, end_column = (8, 9) if name == 'events' else (4, 5)
+        for number, line in enumerate(rows(name)):
+            cells = parse_csv_line(line)
+            start, year_end = js_parse_int(cells[start_column]), cells[end_column]
+            if start is not None and start > year:
+                break
+            end = None if js_trim(year_end) == '' else js_parse_int(year_end)
+            open_ended = js_trim(year_end) == ''
+            if start is None or (end is None and not open_ended):
+                continue
+            if start <= year and (open_ended or end >= year) or (start == end and year == end + 1):
+                shown.append(number)
+    return shown
+
+
+def test_stabbing_matches_the_page_for_every_year():
+    indexes = build_indexes()
+    for name, index in indexes.items():
+        restored = IntervalIndex.from_bytes(index.to_bytes())
+        for year in range(-1320, 2040, 23):
+            expected = shown_like_helpers_js(name, year)
+            assert sorted(index.stab(year)) == expected, (name, year)
+            assert sorted(restored.stab(year)) == expected, (name, year)
+
+
+def test_range_queries_on_random_intervals():
+    generator = random.Random(7)
+    intervals = []
+    for number in range(500):
+        first = generator.randint(-50, 50)
+        intervals.append((number, first, OPEN_END if number % 10 == 0 else first + generator.randint(0, 20)))
+    index = IntervalIndex(intervals)
+    for _ in range(200):
+        first = generator.randint(-80, 80)
+        last = first + generator.randint(0, 30)
+        found = index.overlapping(first, last)
+        assert sorted(found) == [number for number, start, end in intervals if start <= last and end >= first]
+    assert index.overlapping(5, 4) == []
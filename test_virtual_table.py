@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils'))
+
+from virtual_table import RowWindow
+
+
+def test_window_stays_inside_the_rows():
+    window = RowWindow(total=100000, size=30)
+    assert window.scroll(-5) == 0
+    assert window.moveto(0.5) == 50000
+    assert window.scroll(3) == 50003
+    assert window.moveto(1.0) == 100000 - 30
+    assert window.fractions() == ((100000 - 30) / 100000, 1.0)
+
+    small = RowWindow(total=10, size=30)
+    assert small.moveto(0.7) == 0
+    assert small.fractions() == (0.0, 1.0)
+
+
+def test_show_moves_the_window_as_little_as_possible():
+    window = RowWindow(total=1000, size=20)
+    window.moveto(0.1)
+    assert window.show(110) == 100  # Already visible
+    assert window.show(130) == 111
+    assert window.show(40) == 40
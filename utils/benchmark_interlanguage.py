@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark of city name extraction over saved Wikipedia article pages
+Compares the targeted interlanguage scan with a full BeautifulSoup parse of each page
+and reports any page where the two disagree
+
+Usage:
+    python benchmark_interlanguage.py pages/ --download Prague Lublin "Los Angeles"
+    python benchmark_interlanguage.py pages/ [--repeat 5]
+"""
+import os
+import sys
+import time
+import argparse
+from city_names import WIKI_BASE_URL, empty_city_names
+from interlanguage import extract_city_names, extract_with_soup
+
+
+def page_path(corpus_dir, city):
+    """File a city's article is saved to, e.g. pages/Los_Angeles.html"""
+    return os.path.join(corpus_dir, city.replace(' ', '_') + '.html')
+
+
+def download_pages(corpus_dir, cities):
+    """Save the English Wikipedia article of each city into the corpus directory"""
+    from http_client import get_client
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    client = get_client()
+    for city in cities:
+        response = client.get(f"{WIKI_BASE_URL}{city.replace(' ', '_')}")
+        if response.status_code != 200:
+            print(f"Skipping {city}: HTTP {response.status_code}")
+            continue
+        with open(page_path(corpus_dir, city), 'wb') as f:
+            f.write(response.content)
+        print(f"Saved {city} ({len(response.content) // 1024} KB)")
+
+
+def load_pages(corpus_dir):
+    """Return [(city, html bytes)] of every saved page, ordered by file name"""
+    pages = []
+    for file_name in sorted(os.listdir(corpus_dir)):
+        if file_name.endswith('.html'):
+            with open(os.path.join(corpus_dir, file_name), 'rb') as f:
+                pages.append((file_name[:-len('.html')].replace('_', ' '), f.read()))
+    return pages
+
+
+def time_extraction(extract, pages, repeat):
+    """Return (best seconds per page, names per page) of an extraction function"""
+    best = float('inf')
+    results = []
+    for _ in range(repeat):
+        results = []
+        start = time.perf_counter()
+        for city, html in pages:
+            city_names = empty_city_names(city)
+            extract(html, city, city_names)
+            results.append(city_names)
+        best = min(best, time.perf_counter() - start)
+    return best / len(pages), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark city name extraction over saved Wikipedia pages")
+    parser.add_argument("corpus", help="directory of saved article pages (<City_Name>.html)")
+    parser.add_argument("--download", nargs='+', metavar="CITY", help="first save the articles of these cities")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per extractor, the best one counts (default: 3)")
+    args = parser.parse_args()
+
+    if args.download:
+        download_pages(args.corpus, args.download)
+    pages = load_pages(args.corpus) if os.path.isdir(args.corpus) else []
+    if not pages:
+        print(f"No .html pages in {args.corpus}; save some with --download")
+        return 1
+
+    soup_time, expected = time_extraction(extract_with_soup, pages, args.repeat)
+    scan_time, actual = time_extraction(extract_city_names, pages, args.repeat)
+
+    mismatches = 0
+    for (city, _), want, got in zip(pages, expected, actual):
+        if want != got:
+            mismatches += 1
+            print(f"Mismatch for {city}:\n  full parse: {want}\n  targeted:   {got}")
+
+    print(f"{len(pages)} pages, {sum(len(html) for _, html in pages) // 1024} KB")
+    print(f"Full parse:    {soup_time * 1000:8.2f} ms/page")
+    print(f"Targeted scan: {scan_time * 1000:8.2f} ms/page ({soup_time / scan_time:.1f}x faster)")
+    print(f"Identical output on {len(pages) - mismatches}/{len(pages)} pages")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
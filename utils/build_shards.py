@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Build year-bucketed shards of kehilot.csv for the map's timeline
+loadData(year) in helpers.js used to split and parse every row of kehilot.csv
+on each move of the slider. This writes the rows, parsed and typed the way
+loadData parses them, to shards/kehilot_<start>.json by the century (by
+default) of their year_start, and shards/manifest.json listing each shard with
+the latest year_end of its communities. For a year the page needs only the
+shards that start before it and have a community still active; it fetches each
+once and then just filters the typed records.
+
+Rows are read exactly as helpers.js reads them (split on newlines,
+parseCSVLine, parseInt), so filtering with
+year_start <= year && (year_end === undefined || year_end >= year) shows the
+same communities as before. Numbers that parseInt makes NaN are written as
+null and turned back into NaN by the page; cells that are missing are left out.
+
+The manifest also records the size and SHA-256 of kehilot.csv. The scripts that
+write kehilot.csv rebuild the shards through refresh_shards(), and the page
+falls back to kehilot.csv when its size no longer matches. An edit that keeps
+the size is caught by --check, which the CI workflow runs on every push. Rebuild
+after editing kehilot.csv by hand:
+    python build_shards.py [--bucket-years 100]
+    python build_shards.py --check  # Fails if shards/ is not what a rebuild would write
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+
+from dataset import KEHILOT_PATH
+
+PROJECT_DIR = os.path.dirname(KEHILOT_PATH)
+SHARDS_DIR = os.path.join(PROJECT_DIR, 'shards')
+MANIFEST_NAME = 'manifest.json'
+SHARDS_VERSION = 1
+BUCKET_YEARS = 100
+
+# Characters String.prototype.trim() and parseInt() skip as white space
+JS_SPACE = r' \t\n\v\f\r\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff'
+JS_TRIM_PATTERN = re.compile(f'^[{JS_SPACE}]+|[{JS_SPACE}]+$')
+JS_INT_PATTERN = re.compile(f'[{JS_SPACE}]*([+-]?)(?:(0[xX])([0-9a-fA-F]+)|([0-9]+))')
+
+# Numbers written as null for NaN; year_end is left out when undefined instead
+NUMBER_FIELDS = {'year_estab', 'year_start', 'population_start', 'population_end', 'type', 'symbol'}
+
+KEHILOT_FIELDS = ['country', 'city', 'long', 'lat', 'year_estab', 'year_start', 'year_end',
+                  'pop_start', 'pop_end', 'probability', 'type', 'symbol',
+                  'city_english', 'city_hebrew', 'city_yid', 'city_german',
+                  'city_other', 'source', 'comment']
+
+
+def js_trim(text):
+    """text.trim() of JavaScript"""
+    return JS_TRIM_PATTERN.sub('', text)
+
+
+def js_parse_int(text):
+    """parseInt(text) of JavaScript, with None for NaN"""
+    if text is None:
+        return None
+    match = JS_INT_PATTERN.match(text)
+    if not match:
+        return None
+    sign, hex_prefix, hex_digits, digits = match.groups()
+    value = int(hex_digits, 16) if hex_prefix else int(digits)
+    return -value if sign == '-' else value
+
+
+def parse_csv_line(line):
+    """parseCSVLine of helpers.js: commas split fields except inside quotes, and quotes are dropped"""
+    result = []
+    current = []
+    in_quotes = False
+    for char in line:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ',' and not in_quotes:
+            result.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    result.append(''.join(current))
+    return result
+
+
+def kehila_record(line):
+    """The record loadData builds from a line, without actual_pop (which depends on the year)
+
+    Fields loadData would leave undefined are left out; NaN numbers are None.
+    None for rows no year can show.
+    """
+    cells = dict(zip(KEHILOT_FIELDS, parse_csv_line(line)[:len(KEHILOT_FIELDS)]))
+    year_end = cells.get('year_end')
+    if year_end is not None and js_trim(year_end) != '' and js_parse_int(year_end) is None:
+        return None  # e.g. 'NA': year_end >= year is false for every year
+    pop_end = cells.get('pop_end')
+    record = {
+        'name': cells.get('city'),
+        'name_he': cells.get('city_hebrew'),
+        'lat': cells.get('lat'),
+        'lon': cells.get('long'),
+        'year_estab': js_parse_int(cells.get('year_estab')),
+        'year_start': js_parse_int(cells.get('year_start')),
+        'year_end': None if year_end is None or js_trim(year_end) == '' else js_parse_int(year_end),
+        'population_start': js_parse_int(cells.get('pop_start')),
+        'population_end': js_parse_int(cells.get('pop_start') if pop_end is None or js_trim(pop_end) == ''
+                                       else pop_end),
+        'confidence': cells.get('probability'),
+        'type': js_parse_int(cells.get('type')),
+        'symbol': js_parse_int(cells.get('symbol')),
+        'country': cells.get('country'),
+        'names': {key: cells.get(field) for key, field in [('english', 'city_english'), ('yiddish', 'city_yid'),
+                                                            ('german', 'city_german'), ('other', 'city_other')]
+                  if field in cells},
+        'source': cells['source'].replace('"', '') if cells.get('source') else '',
+        'comment': cells.get('comment'),
+    }
+    return {key: value for key, value in record.items()
+            if value is not None or key in NUMBER_FIELDS}
+
+
+def source_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_shards(csv_text, bucket_years=BUCKET_YEARS):
+    """(manifest, {file name: records}) of the text of kehilot.csv"""
+    buckets = {}
+    for row in csv_text.split('\n')[1:]:
+        record = kehila_record(row) if js_trim(row) else None
+        if record is not None and record['year_start'] is not None:  # NaN year_start: never shown
+            buckets.setdefault(record['year_start'] // bucket_years * bucket_years, []).append(record)
+    shards = []
+    files = {}
+    for start in sorted(buckets):
+        records = buckets[start]
+        ends = [record.get('year_end') for record in records]
+        name = f'kehilot_{start}.json'
+        files[name] = records
+        shards.append({'start': start, 'file': name, 'count': len(records),
+                       'latest_end': None if None in ends else max(ends)})  # None: some are open-ended
+    manifest = {'version': SHARDS_VERSION, 'bucket_years': bucket_years, 'shards': shards}
+    return manifest, files
+
+
+def shard_files(path=KEHILOT_PATH, bucket_years=BUCKET_YEARS):
+    """(manifest, {file name: text}) of the shards directory of a kehilot.csv file, manifest included"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        csv_text = f.read()
+    manifest, files = build_shards(csv_text, bucket_years)
+    manifest['source_hash'] = source_hash(path)
+    manifest['source_size'] = os.path.getsize(path)
+    texts = {name: json.dumps(records, ensure_ascii=False, separators=(',', ':')) for name, records in files.items()}
+    texts[MANIFEST_NAME] = json.dumps(manifest, indent=1) + '\n'
+    return manifest, texts
+
+
+def write_shards(path=KEHILOT_PATH, output=SHARDS_DIR, bucket_years=BUCKET_YEARS):
+    """Replace the shards in the output directory with those of a kehilot.csv file; returns the manifest"""
+    manifest, texts = shard_files(path, bucket_years)
+    os.makedirs(output, exist_ok=True)
+    for name in os.listdir(output):
+        if name.startswith('kehilot_') and name.endswith('.json'):
+            os.remove(os.path.join(output, name))  # Shards of another bucket size
+    for name, text in texts.items():
+        with open(os.path.join(output, name), 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+    return manifest
+
+
+def stale_shards(path=KEHILOT_PATH, output=SHARDS_DIR, bucket_years=BUCKET_YEARS):
+    """Names of the files in the output directory that differ from a rebuild (missing or extra ones too)"""
+    _, texts = shard_files(path, bucket_years)
+    names = set(texts)
+    if os.path.isdir(output):
+        names.update(name for name in os.listdir(output) if name.startswith('kehilot_') and name.endswith('.json'))
+    stale = []
+    for name in sorted(names):
+        try:
+            with open(os.path.join(output, name), 'r', encoding='utf-8', newline='') as f:
+                current = f.read()
+        except OSError:
+            current = None
+        if current != texts.get(name):
+            stale.append(name)
+    return stale
+
+
+def refresh_shards(path, output=SHARDS_DIR):
+    """Rebuild the shards after writing a file, if it is the project's kehilot.csv; returns the manifest or None
+
+    The bucket size of the current shards is kept.
+    """
+    if os.path.abspath(path) != os.path.abspath(KEHILOT_PATH):
+        return None
+    bucket_years = BUCKET_YEARS
+    try:
+        with open(os.path.join(output, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            bucket_years = json.load(f).get('bucket_years', BUCKET_YEARS)
+    except (OSError, ValueError):
+        pass  # No shards yet
+    try:
+        return write_shards(path, output, bucket_years)
+    except OSError as e:
+        print(f"Could not rebuild the shards in {output}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the year-bucketed shards of kehilot.csv for the map")
+    parser.add_argument("input", nargs='?', default=KEHILOT_PATH, help="kehilot.csv file (default: the project's)")
+    parser.add_argument("-o", "--output", default=SHARDS_DIR, help="shards directory (default: %(default)s)")
+    parser.add_argument("--bucket-years", type=int, default=BUCKET_YEARS, help="years per shard (default: 100)")
+    parser.add_argument("--check", action="store_true",
+                        help="write nothing; exit with status 1 if the shards differ from a rebuild")
+    args = parser.parse_args()
+
+    if args.check:
+        stale = stale_shards(args.input, args.output, args.bucket_years)
+        if stale:
+            print(f"Shards out of date with {args.input}: {', '.join(stale)}")
+            print("Rebuild them with: python utils/build_shards.py")
+            return 1
+        print(f"Shards in {args.output} are up to date")
+        return 0
+
+    manifest = write_shards(args.input, args.output, args.bucket_years)
+    sizes = [os.path.getsize(os.path.join(args.output, shard['file'])) for shard in manifest['shards']]
+    print(f"Wrote {len(sizes)} shards to {args.output}: {sum(sizes)} bytes, largest {max(sizes)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Checkpoints of conversions, so a conversion that dies can continue where it stopped
+A checkpoint is a JSON-lines file named after the SHA-256 of the input file: a header
+line, then one line per converted city group, appended every few hundred rows
+"""
+import os
+import json
+import hashlib
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints")
+CHECKPOINT_EVERY = 500  # Converted rows between two saves
+CHECKPOINT_VERSION = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCheckpoint:
+    def __init__(self, input_hash, grouping, directory=DEFAULT_CHECKPOINT_DIR, every=CHECKPOINT_EVERY,
+                 on_save=None):
+        self.input_hash = input_hash
+        self.grouping = grouping  # How input rows were grouped; a checkpoint of another grouping is ignored
+        self.path = os.path.join(directory, f"{input_hash}.jsonl")
+        self.every = every
+        self.on_save = on_save  # Called after every save, e.g. to flush the city names store
+        self.completed = {}  # Saved group number -> offset of its line in the file; the rows stay on disk
+        self._pending = []
+        self._pending_rows = 0
+        self._size = None  # Bytes of the file to keep and append to; None: write it from scratch
+
+    @classmethod
+    def for_file(cls, input_path, grouping, **kwargs):
+        """Checkpoint of converting an input file, loaded from disk if one was saved"""
+        checkpoint = cls(file_hash(input_path), grouping, **kwargs)
+        checkpoint.load()
+        return checkpoint
+
+    def load(self):
+        """Find the saved groups; returns how many there were
+
+        Only their numbers and where their lines start are kept, rows() reads them back.
+        A last line cut short by a crash is ignored, so that group is converted again.
+        """
+        self.completed = {}
+        self._size = None
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.readline()
+                if not header.endswith(b'\n') or json.loads(header) != self._header():
+                    print(f"Ignoring checkpoint {self.path} of another conversion")
+                    return 0
+                offset = len(header)
+                for line in f:
+                    try:
+                        number, _ = json.loads(line)
+                    except ValueError:
+                        break  # Cut off from here on; the next save overwrites it
+                    if not line.endswith(b'\n'):
+                        break  # Appending would join the next line to this one
+                    self.completed[number] = offset
+                    offset += len(line)
+                self._size = offset
+        except (OSError, ValueError) as e:
+            print(f"Error reading checkpoint {self.path}: {e}")
+            self.completed = {}
+            self._size = None
+        return len(self.completed)
+
+    def rows(self, number):
+        """Converted rows of a saved group, read from the file"""
+        with open(self.path, 'rb') as f:
+            f.seek(self.completed[number])
+            return json.loads(f.readline())[1]
+
+    def record(self, number, rows):
+        """Queue the converted rows of group number `number`; saved every `every` rows"""
+        self._pending.append(json.dumps([number, rows], ensure_ascii=False))
+        self._pending_rows += max(1, len(rows))
+        if self._pending_rows >= self.every:
+            self.save()
+
+    def save(self):
+        """Append the groups recorded since the last save and sync them to disk"""
+        if not self._pending:
+            return
+        lines = self._pending if self._size is not None else [json.dumps(self._header())] + self._pending
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'wb' if self._size is None else 'r+b') as f:
+                if self._size is not None:
+                    f.seek(self._size)
+                    f.truncate()  # Drop a line cut short by a crash
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._size = (self._size or 0) + len(data)
+            self._pending = []
+            self._pending_rows = 0
+        except OSError as e:
+            print(f"Error saving checkpoint {self.path}: {e}")
+            return
+        if self.on_save:
+            self.on_save()
+
+    def discard(self):
+        """Delete the checkpoint once the conversion is complete"""
+        self._pending = []
+        self._pending_rows = 0
+        self.completed = {}
+        self._size = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _header(self):
+        """First line of the file, identifying the conversion"""
+        return {'version': CHECKPOINT_VERSION, 'input_hash': self.input_hash, 'grouping': self.grouping}
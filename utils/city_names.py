@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+City name lookup for kehilot.csv conversion
+Finds Hebrew, Yiddish, German and local names of a city through Wikipedia interlanguage links
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http_client import get_client
+from interlanguage import assign_interlanguage_name, extract_city_names
+from name_store import NameStore, CacheEntry, SCHEMA_VERSION, STATUS_HIT, STATUS_MISS, STATUS_ERROR, has_names
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "city_names_cache.json")
+WIKI_BASE_URL = "https://en.wikipedia.org/wiki/"
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+API_BATCH_SIZE = 50  # Most titles the MediaWiki API accepts per query
+
+# How long cache entries are trusted, in seconds (None = forever)
+HIT_TTL = None
+MISS_TTL = 30 * 24 * 60 * 60  # No article or no names; pages rarely gain links
+ERROR_TTL = 60 * 60           # Failed lookups are retried soon
+MEMORY_CACHE_SIZE = 4096      # Entries kept in memory, least recently used dropped first
+
+# Basic mappings used when the web search finds nothing
+COMMON_MAPPINGS = {
+    'Jerusalem': {'hebrew': 'ירושלים', 'yiddish': 'ירושלים', 'german': 'Jerusalem'},
+    'Tel Aviv': {'hebrew': 'תל אביב', 'yiddish': 'תל אביב', 'german': 'Tel Aviv'},
+    'New York': {'hebrew': 'ניו יורק', 'yiddish': 'ניו יארק', 'german': 'New York'},
+    'London': {'hebrew': 'לונדון', 'yiddish': 'לונדן', 'german': 'London'},
+    'Paris': {'hebrew': 'פריז', 'yiddish': 'פאריז', 'german': 'Paris'},
+    'Berlin': {'hebrew': 'ברלין', 'yiddish': 'בערלין', 'german': 'Berlin'},
+    'Rome': {'hebrew': 'רומא', 'yiddish': 'רומא', 'german': 'Rom'},
+    'Madrid': {'hebrew': 'מדריד', 'yiddish': 'מאדריד', 'german': 'Madrid'},
+    'Amsterdam': {'hebrew': 'אמסטרדם', 'yiddish': 'אמסטערדאם', 'german': 'Amsterdam'},
+    'Vienna': {'hebrew': 'וינה', 'yiddish': 'ווין', 'german': 'Wien'}
+}
+
+
+def empty_city_names(city):
+    """Create the names dict of a city before any lookup"""
+    return {
+        'english': city,
+        'hebrew': '',
+        'yiddish': '',
+        'german': '',
+        'other': ''
+    }
+
+
+class CityNamesLookup:
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, online=True, max_workers=8,
+                 wiki_base_url=WIKI_BASE_URL, api_url=WIKI_API_URL, use_api=True, http_client=None,
+                 store_file=None, hit_ttl=HIT_TTL, miss_ttl=MISS_TTL, error_ttl=ERROR_TTL,
+                 memory_cache_size=MEMORY_CACHE_SIZE):
+        self.cache_file = cache_file  # Old JSON cache, migrated once into the store
+        self.store_file = store_file or os.path.splitext(cache_file)[0] + ".sqlite3"
+        self.online = online  # When False only the cache and basic mappings are used
+        self.wiki_base_url = wiki_base_url
+        self.api_url = api_url
+        self.use_api = use_api  # When False every miss scrapes the article HTML
+        self.http = http_client or get_client()
+        self.ttls = {STATUS_HIT: hit_ttl, STATUS_MISS: miss_ttl, STATUS_ERROR: error_ttl}
+        self.memory_cache_size = memory_cache_size
+        self.city_names_cache = OrderedDict()  # Recently used CacheEntry objects, oldest first
+        self.store = NameStore(self.store_file, json_path=cache_file)  # Opened on first lookup
+
+        # Concurrent lookups: cache misses run on a bounded pool, and requests
+        # for a key that is already being fetched wait for the same future
+        self.max_workers = max_workers
+        self._executor = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+        # Counters for the cache hit ratio: names asked for, and lookups started for them
+        self.requested = 0
+        self.fetched = 0
+
+    @staticmethod
+    def cache_key(city, country):
+        """Create a cache key combining city and country"""
+        return f"{city}|{country}".lower().strip()
+
+    def get_city_names(self, city, country):
+        """Get additional city names from Wikipedia interlanguage links with caching
+
+        Raises concurrent.futures.CancelledError if the lookup is cancelled.
+        """
+        with self._lock:
+            self.requested += 1
+        cached_result = self._cached(city, country)
+        if cached_result is not None:
+            return cached_result
+
+        [(future, started)] = self._start_lookups([(city, country)])
+        city_names = future.result().copy()
+        city_names['english'] = city
+        return city_names
+
+    def prefetch(self, cities):
+        """Look up the cache misses of a batch of (city, country) pairs in parallel
+
+        Blocks until the whole batch is resolved and flushes the store once.
+        Raises concurrent.futures.CancelledError if the lookups are cancelled.
+        """
+        lookups = self._start_lookups([(city, country) for city, country in cities
+                                       if self._cached(city, country) is None])
+        for future, _ in lookups:
+            future.result()
+        if any(started for _, started in lookups):
+            self.save_city_names_cache()
+
+    def cancel(self):
+        """Cancel all lookups in flight, so that callers waiting for them stop waiting
+
+        Lookups a worker is already busy with still finish and are cached.
+        """
+        with self._lock:
+            for cache_key, future in list(self._in_flight.items()):
+                future.cancel()
+                del self._in_flight[cache_key]
+
+    def hit_ratio(self, since=(0, 0)):
+        """Share of requested names found in the cache, from a (requested, fetched) snapshot"""
+        requested = self.requested - since[0]
+        if requested <= 0:
+            return None
+        return max(0.0, 1 - (self.fetched - since[1]) / requested)
+
+    def close(self):
+        """Stop the lookup worker threads and close the name store"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+        self.store.close()
+
+    def _cached(self, city, country):
+        """Return the cached names for a city, or None on a cache miss"""
+        with self._lock:
+            cached = self._cached_entry(self.cache_key(city, country))
+        if cached is None:
+            return None
+        cached_result = cached.names.copy()
+        cached_result['english'] = city  # Always use the current city name
+        return cached_result
+
+    def _cached_entry(self, cache_key):
+        """Read a fresh cache entry from memory or the store (called with the lock held)
+
+        Expired entries count as misses when online; offline, any entry beats none.
+        """
+        cached = self.city_names_cache.get(cache_key)
+        if cached is None:
+            cached = self.store.get(cache_key)
+            if cached is None:
+                return None
+            self._remember(cache_key, cached)
+        else:
+            self.city_names_cache.move_to_end(cache_key)
+        if self.online and not self._is_fresh(cached):
+            return None
+        return cached
+
+    def _is_fresh(self, entry):
+        """Check if a cache entry is still within the TTL of its status"""
+        if entry.schema_version != SCHEMA_VERSION:
+            return False
+        ttl = self.ttls.get(entry.status, self.ttls[STATUS_ERROR])
+        return ttl is None or time.time() - entry.updated_at < ttl
+
+    def _remember(self, cache_key, entry):
+        """Keep an entry in memory, dropping the least recently used ones over the cap"""
+        self.city_names_cache[cache_key] = entry
+        self.city_names_cache.move_to_end(cache_key)
+        while len(self.city_names_cache) > self.memory_cache_size:
+            self.city_names_cache.popitem(last=False)
+
+    def _start_lookups(self, cities):
+        """Return a (future, started) pair per city, joining lookups already in flight
+
+        New misses are sent to the langlinks API in batches of API_BATCH_SIZE
+        titles, or scraped one page per worker when the API is not used.
+        """
+        lookups = []
+        new_lookups = []
+        with self._lock:
+            for city, country in cities:
+                cache_key = self.cache_key(city, country)
+                future = self._in_flight.get(cache_key)
+                if future is not None:
+                    lookups.append((future, False))
+                    continue
+                future = Future()
+                cached = self._cached_entry(cache_key)
+                if cached is not None:
+                    # Resolved between the cache check and now
+                    future.set_result(cached.names.copy())
+                    lookups.append((future, False))
+                    continue
+                self._in_flight[cache_key] = future
+                new_lookups.append((city, cache_key, future))
+                lookups.append((future, True))
+            self.fetched += len(new_lookups)
+
+        if self.online and self.use_api:
+            for start in range(0, len(new_lookups), API_BATCH_SIZE):
+                self._submit(self._resolve_batch, new_lookups[start:start + API_BATCH_SIZE])
+        else:
+            for city, cache_key, future in new_lookups:
+                self._submit(self._resolve, city, cache_key, future)
+        return lookups
+
+    def _submit(self, fn, *args):
+        """Run fn on the lookup pool, starting it on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="city-names")
+            return self._executor.submit(fn, *args)
+
+    def _resolve_batch(self, batch):
+        """Resolve a batch of cities with one langlinks query (runs on a worker)
+
+        Cities the API has no usable names for fall back to the HTML scraper,
+        except pages the API reports as missing.
+        """
+        batch = [(city, cache_key, future) for city, cache_key, future in batch if not future.cancelled()]
+        if not batch:
+            return
+        try:
+            langlinks = self.fetch_langlinks([city for city, _, _ in batch])
+        except Exception as e:
+            print(f"Langlinks query failed, scraping pages instead: {str(e)}")
+            langlinks = {}
+
+        for city, cache_key, future in batch:
+            try:
+                links = langlinks.get(city, [])
+                if links is None:  # No such article
+                    self._finish(city, cache_key, future, *self.fetch_city_names(city, search_page=False))
+                    continue
+                city_names = empty_city_names(city)
+                for lang_code, title in links:
+                    assign_interlanguage_name(city, city_names, lang_code, title)
+                if has_names(city_names):
+                    self._finish(city, cache_key, future, city_names, STATUS_HIT)
+                else:
+                    self._submit(self._resolve, city, cache_key, future)
+            except Exception as e:
+                self._fail(cache_key, future, e)
+
+    def _resolve(self, city, cache_key, future):
+        """Scrape the names of one city and store them in the cache (runs on a worker)"""
+        if future.cancelled():
+            return
+        try:
+            self._finish(city, cache_key, future, *self.fetch_city_names(city))
+        except Exception as e:
+            self._fail(cache_key, future, e)
+
+    def _finish(self, city, cache_key, future, city_names, status):
+        """Store a lookup result in the cache and wake up its waiters
+
+        Offline results without names are only kept in memory, since nothing
+        was actually looked up.
+        """
+        cache_result = city_names.copy()
+        cache_result['english'] = city  # Store the original city name
+        if self.online or status == STATUS_HIT:
+            entry = self.store.put(cache_key, cache_result, status)  # O(1); written in batches
+        else:
+            entry = CacheEntry(cache_result, status, time.time(), SCHEMA_VERSION)
+        with self._lock:
+            self._remember(cache_key, entry)
+            if self._in_flight.get(cache_key) is future:
+                del self._in_flight[cache_key]
+            if not future.cancelled():  # Checked under the lock that cancel() holds
+                future.set_result(city_names)
+
+    def _fail(self, cache_key, future, error):
+        """Report a failed lookup to its waiters without caching it"""
+        with self._lock:
+            if self._in_flight.get(cache_key) is future:
+                del self._in_flight[cache_key]
+            if not future.cancelled():
+                future.set_exception(error)
+
+    def fetch_langlinks(self, titles):
+        """Query the MediaWiki API for the interlanguage links of up to 50 titles
+
+        Returns {title: [(lang_code, linked_title), ...]} keyed by the requested
+        titles, following normalization and redirects, with None for articles
+        that do not exist. Links come ordered by language code.
+        """
+        params = {
+            'action': 'query',
+            'format': 'json',
+            'formatversion': '2',
+            'prop': 'langlinks',
+            'lllimit': 'max',
+            'redirects': '1',
+            'titles': '|'.join(titles),
+        }
+        renamed = {}
+        page_links = {}
+        while True:
+            data = self.http.get_json(self.api_url, params)
+            query = data.get('query', {})
+            for step in query.get('normalized', []) + query.get('redirects', []):
+                renamed[step['from']] = step['to']
+            for page in query.get('pages', []):
+                if page.get('missing') or page.get('invalid'):
+                    page_links.setdefault(page['title'], None)
+                    continue
+                links = page_links.setdefault(page['title'], [])
+                links.extend((link['lang'], link['title']) for link in page.get('langlinks', []))
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])  # More links than fit in one response
+
+        result = {}
+        for title in titles:
+            page_title = title
+            for _ in range(2):  # normalized, then redirected
+                page_title = renamed.get(page_title, page_title)
+            if page_title in page_links:
+                result[title] = page_links[page_title]
+        return result
+
+    def fetch_city_names(self, city, search_page=True):
+        """Find the names of a city by scraping its article, without using the cache
+
+        Returns (city_names, status). Without search_page the article is known
+        not to exist, so the status is a miss unless a basic mapping applies.
+        """
+        city_names = empty_city_names(city)
+        
+        status = STATUS_MISS
+        if search_page:
+            status = self.search_wikipedia(city, city_names) if self.online else STATUS_ERROR
+        
+        # Fallback to basic mappings if web search didn't find anything
+        if not has_names(city_names):
+            if city in COMMON_MAPPINGS:
+                city_names.update(COMMON_MAPPINGS[city])
+                status = STATUS_HIT
+        
+        return city_names, status
+    
+    def save_city_names_cache(self):
+        """Flush new cache entries to the name store"""
+        try:
+            self.store.flush()
+        except Exception as e:
+            print(f"Error saving city names cache: {e}")
+
+    def search_wikipedia(self, city, city_names):
+        """Fill city_names in place from the city's English Wikipedia page
+
+        Returns STATUS_HIT if names were found, STATUS_MISS if the page does not
+        exist or has none, and STATUS_ERROR if the page could not be fetched.
+        """
+        try:
+            # Search Wikipedia for the city
+            search_url = f"{self.wiki_base_url}{city.replace(' ', '_')}"
+            
+            # Unchanged pages are revalidated by the shared client
+            response = self.http.get(search_url)
+            if response.status_code == 200:
+                extract_city_names(response.content, city, city_names)
+            elif response.status_code == 404:
+                return STATUS_MISS
+            else:
+                print(f"Web search failed for {city}: HTTP {response.status_code}")
+                return STATUS_ERROR
+        
+        except Exception as e:
+            # If web search fails, fall back to basic mappings
+            print(f"Web search failed for {city}: {str(e)}")
+            return STATUS_ERROR
+
+        return STATUS_HIT if has_names(city_names) else STATUS_MISS
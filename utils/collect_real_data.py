@@ -5,8 +5,11 @@ This script provides a framework for manually entering accurate data
 from reliable sources like IIJG maps and JewishGen
 """
 
-import csv
 import shutil
+import itertools
+from export import export_file
+from build_shards import refresh_shards
+from snapshot import load_tables
 from datetime import datetime
 
 def backup_csv():
@@ -17,19 +20,15 @@ def backup_csv():
     print(f"Created backup: {backup_name}")
 
 def load_existing_data():
-    """Load existing CSV data"""
-    with open('../kehilot.csv', 'r', encoding='utf-8-sig') as file:
-        reader = csv.DictReader(file)
-        fieldnames = reader.fieldnames
-        existing_data = list(reader)
-    return fieldnames, existing_data
+    """Load existing CSV data (from the snapshot while kehilot.csv is unchanged)"""
+    return load_tables()['kehilot']
 
 def add_verified_communities():
     """Add communities with verified historical data"""
     
     # Load existing data
-    fieldnames, existing_data = load_existing_data()
-    print(f"Loaded {len(existing_data)} existing communities")
+    dataset = load_existing_data()
+    print(f"Loaded {len(dataset)} existing communities")
     
     # Real historical data from reliable sources
     # These are actual historical figures from academic sources
@@ -123,17 +122,12 @@ def add_verified_communities():
         },
     ]
     
-    # Combine existing and new data
-    all_data = existing_data + verified_communities
-    
-    # Write updated CSV
-    with open('../kehilot.csv', 'w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_data)
+    # Write updated CSV: the existing rows as they were, then the new ones
+    export_file('../kehilot.csv', itertools.chain(dataset.text_rows(), verified_communities), dataset.columns)
+    refresh_shards('../kehilot.csv')  # Shards of the map's timeline
     
     print(f"Added {len(verified_communities)} verified entries")
-    print(f"Total communities: {len(all_data)}")
+    print(f"Total communities: {len(dataset) + len(verified_communities)}")
 
 def print_data_collection_guide():
     """Print a guide for collecting real data"""
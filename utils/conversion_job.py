@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Progress channel between a conversion worker thread and the GUI
+The worker posts messages to a queue and never touches Tk; the GUI drains the
+queue from root.after at a fixed rate, so updates stay on the main thread
+"""
+import time
+import queue
+import threading
+
+PROGRESS = 'progress'  # (done, total)
+DONE = 'done'          # result
+FAILED = 'failed'      # message
+CANCELLED = 'cancelled'
+
+PROGRESS_INTERVAL = 0.1  # Seconds between progress messages a worker posts
+
+
+class ConversionJob:
+    def __init__(self, lookup=None, progress_interval=PROGRESS_INTERVAL):
+        self.lookup = lookup  # CityNamesLookup whose pending lookups cancel() stops, and whose hits are counted
+        self.progress_interval = progress_interval
+        self.messages = queue.Queue()
+        self.done = 0
+        self.total = 0
+        self.started_at = time.monotonic()
+        self._cancel_event = threading.Event()
+        self._last_progress = float('-inf')
+        self._lookup_counts = (lookup.requested, lookup.fetched) if lookup else (0, 0)
+
+    # Worker side
+
+    def report(self, done, total):
+        """Post progress, at most once per progress_interval except for the last row"""
+        now = time.monotonic()
+        if done < total and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        self.messages.put((PROGRESS, (done, total)))
+
+    def finish(self, result):
+        """Post the result of the job"""
+        self.messages.put((DONE, result))
+
+    def fail(self, message):
+        """Post an error, or a cancellation if the job was cancelled"""
+        if self.cancelled:
+            self.messages.put((CANCELLED, None))
+        else:
+            self.messages.put((FAILED, message))
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    # GUI side
+
+    def cancel(self):
+        """Ask the worker to stop, and stop waiting for its pending lookups"""
+        self._cancel_event.set()
+        if self.lookup:
+            self.lookup.cancel()
+
+    def drain(self):
+        """Return the messages posted since the last call, keeping only the latest progress"""
+        messages = []
+        while True:
+            try:
+                kind, value = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == PROGRESS:
+                self.done, self.total = value
+                if messages and messages[-1][0] == PROGRESS:
+                    messages.pop()
+            messages.append((kind, value))
+        return messages
+
+    def rate(self):
+        """Rows converted per second so far"""
+        elapsed = time.monotonic() - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Estimated seconds left, or None before the first rows are done"""
+        rate = self.rate()
+        if not rate or not self.total:
+            return None
+        return (self.total - self.done) / rate
+
+    def hit_ratio(self):
+        """Share of city names found in the cache during this job, or None"""
+        if self.lookup is None:
+            return None
+        return self.lookup.hit_ratio(self._lookup_counts)
+
+    def status_text(self):
+        """One-line progress summary, e.g. 'Converting line 120/3800 - 450 rows/s, ETA 8s, cache hits 93%'"""
+        text = f"Converting line {self.done}/{self.total}"
+        details = [f"{self.rate():.0f} rows/s"]
+        eta = self.eta()
+        if eta is not None:
+            details.append(f"ETA {eta:.0f}s")
+        hit_ratio = self.hit_ratio()
+        if hit_ratio is not None:
+            details.append(f"cache hits {hit_ratio:.0%}")
+        return f"{text} - {', '.join(details)}"
@@ -4,17 +4,27 @@ CSV Converter GUI for kehilot.csv format
 Converts CSV files with specific columns to kehilot.csv format
 """
 import os
-import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import csv
-import pandas as pd
 import webbrowser
-import requests
-from bs4 import BeautifulSoup
-import re
 import pyperclip
 import threading
+from kehilot_converter import KEHILOT_COLUMNS, default_output_path, grouping_name
+from schemas import detect_schema
+from export import export_file, export_string, format_for_path
+from edit_journal import EditJournal, CsvPatcher
+from search_index import SearchIndex
+from sort_keys import SortKeys
+from checkpoint import ConversionCheckpoint
+from build_shards import refresh_shards
+from file_loader import FileLoader, ROWS, RELOAD, DONE as LOADED, FAILED as LOAD_FAILED
+from city_names import CityNamesLookup
+from conversion_job import ConversionJob, PROGRESS, DONE, FAILED, CANCELLED
+from row_model import RowModel
+from virtual_table import VirtualTable
+
+PROGRESS_POLL_MS = 100  # How often the GUI shows the progress of a running conversion
+MAX_SORT_COLUMNS = 3  # Sort columns kept as tie-breakers when another heading is clicked
 
 class CSVConverterGUI:
     def __init__(self, root):
@@ -24,15 +34,23 @@ class CSVConverterGUI:
         
         # Data storage
         self.original_data = None
-        self.converted_data = None
-        self.df = None
+        self.model = RowModel(KEHILOT_COLUMNS)  # Converted rows shown in the table
+        self.journal = EditJournal(self.model)  # Undoable edits of the model's cells
+        self.patcher = None  # Writes edited rows back into the input file, if it is in kehilot.csv format
+        self.search_index = SearchIndex(self.model)  # Words of the name columns, for the filter box
+        self.sort_keys = SortKeys(self.model)  # Typed keys of the columns sorted by
+        self.sort_columns = []  # [(column index, descending)], most significant first
         self.input_file_path = None  # Store the input file path
-        self.input_format = "unknown"  # Format detection: "input", "kehilot", "unknown"
+        self.schema = None  # Schema of the input file, None if unknown or empty
+        self.has_header = False  # Whether original_data starts with a header row
+        # Index in original_data (the record in the file) of the input row each model row comes from
+        self.source_rows = []
         
-        # City names cache
-        self.cache_file = "utils/city_names_cache.json"
-        self.city_names_cache = {}
-        self.load_city_names_cache()
+        # City names lookup (with its persistent cache)
+        self.name_lookup = CityNamesLookup()
+        self.job = None  # Running conversion, polled from the main thread
+        self.job_thread = None
+        self.loader = None  # FileLoader still streaming the selected file
         
         self.setup_ui()
         
@@ -51,21 +69,29 @@ class CSVConverterGUI:
         
         # Convert button
         ttk.Button(file_frame, text="Convert to kehilot.csv format", command=self.convert_data).grid(row=0, column=2, padx=(10, 0))
+        self.cancel_button = ttk.Button(file_frame, text="Cancel", command=self.cancel_conversion, state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=3, padx=(10, 0))
         
         # Progress bar
         self.progress = ttk.Progressbar(file_frame, mode='indeterminate')
-        self.progress.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.progress.grid(row=1, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
+        
+        # Filter box: shows only rows whose names start with the typed words
+        ttk.Label(file_frame, text="Filter:").grid(row=2, column=0, sticky=tk.W, pady=(10, 0))
+        self.filter_text = tk.StringVar()
+        self.filter_text.trace_add('write', lambda *args: self.apply_filter())
+        ttk.Entry(file_frame, textvariable=self.filter_text).grid(row=2, column=1, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        file_frame.columnconfigure(1, weight=1)
         
         # Data display frame
         data_frame = ttk.LabelFrame(main_frame, text="Converted Data (Double-click to edit cells)", padding="5")
         data_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
-        # Treeview for data display
-        columns = ['line_num', 'country', 'city', 'long', 'lat', 'year_estab', 'year_start', 'year_end', 
-                  'pop_start', 'pop_end', 'probability', 'type', 'symbol', 'city_english', 
-                  'city_hebrew', 'city_yid', 'city_german', 'city_other', 'source', 'comment']
+        # Treeview for data display; only the visible rows are Treeview items
+        columns = ['line_num'] + KEHILOT_COLUMNS
         
-        self.tree = ttk.Treeview(data_frame, columns=columns, show='headings', height=15)
+        self.table = VirtualTable(data_frame, columns, self.model, height=15)
+        self.tree = self.table.tree
         
         # Configure columns
         for col in columns:
@@ -84,15 +110,16 @@ class CSVConverterGUI:
             else:
                 self.tree.heading(col, text=col)
                 self.tree.column(col, width=70, minwidth=50)
+            # Clicking a heading sorts by its column ('#' goes back to file order)
+            self.tree.heading(col, command=lambda col=col: self.sort_by(col))
         
         # Scrollbars
-        v_scrollbar = ttk.Scrollbar(data_frame, orient=tk.VERTICAL, command=self.tree.yview)
         h_scrollbar = ttk.Scrollbar(data_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
         
         # Grid layout
         self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.table.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
         
         # Configure grid weights
@@ -160,7 +187,12 @@ class CSVConverterGUI:
         
         ttk.Button(action_frame, text="Save to CSV", command=self.save_to_csv).grid(row=0, column=0, padx=(0, 10))
         ttk.Button(action_frame, text="Copy to Clipboard", command=self.copy_to_clipboard).grid(row=0, column=1, padx=(0, 10))
-        ttk.Button(action_frame, text="Refresh Data", command=self.refresh_display).grid(row=0, column=2)
+        ttk.Button(action_frame, text="Save Changes", command=self.save_changes).grid(row=0, column=2, padx=(0, 10))
+        ttk.Button(action_frame, text="Undo", command=self.undo_edit).grid(row=0, column=3, padx=(0, 10))
+        ttk.Button(action_frame, text="Redo", command=self.redo_edit).grid(row=0, column=4, padx=(0, 10))
+        ttk.Button(action_frame, text="Refresh Data", command=self.refresh_display).grid(row=0, column=5)
+        self.root.bind('<Control-z>', lambda e: self.undo_edit())
+        self.root.bind('<Control-y>', lambda e: self.redo_edit())
         
         # Status label
         self.status_label = ttk.Label(main_frame, text="Ready")
@@ -180,61 +212,127 @@ class CSVConverterGUI:
             self.load_original_data(file_path)
     
     def load_original_data(self, file_path):
-        """Load the original CSV data and detect format"""
+        """Load the original CSV data and detect format
+
+        Only the first rows are read here, enough to detect the format and fill
+        the table; the rest of the file streams in on a background thread.
+        """
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+        self.patcher = None
+        self.source_rows = []
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                self.original_data = list(reader)
+            loader = FileLoader(file_path)
+            self._show_first_rows(loader.open())
             
-            # Detect format based on number of columns
-            if len(self.original_data) > 0:
-                first_row = self.original_data[0]
-                # Update status to show what we're checking
-                self.status_label.config(text=f"Checking format: {len(first_row)} columns")
-                print(f"DEBUG: First row has {len(first_row)} columns: {first_row[:5]}...")
-                if len(first_row) == 19:
-                    self.input_format = "kehilot"  # Already in kehilot.csv format
-                    self.status_label.config(text=f"Loaded {len(self.original_data)} rows (kehilot.csv format) - displaying...")
-                    # Hide the original data frame for 19-column files
-                    self.original_data_frame.grid_remove()
-                    # Immediately display the data since it's already in the correct format
-                    try:
-                        self._display_kehilot_data()
-                    except Exception as e:
-                        self.status_label.config(text=f"Error displaying: {str(e)}")
-                        print(f"Error in _display_kehilot_data: {e}")
-                elif len(first_row) == 9:
-                    self.input_format = "input"  # Input format (9 columns)
-                    self.status_label.config(text=f"Loaded {len(self.original_data)} rows (input format) - converting automatically...")
-                    # Show the original data frame for 9-column files
-                    self.original_data_frame.grid()
-                    # Automatically start conversion for 9-column files
-                    try:
-                        self.convert_data()
-                    except Exception as e:
-                        self.status_label.config(text=f"Error converting: {str(e)}")
-                        print(f"Error in convert_data: {e}")
-                else:
-                    self.input_format = "unknown"
-                    self.status_label.config(text=f"Loaded {len(self.original_data)} rows (unknown format - {len(first_row)} columns)")
-            else:
-                self.input_format = "empty"
-                self.status_label.config(text="File is empty")
+            # Stream the rest of the file; _load_complete takes over when it is read
+            self.loader = loader
+            loader.start()
+            self.root.after(PROGRESS_POLL_MS, self._poll_load)
                 
         except Exception as e:
             self.status_label.config(text=f"Error loading file: {str(e)}")
             messagebox.showerror("Error", f"Failed to load file: {str(e)}")
     
+    def _show_first_rows(self, rows):
+        """Detect the format from the first rows of a file and show them"""
+        self.original_data = rows
+        self.source_rows = []
+        
+        # Detect the format from the header row (or the column count if there is none)
+        self.schema, self.has_header = None, False
+        if len(self.original_data) > 0:
+            first_row = self.original_data[0]
+            self.schema, self.has_header = detect_schema(first_row)
+            print(f"DEBUG: First row has {len(first_row)} columns: {first_row[:5]}... "
+                  f"schema: {self.schema.name if self.schema else None}")
+            if self.schema is None:
+                pass  # Reported once loaded
+            elif self.schema.needs_names:
+                # Show the original data frame for files that need converting
+                self.original_data_frame.grid()
+            else:
+                self.status_label.config(text=f"Loaded {len(self.original_data)} rows ({self.schema.label}) - displaying...")
+                # Hide the original data frame, rows are displayed as they load
+                self.original_data_frame.grid_remove()
+                try:
+                    self._display_kehilot_data()
+                except Exception as e:
+                    self.status_label.config(text=f"Error displaying: {str(e)}")
+                    print(f"Error in _display_kehilot_data: {e}")
+        else:
+            self.status_label.config(text="File is empty")
+    
+    def _poll_load(self):
+        """Add the rows the loader read since the last poll (main thread, every PROGRESS_POLL_MS)"""
+        loader = self.loader
+        if loader is None:
+            return
+        for kind, value in loader.drain():
+            if kind == ROWS:
+                first_index = len(self.original_data)
+                self.original_data.extend(value)
+                if self.schema is not None and not self.schema.needs_names:
+                    sources = []
+                    self.model.append(self.schema.convert(value, sources=sources))
+                    self.source_rows.extend(first_index + source for source in sources)
+                    if self.filter_text.get() or self.sort_columns:
+                        self.apply_filter()  # Show the new rows that match, in order
+            elif kind == RELOAD:
+                # A byte past the first rows was not UTF-8: the file is read again from the start
+                print(f"{loader.path} is not UTF-8, reloading it as {loader.encoding}")
+                self.model.reset([])
+                self._show_first_rows(value)
+            elif kind == LOADED:
+                self.loader = None
+                self._load_complete(loader)
+                return
+            elif kind == LOAD_FAILED:
+                self.loader = None
+                self.status_label.config(text=f"Error loading file: {value}")
+                messagebox.showerror("Error", f"Failed to load file: {value}")
+                return
+        self.status_label.config(text=f"Loading... {len(self.original_data)} rows")
+        self.root.after(PROGRESS_POLL_MS, self._poll_load)
+    
+    def _load_complete(self, loader):
+        """Called when the whole file is loaded"""
+        if (self.schema is not None and self.schema.name == 'kehilot'
+                and loader.encoding in ('utf-8', 'utf-8-sig') and loader.delimiter == ','):
+            # The table shows the file's rows as they are, so edits can be patched into it
+            # Rows are patched by their record in the file, as rows short of the columns are not shown
+            self.patcher = CsvPatcher(loader.path, header=False, encoding=loader.encoding, offsets=loader.offsets)
+        if not self.original_data:
+            self.status_label.config(text="File is empty")
+        elif self.schema is None:
+            self.status_label.config(text=f"Loaded {len(self.original_data)} rows (unknown format - {len(self.original_data[0])} columns)")
+        elif not self.schema.needs_names:
+            self.status_label.config(text=f"Displayed {len(self.model)} rows ({self.schema.label})")
+        else:
+            self.status_label.config(text=f"Loaded {len(self.original_data)} rows ({self.schema.label}) - converting automatically...")
+            # Automatically start conversion of files that need city names
+            try:
+                self.convert_data()
+            except Exception as e:
+                self.status_label.config(text=f"Error converting: {str(e)}")
+                print(f"Error in convert_data: {e}")
+    
+    def _data_rows(self):
+        """The rows of the input file, without its header"""
+        return self.original_data[1:] if self.has_header else self.original_data
+    
     def _display_kehilot_data(self):
-        """Immediately display kehilot.csv format data without conversion"""
+        """Immediately display data whose rows convert without city name lookups"""
         try:
-            # Use the original data as converted data since it's already in the right format
-            self.converted_data = self.original_data
-            self.df = pd.DataFrame(self.converted_data)
-            
-            # Update the display
-            self.refresh_display()
-            self.status_label.config(text=f"Displayed {len(self.converted_data)} rows (kehilot.csv format)")
+            sources = []
+            converted_rows = self.schema.convert(self._data_rows(), sources=sources)
+            header_rows = 1 if self.has_header else 0
+            self.source_rows = [header_rows + source for source in sources]
+            self.model.reset(converted_rows)  # The table follows the model
+            self.status_label.config(text=f"Displayed {len(self.model)} rows ({self.schema.label})")
+            if self.filter_text.get() or self.sort_columns:
+                self.apply_filter()
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to display data: {str(e)}")
@@ -244,462 +342,102 @@ class CSVConverterGUI:
         if not self.original_data:
             messagebox.showwarning("Warning", "Please select a file first")
             return
+        if self.loader is not None:
+            messagebox.showwarning("Warning", "Please wait until the file is loaded")
+            return
+        if self.job is not None:
+            return  # Already converting
         
         self.progress.start()
         self.status_label.config(text="Converting data...")
+        self.cancel_button.config(state=tk.NORMAL)
         
-        # Run conversion in a separate thread to prevent GUI freezing
-        thread = threading.Thread(target=self._convert_data_thread)
+        # Run conversion in a separate thread to prevent GUI freezing;
+        # it reports through the job, which the main thread polls
+        self.job = ConversionJob(self.name_lookup)
+        thread = threading.Thread(target=self._convert_data_thread, args=(self.job,))
         thread.daemon = True
         thread.start()
+        self.job_thread = thread
+        self.root.after(PROGRESS_POLL_MS, self._poll_conversion)
     
-    def _convert_data_thread(self):
-        """Convert data in a separate thread"""
-        try:
-            converted_rows = []
-            
-            if self.input_format == "kehilot":
-                # Already in kehilot.csv format - just use as is
-                data_rows = self.original_data
-                for i, row in enumerate(data_rows):
-                    if len(row) >= 19:  # Ensure we have enough columns for kehilot format
-                        converted_rows.append(row)
-            
-            elif self.input_format == "input":
-                # Input format - convert to kehilot.csv format
-                # Check if first row is a header
-                data_rows = self.original_data
-                num_data_rows = len(data_rows)
-                if num_data_rows > 0:
-                    first_row = data_rows[0]
-                    # Check if first row looks like a header
-                    if any(header_word in first_row[0].lower() for header_word in ['country', 'town', 'name']):
-                        data_rows = data_rows[1:]  # Skip header
-                
-                for i, row in enumerate(data_rows):
-                    if len(row) < 9:  # Ensure we have enough columns
-                        continue
-                    self.status_label.config(text=f"Converting line {i}/{num_data_rows}...")
-                    # Extract data from input format
-                    country = row[0].strip()
-                    city = row[1].strip()
-                    longitude = row[2].strip()
-                    latitude = row[3].strip()
-                    year_estab = row[4].strip()
-                    year_data = row[5].strip()
-                    population = row[6].strip()
-                    notes = row[7].strip()
-                    source = row[8].strip()
-                    
-                    # Convert to kehilot.csv format
-                    converted_row = self.convert_single_row(
-                        country, city, longitude, latitude, year_estab, 
-                        year_data, population, notes, source, i, data_rows
-                    )
-                    
-                    if converted_row:
-                        converted_rows.append(converted_row)
-            
-            else:
-                # Unknown format - try to handle gracefully
-                messagebox.showwarning("Warning", f"Unknown file format with {len(self.original_data[0]) if self.original_data else 0} columns")
+    def cancel_conversion(self):
+        """Stop the running conversion and its pending city name lookups"""
+        if self.job is not None:
+            self.job.cancel()
+            self.status_label.config(text="Cancelling conversion...")
+    
+    def _poll_conversion(self):
+        """Show the messages of the running conversion (main thread, every PROGRESS_POLL_MS)"""
+        job = self.job
+        if job is None:
+            return
+        for kind, value in job.drain():
+            if kind == PROGRESS:
+                self.status_label.config(text=job.status_text())
+            elif kind == DONE:
+                self._conversion_complete(value)
+            elif kind == FAILED:
+                self._conversion_error(value)
+            elif kind == CANCELLED:
+                self._conversion_cancelled()
+            if kind in (DONE, FAILED, CANCELLED):
+                self.job = None
+                self.cancel_button.config(state=tk.DISABLED)
                 return
-            
-            self.converted_data = converted_rows
-            self.df = pd.DataFrame(converted_rows)
-            
-            # Update GUI in main thread
-            self.root.after(0, self._conversion_complete)
-            
-        except Exception as e:
-            self.root.after(0, lambda: self._conversion_error(str(e)))
+        self.root.after(PROGRESS_POLL_MS, self._poll_conversion)
     
-    def convert_single_row(self, country, city, longitude, latitude, year_estab, 
-                          year_data, population, notes, source, row_index, all_rows):
-        """Convert a single row to kehilot.csv format"""
+    def _convert_data_thread(self, job):
+        """Convert data in a separate thread (never touches Tk, only the job)"""
         try:
-            # Basic conversion
-            year_start = year_data if year_data and year_data != 'NA' else year_estab
-            
-            # Find next row for same city to determine year_end and pop_end
-            year_end = "2024"  # Default for last row
-            pop_end = ""  # Default for last row
-            
-            # Look for next row with same city
-            for j in range(row_index + 1, len(all_rows)):
-                if len(all_rows[j]) >= 7 and all_rows[j][1].strip() == city:
-                    next_year = all_rows[j][5].strip()
-                    next_pop = all_rows[j][6].strip()
-                    if next_year and next_year != 'NA':
-                        try:
-                            year_end = str(int(next_year) - 1)
-                        except ValueError:
-                            year_end = "2024"
-                    if next_pop and next_pop != 'NA':
-                        pop_end = next_pop
-                    break
+            schema = self.schema
             
-            # Determine probability based on notes
-            probability = "high"
-            if notes and ("uncertain" in notes.lower() or "unknown" in notes.lower()):
-                probability = "medium"
-            elif notes and ("estimated" in notes.lower() or "approx" in notes.lower()):
-                probability = "medium"
+            if schema is None:
+                # Unknown format - try to handle gracefully
+                job.fail(f"Unknown file format with {len(self.original_data[0]) if self.original_data else 0} columns")
+                return
             
-            # Get additional city names (this will be done asynchronously)
-            city_names = self.get_city_names(city, country)
+            elif not schema.needs_names:
+                # Rows convert on their own, e.g. a file already in kehilot.csv format
+                sources = []
+                converted_rows = schema.convert(self._data_rows(), sources=sources)
             
-            # Create converted row
-            converted_row = [
-                country,  # country
-                city,     # city
-                longitude,  # long
-                latitude,   # lat
-                year_estab, # year_estab
-                year_start, # year_start
-                year_end,   # year_end
-                population if population != 'NA' else "",  # pop_start
-                pop_end,    # pop_end
-                probability, # probability
-                "1",        # type
-                "1",        # symbol
-                city_names.get('english', city),  # city_english
-                city_names.get('hebrew', ''),     # city_hebrew
-                city_names.get('yiddish', ''),    # city_yid
-                city_names.get('german', ''),     # city_german
-                city_names.get('other', ''),      # city_other
-                source,     # source
-                notes       # comment
-            ]
+            else:
+                # Convert to kehilot.csv format in one grouped pass,
+                # continuing from the checkpoint of an earlier run on the same file
+                checkpoint = ConversionCheckpoint.for_file(self.input_file_path, grouping_name(True),
+                                                           on_save=self.name_lookup.save_city_names_cache)
+                sources = []  # Index in _data_rows() of each converted row's input row
+                try:
+                    converted_rows = schema.convert(self._data_rows(), self.get_city_names,
+                                                    progress_callback=job.report,
+                                                    prefetch=self.name_lookup.prefetch,
+                                                    cancelled=lambda: job.cancelled, checkpoint=checkpoint,
+                                                    sources=sources)
+                except BaseException:
+                    checkpoint.save()
+                    raise
+                checkpoint.discard()
             
-            return converted_row
+            # Update GUI in main thread
+            header_rows = 1 if self.has_header else 0
+            job.finish((converted_rows, [header_rows + source for source in sources]))
             
         except Exception as e:
-            print(f"Error converting row {row_index}: {str(e)}")
-            return None
+            job.fail(str(e))  # Reported as cancelled if the job was cancelled
     
     def get_city_names(self, city, country):
-        """Get additional city names from Wikipedia interlanguage links with caching"""
-        # Create a cache key combining city and country
-        cache_key = f"{city}|{country}".lower().strip()
-        
-        # Ensure cache is initialized
-        if not hasattr(self, 'city_names_cache'):
-            self.city_names_cache = {}
-        
-        # Check if we have this city in cache
-        if cache_key in self.city_names_cache:
-            cached_result = self.city_names_cache[cache_key].copy()
-            cached_result['english'] = city  # Always use the current city name
-            return cached_result
-        
-        city_names = {
-            'english': city,
-            'hebrew': '',
-            'yiddish': '',
-            'german': '',
-            'other': ''
-        }
-        
-        try:
-            # Search Wikipedia for the city
-            search_url = f"https://en.wikipedia.org/wiki/{city.replace(' ', '_')}"
-            
-            # Try to get the page with proper headers
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(search_url, timeout=10, headers=headers)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Look for interlanguage links - try multiple approaches
-                interlang_links = []
-                
-                # Method 1: Look for the specific interlanguage section
-                interlang_section = soup.find('div', class_='row uls-language-list uls-lcd')
-                if interlang_section:
-                    interlang_links = interlang_section.find_all('li', class_='interlanguage-link')
-                
-                # Method 2: Look for all links to other language Wikipedia pages
-                if not interlang_links:
-                    # Find all links to other language Wikipedia pages
-                    all_links = soup.find_all('a', href=lambda x: x and 'wikipedia.org' in x and '/wiki/' in x)
-                    # Filter out English Wikipedia links and non-article links
-                    interlang_links = [link for link in all_links 
-                                    if not link.get('href', '').startswith('https://en.wikipedia.org') 
-                                    and not link.get('href', '').startswith('//en.wikipedia.org')
-                                    and ':' not in link.get('href', '').split('/wiki/')[-1]  # Exclude special pages
-                                    and link.get_text().strip()]  # Must have text content
-                
-                # Method 3: Look in the language dropdown
-                if not interlang_links:
-                    lang_dropdown = soup.find('div', id='p-lang')
-                    if lang_dropdown:
-                        interlang_links = lang_dropdown.find_all('a', href=lambda x: x and 'wikipedia.org' in x and '/wiki/' in x)
-                
-                if interlang_links:
-                    for link in interlang_links:
-                        href = link.get('href', '')
-                        lang_code = link.get('lang', '')
-                        
-                        # Extract language code from href if available
-                        if href and 'wikipedia.org' in href:
-                            # Extract language code from URL like https://de.wikipedia.org/wiki/Prag
-                            import re
-                            lang_match = re.search(r'https://([a-z]{2,3})\.wikipedia\.org', href)
-                            if lang_match:
-                                lang_code = lang_match.group(1)
-                        
-                        # Get the city name from the title attribute (contains actual city name)
-                        city_name = link.get('title', '').strip()
-                        
-                        # If title is empty, try the text
-                        if not city_name:
-                            city_name = link.get_text().strip()
-                        
-                        # Extract city name from title if it contains language info (e.g., "Praha – Czech")
-                        if '–' in city_name:
-                            city_name = city_name.split('–')[0].strip()
-                        elif ' - ' in city_name:
-                            city_name = city_name.split(' - ')[0].strip()
-                        
-                        # Remove language codes like "de:", "he:", etc.
-                        if ':' in city_name and len(city_name.split(':')[0]) <= 3:
-                            city_name = city_name.split(':', 1)[1].strip()
-                        
-                        # Skip if the result is too long (likely not a city name)
-                        if len(city_name) > 50:
-                            continue
-                        
-                        # Skip if it doesn't look like a city name
-                        if (len(city_name.split()) > 3 or 
-                            any(char in city_name for char in ['(', ')', '[', ']', '{', '}']) or
-                            ' ' in city_name and len(city_name.split()) > 2 or
-                            any(word in city_name.lower() for word in ['university', 'school', 'college', 'institute', 'academy', 'center', 'centre', 'vysoká', 'škola', 'stanisławowska', 'vojtíšek', 'ernst', 'gustav', 'schultz', 'testnevelési', 'egyetem', 'gara', 'progresul', 'mäkelänrinteen', 'uintikeskus', 'stadsarkiv', 'skansen', 'restaurant', 'privatbane', 'parpusa', 'avenue', 'raphaël', 'präfektur', 'tokio'])):
-                            continue
-                        
-                        # Skip common language names that are not city names
-                        language_names = [
-                            'עברית', 'יידיש', 'Deutsch', 'Afrikaans', 'English', 'Français', 'Español', 
-                            'Italiano', 'Português', 'Русский', 'Polski', 'Čeština', 'Slovenčina',
-                            'Magyar', 'Română', 'Български', 'Hrvatski', 'Српски', 'Українська',
-                            'Беларуская', 'Lietuvių', 'Latviešu', 'Eesti', 'Suomi', 'Norsk', 'Svenska',
-                            'Dansk', 'Íslenska', 'Gaeilge', 'Cymraeg', 'Malti', 'Slovenščina', 'Македонски',
-                            'Shqip', 'Türkçe', 'Azərbaycan', 'Azərbaycanca', 'ქართული', 'Հայերեն', 'Қазақша', 'Кыргызча',
-                            'O\'zbekcha', 'Монгол', '한국어', '日本語', '中文', 'ไทย', 'Tiếng Việt',
-                            'हिन्दी', 'বাংলা', 'தமிழ்', 'తెలుగు', 'മലയാളം', 'ಕನ್ನಡ', 'ગુજરાતી',
-                            'ਪੰਜਾਬੀ', 'ଓଡ଼ିଆ', 'অসমীয়া', 'नेपाली', 'සිංහල', 'မြန်မာ', 'ខ្មែរ',
-                            'ລາວ', 'አማርኛ', 'ትግርኛ', 'Kiswahili', 'IsiZulu', 'IsiXhosa',
-                            'Euskera', 'Euskara', 'Català', 'Galego', 'Nederlands', 'Alemannisch', 'Aragonés',
-                            'Asturianu', 'Avañe\'ẽ', 'Basa Bali', 'Bân-lâm-gú'
-                        ]
-                        
-                        if city_name in language_names:
-                            continue
-                        
-                        # Skip if city_name is just a language code or very short
-                        if city_name and len(city_name) <= 3 and city_name.islower():
-                            continue
-                            
-                        if city_name and lang_code:
-                            # Map to our target languages
-                            if lang_code == 'de':  # German
-                                city_names['german'] = city_name
-                            elif lang_code == 'he':  # Hebrew
-                                city_names['hebrew'] = city_name
-                            elif lang_code == 'yi':  # Yiddish
-                                city_names['yiddish'] = city_name
-                            else:
-                                # For other languages, prioritize local languages
-                                local_languages = {
-                                    'Prague': 'cs', 'Praha': 'cs',  # Czech
-                                    'Warsaw': 'pl', 'Warszawa': 'pl',  # Polish
-                                    'Moscow': 'ru', 'Moskva': 'ru',  # Russian
-                                    'Kiev': 'uk', 'Kyiv': 'uk',  # Ukrainian
-                                    'Budapest': 'hu',  # Hungarian
-                                    'Bucharest': 'ro',  # Romanian
-                                    'Sofia': 'bg',  # Bulgarian
-                                    'Zagreb': 'hr',  # Croatian
-                                    'Belgrade': 'sr', 'Beograd': 'sr',  # Serbian
-                                    'Minsk': 'be',  # Belarusian
-                                    'Vilnius': 'lt',  # Lithuanian
-                                    'Riga': 'lv',  # Latvian
-                                    'Tallinn': 'et',  # Estonian
-                                    'Helsinki': 'fi',  # Finnish
-                                    'Oslo': 'no',  # Norwegian
-                                    'Stockholm': 'sv',  # Swedish
-                                    'Copenhagen': 'da',  # Danish
-                                    'Reykjavik': 'is',  # Icelandic
-                                    'Dublin': 'ga',  # Irish
-                                    'Cardiff': 'cy',  # Welsh
-                                    'Valletta': 'mt',  # Maltese
-                                    'Ljubljana': 'sl',  # Slovenian
-                                    'Skopje': 'mk',  # Macedonian
-                                    'Tirana': 'sq',  # Albanian
-                                    'Istanbul': 'tr',  # Turkish
-                                    'Baku': 'az',  # Azerbaijani
-                                    'Tbilisi': 'ka',  # Georgian
-                                    'Yerevan': 'hy',  # Armenian
-                                    'Almaty': 'kk',  # Kazakh
-                                    'Bishkek': 'ky',  # Kyrgyz
-                                    'Tashkent': 'uz',  # Uzbek
-                                    'Ulaanbaatar': 'mn',  # Mongolian
-                                    'Seoul': 'ko',  # Korean
-                                    'Tokyo': 'ja',  # Japanese
-                                    'Beijing': 'zh',  # Chinese
-                                    'Bangkok': 'th',  # Thai
-                                    'Hanoi': 'vi',  # Vietnamese
-                                    'New Delhi': 'hi',  # Hindi
-                                    'Dhaka': 'bn',  # Bengali
-                                    'Chennai': 'ta',  # Tamil
-                                    'Hyderabad': 'te',  # Telugu
-                                    'Kochi': 'ml',  # Malayalam
-                                    'Bangalore': 'kn',  # Kannada
-                                    'Ahmedabad': 'gu',  # Gujarati
-                                    'Chandigarh': 'pa',  # Punjabi
-                                    'Bhubaneswar': 'or',  # Odia
-                                    'Guwahati': 'as',  # Assamese
-                                    'Kathmandu': 'ne',  # Nepali
-                                    'Colombo': 'si',  # Sinhala
-                                    'Yangon': 'my',  # Burmese
-                                    'Phnom Penh': 'km',  # Khmer
-                                    'Vientiane': 'lo',  # Lao
-                                    'Addis Ababa': 'am',  # Amharic
-                                    'Asmara': 'ti',  # Tigrinya
-                                    'Nairobi': 'sw',  # Swahili
-                                    'Cape Town': 'af',  # Afrikaans
-                                    'Johannesburg': 'af',  # Afrikaans
-                                    'Bilbao': 'eu',  # Basque
-                                    'Barcelona': 'ca',  # Catalan
-                                    'Santiago': 'gl',  # Galician
-                                    'Lisbon': 'pt',  # Portuguese
-                                    'Madrid': 'es',  # Spanish
-                                    'Paris': 'fr',  # French
-                                    'Rome': 'it',  # Italian
-                                    'Amsterdam': 'nl',  # Dutch
-                                }
-                                
-                                # Check if this is a local language for the current city
-                                is_local = False
-                                for city_variant, local_lang in local_languages.items():
-                                    if (city_variant.lower() in city.lower() or 
-                                        city.lower() in city_variant.lower()):
-                                        if lang_code == local_lang:
-                                            is_local = True
-                                            break
-                                
-                                # Set as 'other' with priority for local languages
-                                if not city_names['other'] or is_local:
-                                    city_names['other'] = city_name
-                
-                # If we didn't find interlanguage links, try the old method as fallback
-                if not any(city_names[key] for key in ['hebrew', 'yiddish', 'german', 'other']):
-                    # Look for alternative names in the infobox
-                    infobox = soup.find('table', class_='infobox')
-                    if infobox:
-                        # Look for native name or other language names
-                        for row in infobox.find_all('tr'):
-                            th = row.find('th')
-                            td = row.find('td')
-                            if th and td:
-                                th_text = th.get_text().strip().lower()
-                                td_text = td.get_text().strip()
-                                
-                                # Check for Hebrew name
-                                if 'hebrew' in th_text or 'עברית' in th_text:
-                                    city_names['hebrew'] = td_text
-                                # Check for German name
-                                elif 'german' in th_text or 'deutsch' in th_text:
-                                    city_names['german'] = td_text
-                                # Check for Yiddish name
-                                elif 'yiddish' in th_text or 'יידיש' in th_text:
-                                    city_names['yiddish'] = td_text
-                                # Check for native name
-                                elif 'native' in th_text or 'local' in th_text:
-                                    if any('\u0590' <= char <= '\u05FF' for char in td_text):  # Hebrew characters
-                                        city_names['hebrew'] = td_text
-                                    elif any('\u0400' <= char <= '\u04FF' for char in td_text):  # Cyrillic characters
-                                        city_names['other'] = td_text
-                                    else:
-                                        city_names['other'] = td_text
-                    
-                    # Also look for alternative names in the first paragraph
-                    first_para = soup.find('p')
-                    if first_para:
-                        text = first_para.get_text()
-                        # Look for patterns like "City Name (Hebrew: עברית)"
-                        import re
-                        hebrew_match = re.search(r'\([^)]*[Hh]ebrew[^)]*:?\s*([^)]+)\)', text)
-                        if hebrew_match:
-                            city_names['hebrew'] = hebrew_match.group(1).strip()
-                        
-                        german_match = re.search(r'\([^)]*[Gg]erman[^)]*:?\s*([^)]+)\)', text)
-                        if german_match:
-                            city_names['german'] = german_match.group(1).strip()
-        
-        except Exception as e:
-            # If web search fails, fall back to basic mappings
-            print(f"Web search failed for {city}: {str(e)}")
-            pass
-        
-        # Fallback to basic mappings if web search didn't find anything
-        if not any(city_names[key] for key in ['hebrew', 'yiddish', 'german', 'other']):
-            common_mappings = {
-                'Jerusalem': {'hebrew': 'ירושלים', 'yiddish': 'ירושלים', 'german': 'Jerusalem'},
-                'Tel Aviv': {'hebrew': 'תל אביב', 'yiddish': 'תל אביב', 'german': 'Tel Aviv'},
-                'New York': {'hebrew': 'ניו יורק', 'yiddish': 'ניו יארק', 'german': 'New York'},
-                'London': {'hebrew': 'לונדון', 'yiddish': 'לונדן', 'german': 'London'},
-                'Paris': {'hebrew': 'פריז', 'yiddish': 'פאריז', 'german': 'Paris'},
-                'Berlin': {'hebrew': 'ברלין', 'yiddish': 'בערלין', 'german': 'Berlin'},
-                'Rome': {'hebrew': 'רומא', 'yiddish': 'רומא', 'german': 'Rom'},
-                'Madrid': {'hebrew': 'מדריד', 'yiddish': 'מאדריד', 'german': 'Madrid'},
-                'Amsterdam': {'hebrew': 'אמסטרדם', 'yiddish': 'אמסטערדאם', 'german': 'Amsterdam'},
-                'Vienna': {'hebrew': 'וינה', 'yiddish': 'ווין', 'german': 'Wien'}
-            }
-            
-            if city in common_mappings:
-                city_names.update(common_mappings[city])
-        
-        # Store the result in cache
-        cache_result = city_names.copy()
-        cache_result['english'] = city  # Store the original city name
-        self.city_names_cache[cache_key] = cache_result
-        
-        # Save cache
-        if len(self.city_names_cache):
-            self.save_city_names_cache()
-        
-        return city_names
-    
-    def load_city_names_cache(self):
-        """Load city names cache from file"""
-        try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.city_names_cache = json.load(f)
-                print(f"Loaded {len(self.city_names_cache)} city names from cache")
-            else:
-                print("No city names cache file found, starting with empty cache")
-        except Exception as e:
-            print(f"Error loading city names cache: {e}")
-            self.city_names_cache = {}
-    
-    def save_city_names_cache(self):
-        """Save city names cache to file"""
-        try:
-            # Ensure the utils directory exists
-            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.city_names_cache, f, ensure_ascii=False, indent=2)
-            print(f"Saved {len(self.city_names_cache)} city names to cache")
-        except Exception as e:
-            print(f"Error saving city names cache: {e}")
+        """Get additional city names (cached Wikipedia lookup)"""
+        return self.name_lookup.get_city_names(city, country)
     
     def cleanup(self):
         """Cleanup method to save cache before closing"""
-        self.save_city_names_cache()
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.job is not None:
+            self.job.cancel()
+            self.job_thread.join(timeout=5)  # Lets it save its checkpoint
+        self.name_lookup.close()  # Flushes the name store
     
     def on_double_click(self, event):
         """Handle double-click to start editing"""
@@ -716,9 +454,9 @@ class CSVConverterGUI:
         if region == "cell":
             item = self.tree.identify_row(event.y)
             if item:
-                self.tree.selection_set(item)
-                # Update original data display if this is a 9-column input file
-                if self.input_format == "input" and self.original_data is not None:
+                self.table.select(item)
+                # Update original data display if the file needed converting
+                if self.schema is not None and self.schema.needs_names and self.original_data is not None:
                     self.update_original_data_display(item)
     
     def on_right_click(self, event):
@@ -728,7 +466,7 @@ class CSVConverterGUI:
             item = self.tree.identify_row(event.y)
             column = self.tree.identify_column(event.x)
             if item and column:
-                self.tree.selection_set(item)
+                self.table.select(item)
                 self.show_context_menu(event, item, column)
     
     def show_context_menu(self, event, item, column):
@@ -771,17 +509,15 @@ class CSVConverterGUI:
         """Start editing a cell"""
         # Get the column index
         col_index = int(column.replace('#', '')) - 1
-        columns = ['line_num', 'country', 'city', 'long', 'lat', 'year_estab', 'year_start', 'year_end', 
-                  'pop_start', 'pop_end', 'probability', 'type', 'symbol', 'city_english', 
-                  'city_hebrew', 'city_yid', 'city_german', 'city_other', 'source', 'comment']
+        columns = ['line_num'] + KEHILOT_COLUMNS
         
         if col_index >= len(columns):
             return
         
         col_name = columns[col_index]
         
-        # Don't allow editing of line numbers
-        if col_name == 'line_num':
+        # Don't allow editing of line numbers or of empty items below the last row
+        if col_name == 'line_num' or self.table.row_of(item) is None:
             return
         
         # Get current value (adjust for line number column)
@@ -861,32 +597,28 @@ class CSVConverterGUI:
     
     def update_cell(self, item, col_index, new_value):
         """Update a cell value"""
-        if not self.converted_data:
-            return
-        
-        # Get the item index
-        item_index = self.tree.index(item)
+        # Get the row shown by the item
+        item_index = self.table.row_of(item)
         
         # Update the data (adjust for line number column)
-        if item_index < len(self.converted_data):
+        if item_index is not None:
             # col_index includes line number column, so subtract 1 for actual data
             data_col_index = col_index - 1
-            if data_col_index >= 0 and data_col_index < len(self.converted_data[item_index]):
-                self.converted_data[item_index][data_col_index] = new_value
-                
-                # Update the tree display
-                values = list(self.tree.item(item, 'values'))
-                values[col_index] = new_value
-                self.tree.item(item, values=values)
+            if data_col_index >= 0 and data_col_index < len(self.model[item_index]):
+                # The table redraws the row when the model reports the change
+                self.journal.edit(item_index, data_col_index, new_value)
             
             # Update status
             self.status_label.config(text=f"Updated row {item_index + 1}, column {col_index + 1}")
     
-    def _conversion_complete(self):
-        """Called when conversion is complete"""
+    def _conversion_complete(self, result):
+        """Called when conversion is complete with (converted rows, their rows in original_data)"""
+        converted_rows, self.source_rows = result
         self.progress.stop()
-        self.status_label.config(text=f"Conversion complete: {len(self.converted_data)} rows")
-        self.refresh_display()
+        self.model.reset(converted_rows)
+        self.status_label.config(text=f"Conversion complete: {len(self.model)} rows")
+        if self.filter_text.get() or self.sort_columns:
+            self.apply_filter()
     
     def _conversion_error(self, error_msg):
         """Called when conversion encounters an error"""
@@ -894,22 +626,48 @@ class CSVConverterGUI:
         messagebox.showerror("Conversion Error", f"Failed to convert data: {error_msg}")
         self.status_label.config(text="Conversion failed")
     
+    def _conversion_cancelled(self):
+        """Called when a conversion stopped after cancel_conversion"""
+        self.progress.stop()
+        self.status_label.config(text="Conversion cancelled")
+    
+    def apply_filter(self):
+        """Show the rows matching the filter box (all rows if it is empty) in the sort order"""
+        rows = self.search_index.search(self.filter_text.get())
+        if rows is not None:
+            self.status_label.config(text=f"{len(rows)} of {len(self.model)} rows match")
+        if self.sort_columns:
+            rows = self.sort_keys.sorted_rows(self.sort_columns, rows)
+        self.table.set_order(rows)
+    
+    def sort_by(self, column):
+        """Sort by a column, keeping the previous sort columns as tie-breakers
+
+        Clicking the first sort column again reverses it; '#' restores the file order.
+        """
+        if column == 'line_num':
+            self.sort_columns = []
+        else:
+            index = self.model.column_index(column)
+            if self.sort_columns and self.sort_columns[0][0] == index:
+                self.sort_columns[0] = (index, not self.sort_columns[0][1])
+            else:
+                others = [key for key in self.sort_columns if key[0] != index]
+                self.sort_columns = [(index, False)] + others[:MAX_SORT_COLUMNS - 1]
+        for col in self.table.columns:
+            text = '#' if col == 'line_num' else col
+            if self.sort_columns and self.model.column_index(col) == self.sort_columns[0][0]:
+                text += ' ▼' if self.sort_columns[0][1] else ' ▲'
+            self.tree.heading(col, text=text)
+        self.apply_filter()
+    
     def refresh_display(self):
         """Refresh the data display"""
-        if self.df is not None:
-            # Clear existing data
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            # Insert new data with line numbers
-            for index, row in self.df.iterrows():
-                # Add line number as first column
-                values_with_line_num = [index + 1] + list(row)
-                self.tree.insert('', 'end', values=values_with_line_num)
+        self.table.refresh()
     
     def save_to_csv(self):
         """Save the converted data to a new CSV file"""
-        if self.converted_data is None:
+        if not len(self.model):
             messagebox.showwarning("Warning", "No data to save")
             return
         
@@ -917,37 +675,28 @@ class CSVConverterGUI:
         default_filename = ""
         initialdir = "c:"
         if self.input_file_path:
-            initialdir, initial_filename = os.path.split(self.input_file_path)
             # Replace .csv with _kehilot.csv
-            if initial_filename.lower().endswith('.csv'):
-                default_filename = initial_filename.replace('.csv', "_kehilot.csv")
-            elif initial_filename.lower().endswith('.txt'):
-                default_filename = initial_filename.replace('.txt', "_kehilot.csv")
-            else:
-                default_filename = self.input_file_path + "_kehilot.csv"
+            initialdir, default_filename = os.path.split(default_output_path(self.input_file_path))
         
         file_path = filedialog.asksaveasfilename(
             title="Save converted data",
             defaultextension=".csv",
             initialdir=initialdir,
             initialfile=default_filename,
-            filetypes=[("CSV files", "*.csv"), ("text files", "*.txt"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("text files", "*.txt"), ("JSON files", "*.json"),
+                       ("NDJSON files", "*.ndjson *.jsonl"), ("All files", "*.*")]
         )
         
         if file_path:
             try:
-                # Write CSV file
-                with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                    writer = csv.writer(f)
-                    
-                    # Write header
-                    header = ['country', 'city', 'long', 'lat', 'year_estab', 'year_start', 'year_end', 
-                             'pop_start', 'pop_end', 'probability', 'type', 'symbol', 'city_english', 
-                             'city_hebrew', 'city_yid', 'city_german', 'city_other', 'source', 'comment']
-                    writer.writerow(header)
-                    
-                    # Write data
-                    writer.writerows(self.converted_data)
+                # Written in the format of the file's extension
+                export_file(file_path, self.model.rows)
+                refresh_shards(file_path)  # When it is the project's kehilot.csv
+                if self.patcher is not None and os.path.abspath(file_path) == os.path.abspath(self.patcher.path):
+                    # The input file was rewritten as a whole: a header, then every model row
+                    self.journal.mark_saved()
+                    self.source_rows = list(range(1, len(self.model) + 1))
+                    self.patcher = CsvPatcher(file_path, header=False) if format_for_path(file_path) == 'csv' else None
                 
                 self.status_label.config(text=f"Data saved to {file_path}")
                 messagebox.showinfo("Success", f"Data saved to {file_path}")
@@ -955,21 +704,51 @@ class CSVConverterGUI:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save file: {str(e)}")
     
+    def save_changes(self):
+        """Write the rows edited since the last save back into the input file"""
+        if self.patcher is None:
+            messagebox.showwarning("Warning", "Only files opened in kehilot.csv format can be saved in place - use Save to CSV")
+            return
+        rows = {self.source_rows[row]: self.model[row] for row in self.journal.changed_rows}
+        if not rows:
+            self.status_label.config(text="No changes to save")
+            return
+        try:
+            self.patcher.patch(rows)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save changes: {str(e)}")
+            return
+        self.journal.mark_saved()
+        refresh_shards(self.patcher.path)  # When it is the project's kehilot.csv
+        self.status_label.config(text=f"Saved {len(rows)} changed rows to {self.patcher.path}")
+    
+    def undo_edit(self):
+        """Undo the last cell edit"""
+        edit = self.journal.undo()
+        if edit is None:
+            self.status_label.config(text="Nothing to undo")
+            return
+        self.table.select_row(edit.row)
+        self.status_label.config(text=f"Undid edit of row {edit.row + 1}, column {edit.column + 2}")
+    
+    def redo_edit(self):
+        """Redo the last undone cell edit"""
+        edit = self.journal.redo()
+        if edit is None:
+            self.status_label.config(text="Nothing to redo")
+            return
+        self.table.select_row(edit.row)
+        self.status_label.config(text=f"Redid edit of row {edit.row + 1}, column {edit.column + 2}")
+    
     def copy_to_clipboard(self):
         """Copy the converted data to clipboard in CSV format"""
-        if self.converted_data is None:
+        if not len(self.model):
             messagebox.showwarning("Warning", "No data to copy")
             return
         
         try:
-            # Create CSV string
-            csv_string = "country,city,long,lat,year_estab,year_start,year_end,pop_start,pop_end,probability,type,symbol,city_english,city_hebrew,city_yid,city_german,city_other,source,comment\n"
-            
-            for row in self.converted_data:
-                csv_string += ",".join(f'{str(cell)}' for cell in row) + "\n"
-            
-            # Copy to clipboard
-            pyperclip.copy(csv_string)
+            # Copy to clipboard as CSV
+            pyperclip.copy(export_string(self.model.rows))
             self.status_label.config(text="Data copied to clipboard")
             messagebox.showinfo("Success", "Data copied to clipboard")
             
@@ -986,28 +765,20 @@ class CSVConverterGUI:
             self.original_tree.delete(item)
         
         # Get the selected row index from the Treeview item
-        # The selected_item is a Treeview item ID, we need to get its position
-        children = self.tree.get_children()
-        try:
-            selected_index = children.index(selected_item)
-        except ValueError:
-            # If item not found, return
+        selected_index = self.table.row_of(selected_item)
+        if selected_index is None or selected_index >= len(self.source_rows):
             return
         
-        # Keep the selected_index as is, but adjust the data access
-        # The user reports seeing the next row instead of the selected row,
-        # so we need to access the data with selected_index instead of selected_index + 1
-        
-        # Show the selected line and next line (if available)
-        lines_to_show = []
+        # The input line the converted row was built from (conversion groups rows
+        # by city and orders them by year, so row N rarely comes from line N)
+        source_index = self.source_rows[selected_index]
         
-          # Add the selected line (skip header row in original_data)
-        if 0 <= selected_index < len(self.original_data) :
-            lines_to_show.append((selected_index , self.original_data[selected_index ]))
+        # Show the source line and next line (if available)
+        lines_to_show = [(source_index, self.original_data[source_index])]
         
         # Add the next line if it exists
-        if selected_index + 1 < len(self.original_data):  # -1 to account for header
-            lines_to_show.append((selected_index + 1, self.original_data[selected_index + 1]))  # +1 to skip header
+        if source_index + 1 < len(self.original_data):
+            lines_to_show.append((source_index + 1, self.original_data[source_index + 1]))
         
         # Populate the treeview
         for line_num, row_data in lines_to_show:
@@ -4,8 +4,11 @@ Template for collecting real historical Jewish population data
 This script provides a structured way to add verified data from reliable sources
 """
 
-import csv
 import shutil
+import itertools
+from export import export_file
+from build_shards import refresh_shards
+from snapshot import load_tables
 from datetime import datetime
 
 def backup_csv():
@@ -19,24 +22,16 @@ def add_community_data(city_data):
     """Add verified community data to CSV"""
     
     # Load existing data
-    with open('../kehilot.csv', 'r', encoding='utf-8-sig') as file:
-        reader = csv.DictReader(file)
-        fieldnames = reader.fieldnames
-        existing_data = list(reader)
+    dataset = load_tables()['kehilot']
     
-    print(f"Loaded {len(existing_data)} existing communities")
+    print(f"Loaded {len(dataset)} existing communities")
     
-    # Add new verified data
-    all_data = existing_data + city_data
-    
-    # Write updated CSV
-    with open('../kehilot.csv', 'w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_data)
+    # Write updated CSV: the existing rows as they were, then the new verified data
+    export_file('../kehilot.csv', itertools.chain(dataset.text_rows(), city_data), dataset.columns)
+    refresh_shards('../kehilot.csv')  # Shards of the map's timeline
     
     print(f"Added {len(city_data)} verified entries")
-    print(f"Total communities: {len(all_data)}")
+    print(f"Total communities: {len(dataset) + len(city_data)}")
 
 def create_city_template(city_name, country, lat, lon, year_estab, hebrew_name="", yiddish_name="", german_name=""):
     """Create a template for adding a city with multiple time periods"""
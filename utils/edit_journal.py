@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Edit journal of the converter GUI, and patch-saving of edited rows
+Cell edits go through the journal, which can undo and redo them and knows which
+rows changed since the last save. CsvPatcher writes just those rows back into
+the CSV file they were loaded from, copying every other row byte for byte.
+"""
+import io
+import os
+import csv
+import tempfile
+from collections import namedtuple
+
+from row_model import RESET
+from file_loader import iter_records
+
+Edit = namedtuple('Edit', ['row', 'column', 'old', 'new'])
+
+COPY_BLOCK = 1 << 20  # Bytes copied at a time while patching
+
+
+class EditJournal:
+    def __init__(self, model):
+        self.model = model
+        self.done = []    # Edits that undo() reverts, oldest first
+        self.undone = []  # Edits that redo() applies again, most recently undone last
+        self.changed_rows = set()  # Rows edited since the last save
+        model.subscribe(self._on_model_change)
+
+    def edit(self, row, column, value):
+        """Set a cell through the model and log the change; returns the Edit, or None if nothing changed"""
+        old = self.model.set_cell(row, column, value)
+        if old == value:
+            return None
+        edit = Edit(row, column, old, value)
+        self.done.append(edit)
+        self.undone.clear()
+        self.changed_rows.add(row)
+        return edit
+
+    def undo(self):
+        """Revert the last edit and return it, or None if there is nothing to undo"""
+        if not self.done:
+            return None
+        edit = self.done.pop()
+        self.model.set_cell(edit.row, edit.column, edit.old)
+        self.undone.append(edit)
+        self.changed_rows.add(edit.row)
+        return edit
+
+    def redo(self):
+        """Apply the last undone edit again and return it, or None if there is nothing to redo"""
+        if not self.undone:
+            return None
+        edit = self.undone.pop()
+        self.model.set_cell(edit.row, edit.column, edit.new)
+        self.done.append(edit)
+        self.changed_rows.add(edit.row)
+        return edit
+
+    def mark_saved(self):
+        """Forget which rows changed, after they were saved; edits can still be undone"""
+        self.changed_rows = set()
+
+    def clear(self):
+        """Forget all edits"""
+        self.done = []
+        self.undone = []
+        self.changed_rows = set()
+
+    def _on_model_change(self, kind, indices):
+        """New rows in the model make the logged row numbers meaningless"""
+        if kind == RESET:
+            self.clear()
+
+
+def record_offsets(path, encoding='utf-8', delimiter=','):
+    """Byte offsets where the CSV records of a file start, followed by the file size
+
+    Records are found by csv.reader, as FileLoader finds them, so a quoted
+    newline or a stray '"' in an unquoted field (כפר מל"ל) is read the same way.
+    """
+    with open(path, 'rb') as f:
+        offsets = [offset for offset, _ in iter_records(f, encoding, delimiter)]
+        offsets.append(f.tell())
+    return offsets
+
+
+def _stamp(path):
+    """Size and modification time, to tell whether a file changed"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _copy(src, dst, length):
+    """Copy length bytes from one binary file to another"""
+    while length > 0:
+        block = src.read(min(COPY_BLOCK, length))
+        if not block:
+            return
+        dst.write(block)
+        length -= len(block)
+
+
+class CsvPatcher:
+    def __init__(self, path, header=True, encoding='utf-8', delimiter=',', offsets=None):
+        self.path = path
+        self.first_record = 1 if header else 0  # Record of row 0
+        self.encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding  # The BOM stays where it is
+        self.delimiter = delimiter
+        # Where each record starts and the file size, e.g. FileLoader.offsets; found at the first patch if None
+        self.offsets = list(offsets) if offsets is not None else None
+        self._stamp = _stamp(path)
+
+    def patch(self, rows):
+        """Write {row index: cells} into the file in place of those rows, atomically
+
+        Raises ValueError if the file changed on disk since it was loaded.
+        """
+        if _stamp(self.path) != self._stamp:
+            raise ValueError(f"{self.path} was changed by another program")
+        if self.offsets is None:
+            self.offsets = record_offsets(self.path, self.encoding, self.delimiter)
+        offsets = self.offsets
+        replaced = {}
+        for row, cells in rows.items():
+            record = row + self.first_record
+            if record + 1 >= len(offsets):
+                raise ValueError(f"Row {row} is not in {self.path}")
+            replaced[record] = cells
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with open(self.path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                position = 0
+                shifts = []  # (record, change in length)
+                for record in sorted(replaced):
+                    start, end = offsets[record], offsets[record + 1]
+                    _copy(src, dst, start - position)
+                    src.seek(end - 2 if end - start >= 2 else start)
+                    ending = src.read(end - src.tell())
+                    data = self._encode(replaced[record], _line_ending(ending))
+                    dst.write(data)
+                    src.seek(end)
+                    position = end
+                    shifts.append((record, len(data) - (end - start)))
+                _copy(src, dst, offsets[-1] - position)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._shift(shifts)
+        self._stamp = _stamp(self.path)
+
+    def _encode(self, cells, ending):
+        """One CSV record as bytes, ending the way the record it replaces did"""
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=self.delimiter, lineterminator=ending).writerow(cells)
+        return buffer.getvalue().encode(self.encoding)
+
+    def _shift(self, shifts):
+        """Move the offsets of the records after each replaced one"""
+        offsets = self.offsets
+        delta = 0
+        shifts.append((len(offsets) - 1, 0))
+        for (record, change), (next_record, _) in zip(shifts, shifts[1:]):
+            delta += change
+            if delta:
+                for index in range(record + 1, next_record + 1):
+                    offsets[index] += delta
+
+
+def _line_ending(tail):
+    """The line ending at the end of a record's last bytes"""
+    if tail.endswith(b'\r\n'):
+        return '\r\n'
+    if tail.endswith(b'\n'):
+        return '\n'
+    return ''
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Export of kehilot rows to CSV, JSON and NDJSON
+Writers stream rows to a file object one at a time; rows may be lists in column
+order or dicts keyed by column name. Every target takes its columns from one list
+(kehilot.csv's by default), so the formats never disagree on the fields.
+"""
+import io
+import csv
+import json
+import os
+
+from kehilot_converter import KEHILOT_COLUMNS
+
+
+def row_values(row, columns):
+    """Values of a row in column order; missing cells are empty, cells past the columns are kept"""
+    if isinstance(row, dict):
+        return [row.get(name, '') for name in columns]
+    values = list(row)
+    values.extend([''] * (len(columns) - len(values)))
+    return values
+
+
+def write_csv(f, rows, columns=KEHILOT_COLUMNS, header=True):
+    """Write a header and rows as RFC 4180 CSV (fields quoted when needed, CRLF line ends)
+
+    List rows are written cell for cell, so a row shorter than the header stays short.
+    """
+    writer = csv.writer(f)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row_values(row, columns) if isinstance(row, dict) else row)
+
+
+def write_json(f, rows, columns=KEHILOT_COLUMNS):
+    """Write rows as a JSON array of objects, one object per line"""
+    f.write('[')
+    separator = '\n'
+    for row in rows:
+        f.write(separator)
+        f.write(json.dumps(dict(zip(columns, row_values(row, columns))), ensure_ascii=False))
+        separator = ',\n'
+    f.write('\n]\n')
+
+
+def write_ndjson(f, rows, columns=KEHILOT_COLUMNS):
+    """Write rows as newline-delimited JSON, one object per line"""
+    for row in rows:
+        f.write(json.dumps(dict(zip(columns, row_values(row, columns))), ensure_ascii=False))
+        f.write('\n')
+
+
+WRITERS = {
+    'csv': write_csv,
+    'json': write_json,
+    'ndjson': write_ndjson,
+}
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.txt': 'csv',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+
+def format_for_path(path):
+    """Export format of a file name by its extension, CSV if unknown"""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def export_file(path, rows, columns=KEHILOT_COLUMNS, format=None):
+    """Write rows to a file in the format of its extension (or the given one)"""
+    writer = WRITERS[format or format_for_path(path)]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer(f, rows, columns)
+
+
+def export_string(rows, columns=KEHILOT_COLUMNS, format='csv'):
+    """Rows exported to a string, e.g. for the clipboard"""
+    buffer = io.StringIO()
+    WRITERS[format](buffer, rows, columns)
+    return buffer.getvalue()
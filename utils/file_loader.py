@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Progressive CSV file loading
+Sniffs the encoding of a file from its first bytes and the delimiter from its
+first line, reads the first rows right away and streams the rest in chunks on a
+background thread, which starts over in the fallback encoding if a later byte
+turns out not to be UTF-8
+"""
+import io
+import csv
+import sys
+import queue
+import codecs
+import threading
+import itertools
+
+SAMPLE_SIZE = 64 * 1024  # Bytes read to sniff the encoding
+FIRST_ROWS = 500         # Rows read before the file is shown
+CHUNK_ROWS = 5000        # Rows per chunk after that
+FALLBACK_ENCODING = 'cp1255'  # Hebrew Windows, for old Excel exports that are not UTF-8
+DELIMITERS = [',', ';', '\t']
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+ROWS = 'rows'      # a chunk of rows
+DONE = 'done'      # total number of rows
+FAILED = 'failed'  # message
+RELOAD = 'reload'  # first rows of the file read again in the fallback encoding; the rows before are void
+
+
+def detect_encoding(sample):
+    """Guess the encoding of a file from its first bytes
+
+    A byte order mark decides; otherwise UTF-8 if the sample decodes as UTF-8
+    (a character cut off at the end of the sample is fine), else the fallback.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def detect_delimiter(first_line):
+    """Pick the delimiter that occurs most often in the first line, ',' on a tie"""
+    return max(DELIMITERS, key=lambda delimiter: (first_line.count(delimiter), delimiter == ','))
+
+
+def interned(rows):
+    """Rows with every cell interned, so the names, sources and comments repeated
+    across a city's rows are held once instead of once per row"""
+    intern = sys.intern
+    return [list(map(intern, row)) for row in rows]
+
+
+def iter_records(f, encoding, delimiter=','):
+    """Yield (byte offset, cells) for each CSV record of a binary file, as csv.reader parses it
+
+    The offset counts the bytes of the lines the reader took for the records
+    before, so quotes or newlines inside fields cannot throw it off. Only for
+    encodings in which a newline is a single byte, such as UTF-8 (not UTF-16).
+    """
+    start = end = f.tell()
+
+    def lines():
+        nonlocal end
+        for line in f:
+            end += len(line)
+            yield line.decode(encoding)
+    for cells in csv.reader(lines(), delimiter=delimiter):
+        yield start, cells
+        start = end
+
+
+class FileLoader:
+    def __init__(self, path, first_rows=FIRST_ROWS, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.first_rows = first_rows
+        self.chunk_rows = chunk_rows
+        self.encoding = None
+        self.delimiter = None
+        self.messages = queue.Queue()
+        # Byte offset where each record read starts, followed by the file size once all are
+        # read, so edited rows can be patched into the file; None for UTF-16 files
+        self.offsets = None
+        self._file = None
+        self._records = None  # (offset, cells) of each record
+        self._rows_read = 0
+        self._cancel_event = threading.Event()
+
+    def open(self):
+        """Sniff the file and return its first rows; start() then loads the rest
+
+        The file is decoded strictly as it is read: a byte that is not UTF-8
+        makes the reading start over in the fallback encoding (posting RELOAD
+        if it is found by the loading thread), and a byte the encoding cannot
+        decode fails the load rather than turning into a replacement character.
+        """
+        with open(self.path, 'rb') as f:
+            self.encoding = detect_encoding(f.read(SAMPLE_SIZE))
+        self._file = open(self.path, 'rb')
+        try:
+            try:
+                return self._read_first()
+            except UnicodeDecodeError:
+                if self.encoding != 'utf-8':
+                    raise
+                self.encoding = FALLBACK_ENCODING
+                return self._read_first()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _read_first(self):
+        """Read the file again from the start in self.encoding and return its first rows"""
+        self._file.seek(0)
+        if self.encoding == 'utf-16':
+            text = io.TextIOWrapper(self._file, encoding=self.encoding, newline='')
+            self.delimiter = detect_delimiter(text.readline())
+            text.seek(0)
+            self._records = ((None, cells) for cells in csv.reader(text, delimiter=self.delimiter))
+        else:
+            self.delimiter = detect_delimiter(self._file.readline().decode(self.encoding))
+            self._file.seek(0)
+            self.offsets = []
+            self._records = iter_records(self._file, self.encoding, self.delimiter)
+        rows = self._take(self.first_rows)
+        self._rows_read = len(rows)
+        return rows
+
+    def _take(self, count):
+        """Up to count more rows, noting where their records start"""
+        rows = []
+        for offset, cells in itertools.islice(self._records, count):
+            if self.offsets is not None:
+                self.offsets.append(offset)
+            rows.append(cells)
+        return interned(rows)
+
+    def start(self):
+        """Read the rest of the file on a background thread, posting chunks of rows"""
+        thread = threading.Thread(target=self._read_rest, args=(self._rows_read,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def cancel(self):
+        """Stop reading; the file is closed by the reading thread"""
+        self._cancel_event.set()
+
+    def drain(self):
+        """Return the messages posted since the last call"""
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def _read_rest(self, total):
+        """Post the remaining rows chunk by chunk (runs on the loading thread)"""
+        try:
+            while not self._cancel_event.is_set():
+                try:
+                    chunk = self._take(self.chunk_rows)
+                except UnicodeDecodeError:
+                    if self.encoding != 'utf-8':
+                        raise
+                    self.encoding = FALLBACK_ENCODING
+                    chunk = self._read_first()
+                    total = len(chunk)
+                    self.messages.put((RELOAD, chunk))
+                    continue
+                if not chunk:
+                    if self.offsets is not None:
+                        self.offsets.append(self._file.tell())
+                    self.messages.put((DONE, total))
+                    return
+                total += len(chunk)
+                self.messages.put((ROWS, chunk))
+        except Exception as e:
+            self.messages.put((FAILED, str(e)))
+        finally:
+            self._file.close()
+
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the utils scripts
+Pools keep-alive connections, retries with exponential backoff and jitter,
+and revalidates cached pages with ETag/Last-Modified so unchanged pages cost a 304
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "KehillotThroughTime-utils/1.0 (https://kehilot.softwine.net)"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_cache")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    def __init__(self, user_agent=USER_AGENT, timeout=10, max_retries=3, backoff=0.5, max_backoff=8.0,
+                 pool_size=16, cache_dir=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff  # First retry waits up to this many seconds, doubling each time
+        self.max_backoff = max_backoff
+        self.cache_dir = cache_dir  # Where validators and bodies are kept between runs, if set
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers['User-Agent'] = user_agent
+
+        self._validators = {}  # request key -> (etag, last_modified, content, encoding)
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, revalidate=True, **kwargs):
+        """GET a URL, retrying transient failures
+
+        With revalidate, a page seen before is requested conditionally and a
+        304 answer is returned as the cached 200 response (response.from_cache
+        is then True). Raises requests.RequestException once retries run out.
+        """
+        key = self._request_key(url, params)
+        cached = self._cached_validators(key) if revalidate else None
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached:
+            etag, last_modified, _, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        response = self._send(url, params, headers, **kwargs)
+        response.from_cache = False
+        if response.status_code == 304 and cached:
+            response.status_code = 200
+            response._content = cached[2]
+            response.encoding = cached[3]
+            response.from_cache = True
+        elif revalidate and response.status_code == 200:
+            self._store_validators(key, response)
+        return response
+
+    def get_json(self, url, params=None, **kwargs):
+        """GET a URL and decode its JSON body, raising on HTTP errors"""
+        response = self.get(url, params, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+
+    def _send(self, url, params, headers, **kwargs):
+        """Send a GET with retries on connection errors, timeouts and 429/5xx answers"""
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(url, params=params, headers=headers, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = None
+                error = str(e)
+
+            if delay is None:
+                # Full jitter keeps parallel workers from retrying in lockstep
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            attempt += 1
+            print(f"Retrying {url} in {delay:.1f}s ({error}, attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    def _retry_after(self, response):
+        """Seconds to wait from a Retry-After header, if the server sent one in seconds"""
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return None
+
+    @staticmethod
+    def _request_key(url, params):
+        """Identify a request by its URL and sorted parameters"""
+        if params:
+            url += '?' + '&'.join(f"{name}={params[name]}" for name in sorted(params))
+        return url
+
+    def _cached_validators(self, key):
+        """Return (etag, last_modified, content, encoding) of a page seen before, or None"""
+        with self._lock:
+            cached = self._validators.get(key)
+        if cached is None and self.cache_dir:
+            cached = self._read_cache_file(key)
+            if cached:
+                with self._lock:
+                    self._validators[key] = cached
+        return cached
+
+    def _store_validators(self, key, response):
+        """Remember the validators and body of a page that can be revalidated"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        cached = (etag, last_modified, response.content, response.encoding)
+        with self._lock:
+            self._validators[key] = cached
+        if self.cache_dir:
+            self._write_cache_file(key, cached)
+
+    def _cache_path(self, key):
+        """Cache file base name of a request"""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read_cache_file(self, key):
+        """Load validators and body of a request from the cache directory"""
+        path = self._cache_path(key)
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(path + '.body', 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('key') != key or meta.get('body_sha1') != hashlib.sha1(content).hexdigest():
+            return None  # Another request's entry, or a body left by an interrupted write
+        return meta.get('etag'), meta.get('last_modified'), content, meta.get('encoding')
+
+    def _write_cache_file(self, key, cached):
+        """Save validators and body of a request to the cache directory
+
+        Each file is replaced atomically, the body first: the .json names the
+        SHA-1 of its body, so a body without its .json is never used.
+        """
+        etag, last_modified, content, encoding = cached
+        path = self._cache_path(key)
+        meta = {'key': key, 'etag': etag, 'last_modified': last_modified, 'encoding': encoding,
+                'body_sha1': hashlib.sha1(content).hexdigest()}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _replace_file(path + '.body', content)
+            _replace_file(path + '.json', json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            print(f"Error saving HTTP cache entry for {key}: {e}")
+
+
+def _replace_file(path, data):
+    """Write a file through a temporary file in its directory, so readers see the old or the new contents"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the HTTP client shared by all utils scripts in this process"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient(cache_dir=DEFAULT_CACHE_DIR)
+        return _default_client
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+City name extraction from Wikipedia interlanguage links
+Reads the links of an article page to other Wikipedias with precompiled patterns instead
+of building a tree; pages the patterns cannot stand in for fall back to a full BeautifulSoup parse
+"""
+import re
+from html import unescape
+from bs4 import BeautifulSoup
+from name_store import has_names
+
+# Link titles that are language names rather than city names
+LANGUAGE_NAMES = frozenset([
+    'עברית', 'יידיש', 'Deutsch', 'Afrikaans', 'English', 'Français', 'Español',
+    'Italiano', 'Português', 'Русский', 'Polski', 'Čeština', 'Slovenčina',
+    'Magyar', 'Română', 'Български', 'Hrvatski', 'Српски', 'Українська',
+    'Беларуская', 'Lietuvių', 'Latviešu', 'Eesti', 'Suomi', 'Norsk', 'Svenska',
+    'Dansk', 'Íslenska', 'Gaeilge', 'Cymraeg', 'Malti', 'Slovenščina', 'Македонски',
+    'Shqip', 'Türkçe', 'Azərbaycan', 'Azərbaycanca', 'ქართული', 'Հայերեն', 'Қазақша', 'Кыргызча',
+    'O\'zbekcha', 'Монгол', '한국어', '日本語', '中文', 'ไทย', 'Tiếng Việt',
+    'हिन्दी', 'বাংলা', 'தமிழ்', 'తెలుగు', 'മലയാളം', 'ಕನ್ನಡ', 'ગુજરાતી',
+    'ਪੰਜਾਬੀ', 'ଓଡ଼ିଆ', 'অসমীয়া', 'नेपाली', 'සිංහල', 'မြန်မာ', 'ខ្មែរ',
+    'ລາວ', 'አማርኛ', 'ትግርኛ', 'Kiswahili', 'IsiZulu', 'IsiXhosa',
+    'Euskera', 'Euskara', 'Català', 'Galego', 'Nederlands', 'Alemannisch', 'Aragonés',
+    'Asturianu', 'Avañe\'ẽ', 'Basa Bali', 'Bân-lâm-gú'
+])
+
+# Words that mark a link title as something other than a city (matched in lowercase)
+SKIP_WORDS = ['university', 'school', 'college', 'institute', 'academy', 'center', 'centre', 'vysoká',
+              'škola', 'stanisławowska', 'vojtíšek', 'ernst', 'gustav', 'schultz', 'testnevelési', 'egyetem',
+              'gara', 'progresul', 'mäkelänrinteen', 'uintikeskus', 'stadsarkiv', 'skansen', 'restaurant',
+              'privatbane', 'parpusa', 'avenue', 'raphaël', 'präfektur', 'tokio']
+SKIP_WORDS_PATTERN = re.compile('|'.join(re.escape(word) for word in SKIP_WORDS))
+BRACKETS = frozenset('()[]{}')
+
+# Local language of well-known cities, preferred for the 'other' name
+LOCAL_LANGUAGES = {
+    'Prague': 'cs', 'Praha': 'cs',  # Czech
+    'Warsaw': 'pl', 'Warszawa': 'pl',  # Polish
+    'Moscow': 'ru', 'Moskva': 'ru',  # Russian
+    'Kiev': 'uk', 'Kyiv': 'uk',  # Ukrainian
+    'Budapest': 'hu',  # Hungarian
+    'Bucharest': 'ro',  # Romanian
+    'Sofia': 'bg',  # Bulgarian
+    'Zagreb': 'hr',  # Croatian
+    'Belgrade': 'sr', 'Beograd': 'sr',  # Serbian
+    'Minsk': 'be',  # Belarusian
+    'Vilnius': 'lt',  # Lithuanian
+    'Riga': 'lv',  # Latvian
+    'Tallinn': 'et',  # Estonian
+    'Helsinki': 'fi',  # Finnish
+    'Oslo': 'no',  # Norwegian
+    'Stockholm': 'sv',  # Swedish
+    'Copenhagen': 'da',  # Danish
+    'Reykjavik': 'is',  # Icelandic
+    'Dublin': 'ga',  # Irish
+    'Cardiff': 'cy',  # Welsh
+    'Valletta': 'mt',  # Maltese
+    'Ljubljana': 'sl',  # Slovenian
+    'Skopje': 'mk',  # Macedonian
+    'Tirana': 'sq',  # Albanian
+    'Istanbul': 'tr',  # Turkish
+    'Baku': 'az',  # Azerbaijani
+    'Tbilisi': 'ka',  # Georgian
+    'Yerevan': 'hy',  # Armenian
+    'Almaty': 'kk',  # Kazakh
+    'Bishkek': 'ky',  # Kyrgyz
+    'Tashkent': 'uz',  # Uzbek
+    'Ulaanbaatar': 'mn',  # Mongolian
+    'Seoul': 'ko',  # Korean
+    'Tokyo': 'ja',  # Japanese
+    'Beijing': 'zh',  # Chinese
+    'Bangkok': 'th',  # Thai
+    'Hanoi': 'vi',  # Vietnamese
+    'New Delhi': 'hi',  # Hindi
+    'Dhaka': 'bn',  # Bengali
+    'Chennai': 'ta',  # Tamil
+    'Hyderabad': 'te',  # Telugu
+    'Kochi': 'ml',  # Malayalam
+    'Bangalore': 'kn',  # Kannada
+    'Ahmedabad': 'gu',  # Gujarati
+    'Chandigarh': 'pa',  # Punjabi
+    'Bhubaneswar': 'or',  # Odia
+    'Guwahati': 'as',  # Assamese
+    'Kathmandu': 'ne',  # Nepali
+    'Colombo': 'si',  # Sinhala
+    'Yangon': 'my',  # Burmese
+    'Phnom Penh': 'km',  # Khmer
+    'Vientiane': 'lo',  # Lao
+    'Addis Ababa': 'am',  # Amharic
+    'Asmara': 'ti',  # Tigrinya
+    'Nairobi': 'sw',  # Swahili
+    'Cape Town': 'af',  # Afrikaans
+    'Johannesburg': 'af',  # Afrikaans
+    'Bilbao': 'eu',  # Basque
+    'Barcelona': 'ca',  # Catalan
+    'Santiago': 'gl',  # Galician
+    'Lisbon': 'pt',  # Portuguese
+    'Madrid': 'es',  # Spanish
+    'Paris': 'fr',  # French
+    'Rome': 'it',  # Italian
+    'Amsterdam': 'nl',  # Dutch
+}
+
+# Lowercase city variants per language code, so a link is checked against its own language only
+LOCAL_VARIANTS = {}
+for _variant, _lang in LOCAL_LANGUAGES.items():
+    LOCAL_VARIANTS.setdefault(_lang, []).append(_variant.lower())
+
+TARGET_KEYS = {'de': 'german', 'he': 'hebrew', 'yi': 'yiddish'}
+
+WIKI_LANG_PATTERN = re.compile(r'https://([a-z]{2,3})\.wikipedia\.org')
+HEBREW_PATTERN = re.compile(r'\([^)]*[Hh]ebrew[^)]*:?\s*([^)]+)\)')
+GERMAN_PATTERN = re.compile(r'\([^)]*[Gg]erman[^)]*:?\s*([^)]+)\)')
+
+# Patterns of the targeted scan: anchors, and the comments, scripts and styles whose
+# contents html.parser does not read as tags
+PAGE_TOKEN = re.compile(r'<!--.*?-->|<(script|style)\b.*?</\1\s*>'
+                        r'|<a\s((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>(.*?)</a\s*>', re.I | re.S)
+ATTRIBUTE = re.compile(r'([^\s=/>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+TAG = re.compile(r'<[^>]*>')
+
+
+def assign_interlanguage_name(city, city_names, lang_code, city_name):
+    """Store one interlanguage link name in city_names if it looks like a city name
+
+    Shared by the MediaWiki API backend and the HTML page scrapers.
+    """
+    # Extract city name from title if it contains language info (e.g., "Praha – Czech")
+    if '–' in city_name:
+        city_name = city_name.split('–')[0].strip()
+    elif ' - ' in city_name:
+        city_name = city_name.split(' - ')[0].strip()
+
+    # Remove language codes like "de:", "he:", etc.
+    if ':' in city_name and len(city_name.split(':')[0]) <= 3:
+        city_name = city_name.split(':', 1)[1].strip()
+
+    # Skip if the result is too long (likely not a city name)
+    if len(city_name) > 50:
+        return
+
+    # Skip if it doesn't look like a city name
+    words = len(city_name.split())
+    if (words > 3 or
+            words > 2 and ' ' in city_name or
+            not BRACKETS.isdisjoint(city_name) or
+            SKIP_WORDS_PATTERN.search(city_name.lower())):
+        return
+
+    # Skip common language names that are not city names
+    if city_name in LANGUAGE_NAMES:
+        return
+
+    # Skip if city_name is just a language code or very short
+    if city_name and len(city_name) <= 3 and city_name.islower():
+        return
+
+    if city_name and lang_code:
+        # Map to our target languages
+        key = TARGET_KEYS.get(lang_code)
+        if key:
+            city_names[key] = city_name
+        elif not city_names['other'] or is_local_language(city, lang_code):
+            # For other languages, prioritize local languages
+            city_names['other'] = city_name
+
+
+def is_local_language(city, lang_code):
+    """Check if lang_code is the local language of a well-known city"""
+    city = city.lower()
+    return any(variant in city or city in variant for variant in LOCAL_VARIANTS.get(lang_code, ()))
+
+
+def extract_city_names(html, city, city_names):
+    """Fill city_names in place from the HTML of a city's English Wikipedia article
+
+    Gives the same names as extract_with_soup. Pages without links to other
+    Wikipedias, and pages whose links give no names, go through it instead.
+    """
+    if isinstance(html, bytes):
+        text = html.decode('utf-8', errors='replace')
+    else:
+        text = html
+
+    links = interlanguage_links(text)
+    if links:
+        for lang_code, city_name in links:
+            assign_interlanguage_name(city, city_names, lang_code, city_name)
+        if has_names(city_names):
+            return
+    extract_with_soup(html, city, city_names)
+
+
+def interlanguage_links(text):
+    """Return (lang_code, name) of each link of a page to another Wikipedia, in page order, or None
+
+    These are the links extract_with_soup reads when the page has no ULS language
+    list: the interlanguage list and any link to another Wikipedia in the article.
+    None means there are none, or the page has a ULS list, which only a full parse handles.
+    """
+    if 'row uls-language-list uls-lcd' in text:
+        return None
+
+    links = []
+    for token in PAGE_TOKEN.finditer(text):
+        if token.group(2) is None or 'wikipedia.org' not in token.group(2):
+            continue  # A comment, script or style, or not a link to Wikipedia
+        attributes = {}
+        for name, double_quoted, single_quoted, bare in ATTRIBUTE.findall(token.group(2)):
+            attributes[name.lower()] = unescape(double_quoted or single_quoted or bare)
+        href = attributes.get('href', '')
+        if ('wikipedia.org' not in href or '/wiki/' not in href
+                or href.startswith('https://en.wikipedia.org') or href.startswith('//en.wikipedia.org')
+                or ':' in href.split('/wiki/')[-1]):  # Exclude special pages
+            continue
+        label = unescape(TAG.sub('', token.group(3))).strip()
+        if not label:
+            continue
+
+        lang_code = attributes.get('lang', '')
+        lang_match = WIKI_LANG_PATTERN.search(href)
+        if lang_match:
+            lang_code = lang_match.group(1)
+        # The title attribute holds the city name, the link text the language
+        links.append((lang_code, attributes.get('title', '').strip() or label))
+    return links or None
+
+
+def extract_with_soup(html, city, city_names):
+    """Fill city_names in place by parsing the whole article page
+
+    Tries every link to another Wikipedia, then the infobox and first paragraph.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Look for interlanguage links - try multiple approaches
+    interlang_links = []
+
+    # Method 1: Look for the specific interlanguage section
+    interlang_section = soup.find('div', class_='row uls-language-list uls-lcd')
+    if interlang_section:
+        interlang_links = interlang_section.find_all('li', class_='interlanguage-link')
+
+    # Method 2: Look for all links to other language Wikipedia pages
+    if not interlang_links:
+        # Find all links to other language Wikipedia pages
+        all_links = soup.find_all('a', href=lambda x: x and 'wikipedia.org' in x and '/wiki/' in x)
+        # Filter out English Wikipedia links and non-article links
+        interlang_links = [link for link in all_links
+                           if not link.get('href', '').startswith('https://en.wikipedia.org')
+                           and not link.get('href', '').startswith('//en.wikipedia.org')
+                           and ':' not in link.get('href', '').split('/wiki/')[-1]  # Exclude special pages
+                           and link.get_text().strip()]  # Must have text content
+
+    # Method 3: Look in the language dropdown
+    if not interlang_links:
+        lang_dropdown = soup.find('div', id='p-lang')
+        if lang_dropdown:
+            interlang_links = lang_dropdown.find_all('a', href=lambda x: x and 'wikipedia.org' in x and '/wiki/' in x)
+
+    for link in interlang_links:
+        href = link.get('href', '')
+        lang_code = link.get('lang', '')
+
+        # Extract language code from URL like https://de.wikipedia.org/wiki/Prag
+        if href and 'wikipedia.org' in href:
+            lang_match = WIKI_LANG_PATTERN.search(href)
+            if lang_match:
+                lang_code = lang_match.group(1)
+
+        # Get the city name from the title attribute (contains actual city name)
+        city_name = link.get('title', '').strip()
+
+        # If title is empty, try the text
+        if not city_name:
+            city_name = link.get_text().strip()
+
+        assign_interlanguage_name(city, city_names, lang_code, city_name)
+
+    # If we didn't find interlanguage links, try the old method as fallback
+    if not has_names(city_names):
+        # Look for alternative names in the infobox
+        infobox = soup.find('table', class_='infobox')
+        if infobox:
+            # Look for native name or other language names
+            for row in infobox.find_all('tr'):
+                th = row.find('th')
+                td = row.find('td')
+                if th and td:
+                    th_text = th.get_text().strip().lower()
+                    td_text = td.get_text().strip()
+
+                    # Check for Hebrew name
+                    if 'hebrew' in th_text or 'עברית' in th_text:
+                        city_names['hebrew'] = td_text
+                    # Check for German name
+                    elif 'german' in th_text or 'deutsch' in th_text:
+                        city_names['german'] = td_text
+                    # Check for Yiddish name
+                    elif 'yiddish' in th_text or 'יידיש' in th_text:
+                        city_names['yiddish'] = td_text
+                    # Check for native name
+                    elif 'native' in th_text or 'local' in th_text:
+                        if any('\u0590' <= char <= '\u05FF' for char in td_text):  # Hebrew characters
+                            city_names['hebrew'] = td_text
+                        else:
+                            city_names['other'] = td_text
+
+        # Also look for alternative names in the first paragraph
+        first_para = soup.find('p')
+        if first_para:
+            text = first_para.get_text()
+            # Look for patterns like "City Name (Hebrew: עברית)"
+            hebrew_match = HEBREW_PATTERN.search(text)
+            if hebrew_match:
+                city_names['hebrew'] = hebrew_match.group(1).strip()
+
+            german_match = GERMAN_PATTERN.search(text)
+            if german_match:
+                city_names['german'] = german_match.group(1).strip()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Conversion engine for the 9-column input format to kehilot.csv format
+Groups input rows by (country, city) once and builds every period in a single pass
+
+Usage (no display needed):
+    python kehilot_converter.py input.csv [-o output.csv] [--offline] [--group-all]
+"""
+import csv
+import sys
+import argparse
+import itertools
+
+KEHILOT_COLUMNS = ['country', 'city', 'long', 'lat', 'year_estab', 'year_start', 'year_end',
+                   'pop_start', 'pop_end', 'probability', 'type', 'symbol', 'city_english',
+                   'city_hebrew', 'city_yid', 'city_german', 'city_other', 'source', 'comment']
+
+INPUT_COLUMNS = ['Country', 'Town Name', 'Longitude', 'Latitude', 'Year Established',
+                 'Year of Population Data or Event', 'Size of Jewish Population', 'Notes', 'Source']
+
+DEFAULT_YEAR_END = "2024"  # year_end for the last period of each city
+
+
+class ConversionCancelled(Exception):
+    """Raised by convert_rows when its cancelled callable returns True"""
+
+
+class ScatteredCityError(ValueError):
+    """Raised by iter_city_runs when rows of a city come back after other cities"""
+
+
+def is_header_row(row):
+    """Check if a row looks like the input file header"""
+    return bool(row) and any(header_word in row[0].lower() for header_word in ['country', 'town', 'name'])
+
+
+def estimate_probability(notes):
+    """Determine probability based on notes"""
+    if notes and ("uncertain" in notes.lower() or "unknown" in notes.lower()):
+        return "medium"
+    if notes and ("estimated" in notes.lower() or "approx" in notes.lower()):
+        return "medium"
+    return "high"
+
+
+def group_input_rows(rows, indices=None):
+    """Group input rows by (country, city) in order of first appearance
+
+    Rows with 7 or 8 columns are kept in their group because they still close
+    the previous period (year_end/pop_end), but only full rows are emitted.
+    indices, if given, is filled with {key: index in rows of each row of the group}.
+    """
+    groups = {}
+    for index, row in enumerate(rows):
+        if len(row) < 7:
+            continue
+        key = (row[0].strip(), row[1].strip())
+        groups.setdefault(key, []).append(row)
+        if indices is not None:
+            indices.setdefault(key, []).append(index)
+    return groups
+
+
+def _sort_by_year(group):
+    """Order a city's rows by year, keeping unparseable years after their predecessor"""
+    return [group[position] for position in _year_order(group)]
+
+
+def _year_order(group):
+    """Positions of a city's rows in the order of _sort_by_year"""
+    keyed = []
+    last_year = float('-inf')
+    for position, row in enumerate(group):
+        year = row[5].strip() if len(row) > 5 else ''
+        if year in ('', 'NA') and len(row) > 4:
+            year = row[4].strip()  # year_start falls back to year_estab
+        try:
+            last_year = int(year)
+        except ValueError:
+            pass
+        keyed.append((last_year, position))
+    keyed.sort(key=lambda item: item[0])  # stable, so equal years keep file order
+    return [position for _, position in keyed]
+
+
+def build_group_periods(group, city_names, sources=None):
+    """Build the kehilot.csv rows of one city from its rows ordered by year
+
+    sources, if given, is extended with the position in group of the row each period starts from.
+    """
+    periods = []
+    for index, row in enumerate(group):
+        if len(row) < 9:
+            continue
+        country, city, longitude, latitude, year_estab, year_data, population, notes, source = \
+            [cell.strip() for cell in row[:9]]
+
+        year_start = year_data if year_data and year_data != 'NA' else year_estab
+
+        # The next row of the same city closes this period
+        year_end = DEFAULT_YEAR_END
+        pop_end = ""
+        if index + 1 < len(group):
+            next_row = group[index + 1]
+            next_year = next_row[5].strip()
+            next_pop = next_row[6].strip()
+            if next_year and next_year != 'NA':
+                try:
+                    year_end = str(int(next_year) - 1)
+                except ValueError:
+                    year_end = DEFAULT_YEAR_END
+            if next_pop and next_pop != 'NA':
+                pop_end = next_pop
+
+        periods.append([
+            country,  # country
+            city,     # city
+            longitude,  # long
+            latitude,   # lat
+            year_estab, # year_estab
+            year_start, # year_start
+            year_end,   # year_end
+            population if population != 'NA' else "",  # pop_start
+            pop_end,    # pop_end
+            estimate_probability(notes), # probability
+            "1",        # type
+            "1",        # symbol
+            city_names.get('english', city),  # city_english
+            city_names.get('hebrew', ''),     # city_hebrew
+            city_names.get('yiddish', ''),    # city_yid
+            city_names.get('german', ''),     # city_german
+            city_names.get('other', ''),      # city_other
+            source,     # source
+            notes       # comment
+        ])
+        if sources is not None:
+            sources.append(index)
+    return periods
+
+
+def convert_rows(rows, get_city_names, progress_callback=None, prefetch=None, cancelled=None,
+                 prefetch_window=256, checkpoint=None, sources=None):
+    """Convert input format rows to kehilot.csv rows
+
+    get_city_names(city, country) is called once per city. prefetch, if given,
+    is called with the (city, country) pairs of the next prefetch_window cities
+    so that their lookups run in parallel. progress_callback, if given, is
+    called with (rows_done, rows_total) after each city. cancelled, if given,
+    is checked before each city and raises ConversionCancelled once it returns True.
+
+    With a ConversionCheckpoint, cities it already holds are read back from it
+    without any lookup, and newly converted cities are recorded in it; saving
+    or discarding it when the conversion ends is up to the caller.
+
+    sources, if given, is filled with the index in rows of the input row each
+    converted row starts its period from, e.g. to show it next to the result.
+    """
+    skipped = 0
+    if rows and is_header_row(rows[0]):
+        rows = rows[1:]  # Skip header
+        skipped = 1
+
+    completed = checkpoint.completed if checkpoint else {}
+    indices = {} if sources is not None else None
+    groups = _numbered(group_input_rows(rows, indices).items())
+    if prefetch:
+        groups = _prefetched(groups, prefetch, prefetch_window, completed)
+
+    converted_rows = []
+    done = 0
+    for number, (country, city), group in groups:
+        if cancelled and cancelled():
+            raise ConversionCancelled()
+        order = _year_order(group)
+        ordered = [group[position] for position in order]
+        positions = []  # Position in ordered of each period's row
+        if number in completed:
+            converted_rows.extend(checkpoint.rows(number))
+            if sources is not None:
+                build_group_periods(ordered, {}, positions)  # Periods start from the same rows whatever the names
+        else:
+            try:
+                city_names = get_city_names(city, country)
+                periods = build_group_periods(ordered, city_names, positions)
+                converted_rows.extend(periods)
+                if checkpoint:
+                    checkpoint.record(number, periods)
+            except Exception as e:
+                if cancelled and cancelled():
+                    raise ConversionCancelled() from e
+                print(f"Error converting {city}, {country}: {str(e)}")
+                positions = []
+        if sources is not None:
+            group_indices = indices[(country, city)]
+            sources.extend(skipped + group_indices[order[position]] for position in positions)
+        done += len(group)
+        if progress_callback:
+            progress_callback(done, len(rows))
+    return converted_rows
+
+
+def iter_city_runs(rows):
+    """Yield (key, rows) for each run of consecutive rows of the same city
+
+    Only one city is held in memory at a time, so input files are expected to
+    keep each city's rows together (as all our regional dumps do). A city
+    showing up again after another one raises ScatteredCityError, as its runs
+    would become overlapping periods that each last until DEFAULT_YEAR_END.
+    """
+    key = None
+    run = []
+    closed = set()  # Cities whose run has ended
+    for row in rows:
+        if len(row) < 7:
+            continue
+        row_key = (row[0].strip(), row[1].strip())
+        if row_key != key:
+            if row_key in closed:
+                raise ScatteredCityError(f"Rows of {row_key[1]}, {row_key[0]} are not together in the input; "
+                                         f"convert it with --group-all")
+            if run:
+                yield key, run
+                closed.add(key)
+                run = []
+        key = row_key
+        run.append(row)
+    if run:
+        yield key, run
+
+
+def iter_kehilot_rows(rows, get_city_names, group_all=False, prefetch=None, prefetch_window=64,
+                      checkpoint=None):
+    """Lazily convert an iterator of input rows to kehilot.csv rows
+
+    With group_all the whole input is grouped first, for files whose
+    cities are scattered; otherwise memory stays bounded by one city, or by
+    prefetch_window cities when a prefetch callable is given to look up
+    the names of the next cities in parallel. checkpoint works as in convert_rows.
+    """
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        return
+    if not is_header_row(first_row):
+        rows = itertools.chain([first_row], rows)  # Not a header, keep it
+
+    completed = checkpoint.completed if checkpoint else {}
+    groups = _numbered(group_input_rows(rows).items() if group_all else iter_city_runs(rows))
+    if prefetch:
+        groups = _prefetched(groups, prefetch, prefetch_window, completed)
+    for number, (country, city), group in groups:
+        if number in completed:
+            yield from checkpoint.rows(number)
+            continue
+        try:
+            city_names = get_city_names(city, country)
+            periods = build_group_periods(_sort_by_year(group), city_names)
+        except Exception as e:
+            print(f"Error converting {city}, {country}: {str(e)}")
+            continue
+        if checkpoint:
+            checkpoint.record(number, periods)
+        yield from periods
+
+
+def _numbered(groups):
+    """Yield (number, key, rows) for each (key, rows) group, numbering them from 0"""
+    for number, (key, group) in enumerate(groups):
+        yield number, key, group
+
+
+def _prefetched(groups, prefetch, window, completed=()):
+    """Pass numbered groups through, prefetching city names one window at a time
+
+    Groups in completed are not prefetched.
+    """
+    groups = iter(groups)
+    while True:
+        batch = list(itertools.islice(groups, window))
+        if not batch:
+            return
+        prefetch([(city, country) for number, (country, city), _ in batch if number not in completed])
+        yield from batch
+
+
+def read_input_rows(file_path):
+    """Yield the rows of an input CSV file one at a time"""
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        yield from csv.reader(f)
+
+
+def default_output_path(input_path):
+    """Suggest an output file name based on the input file, e.g. data.csv -> data_kehilot.csv"""
+    if input_path.lower().endswith('.csv'):
+        return input_path[:-len('.csv')] + "_kehilot.csv"
+    if input_path.lower().endswith('.txt'):
+        return input_path[:-len('.txt')] + "_kehilot.csv"
+    return input_path + "_kehilot.csv"
+
+
+def grouping_name(group_all):
+    """Name of a grouping mode, as stored in conversion checkpoints"""
+    return 'all' if group_all else 'runs'
+
+
+def convert_file(input_path, output_path, get_city_names, group_all=False, progress_callback=None,
+                 prefetch=None, checkpoint=None):
+    """Convert an input CSV file to a kehilot.csv file, writing rows as they are built
+
+    With a checkpoint, an interrupted conversion keeps its checkpoint for the
+    next run and a complete one discards it. Returns the number of rows written.
+    """
+    written = 0
+    try:
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(KEHILOT_COLUMNS)
+            for row in iter_kehilot_rows(read_input_rows(input_path), get_city_names, group_all, prefetch,
+                                         checkpoint=checkpoint):
+                writer.writerow(row)
+                written += 1
+                if progress_callback:
+                    progress_callback(written)
+    except BaseException:
+        if checkpoint:
+            checkpoint.save()
+        raise
+    if checkpoint:
+        checkpoint.discard()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a 9-column input CSV file to kehilot.csv format")
+    parser.add_argument("input", help="input CSV file")
+    parser.add_argument("-o", "--output", help="output file (default: <input>_kehilot.csv)")
+    parser.add_argument("--offline", action="store_true",
+                        help="use only the city names cache, never query Wikipedia")
+    parser.add_argument("--cache-file", help="city names cache file")
+    parser.add_argument("--group-all", action="store_true",
+                        help="group the whole file in memory, for files whose cities are not contiguous")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of parallel Wikipedia lookups (default: 8)")
+    parser.add_argument("--scrape-pages", action="store_true",
+                        help="scrape every article page instead of batch querying the langlinks API")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="start over, without reading or saving a checkpoint of the conversion")
+    args = parser.parse_args()
+
+    from city_names import CityNamesLookup, DEFAULT_CACHE_FILE
+    from checkpoint import ConversionCheckpoint
+
+    output_path = args.output or default_output_path(args.input)
+    lookup = CityNamesLookup(args.cache_file or DEFAULT_CACHE_FILE, online=not args.offline,
+                             max_workers=args.workers, use_api=not args.scrape_pages)
+    checkpoint = None
+    if not args.no_resume:
+        checkpoint = ConversionCheckpoint.for_file(args.input, grouping_name(args.group_all),
+                                                   on_save=lookup.save_city_names_cache)
+    if checkpoint and checkpoint.completed:
+        print(f"Resuming: {len(checkpoint.completed)} cities were converted before")
+    try:
+        written = convert_file(args.input, output_path, lookup.get_city_names, args.group_all,
+                               prefetch=lookup.prefetch, checkpoint=checkpoint)
+    except ScatteredCityError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        lookup.close()
+    print(f"Wrote {written} rows to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Persistent store for looked-up city names
+A WAL-mode SQLite table with buffered inserts, flushed in batches of one transaction each
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+NAME_FIELDS = ['english', 'hebrew', 'yiddish', 'german', 'other']
+
+# Lookup outcome stored with every entry
+STATUS_HIT = 'hit'      # Names were found
+STATUS_MISS = 'miss'    # The lookup worked but there are no names (or no article)
+STATUS_ERROR = 'error'  # The lookup failed, e.g. a network outage
+
+SCHEMA_VERSION = 1  # Version of the entry format; entries of other versions are looked up again
+
+CacheEntry = namedtuple('CacheEntry', ['names', 'status', 'updated_at', 'schema_version'])
+
+COLUMNS = ['key'] + NAME_FIELDS + ['status', 'updated_at', 'schema_version']
+
+
+def has_names(names):
+    """Check if a names dict holds any name besides the English one"""
+    return any(names.get(field) for field in NAME_FIELDS[1:])
+
+
+class NameStore:
+    def __init__(self, path, json_path=None, batch_size=50):
+        self.path = path
+        self.json_path = json_path  # Old JSON cache, imported once into an empty store
+        self.batch_size = batch_size  # Pending entries that trigger a flush
+        self._connection = None
+        self._pending = {}
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Return the CacheEntry stored for a cache key, or None"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            row = self._connect().execute(
+                f"SELECT {', '.join(COLUMNS[1:])} FROM city_names WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        names = dict(zip(NAME_FIELDS, row[:len(NAME_FIELDS)]))
+        return CacheEntry(names, *row[len(NAME_FIELDS):])
+
+    def put(self, key, names, status, updated_at=None):
+        """Queue the names of a cache key; written at the next flush"""
+        entry = CacheEntry(dict(names), status, time.time() if updated_at is None else updated_at,
+                           SCHEMA_VERSION)
+        with self._lock:
+            self._pending[key] = entry
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+        return entry
+
+    def flush(self):
+        """Write all queued entries in a single transaction"""
+        with self._lock:
+            if not self._pending:
+                return
+            rows = [self._row(key, entry) for key, entry in self._pending.items()]
+            with self._connect():
+                self._connection.executemany(self._insert_sql("INSERT OR REPLACE"), rows)
+            self._pending.clear()
+
+    def close(self):
+        """Flush and close the database"""
+        with self._lock:
+            if self._connection is not None:
+                self.flush()
+                self._connection.close()
+                self._connection = None
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._connect().execute("SELECT COUNT(*) FROM city_names").fetchone()[0]
+
+    @staticmethod
+    def _row(key, entry):
+        """Flatten a CacheEntry into a table row"""
+        return ((key,) + tuple(entry.names.get(field, '') for field in NAME_FIELDS)
+                + (entry.status, entry.updated_at, entry.schema_version))
+
+    @staticmethod
+    def _insert_sql(verb):
+        """Build an insert statement for all columns"""
+        return f"{verb} INTO city_names ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+    def _connect(self):
+        """Open the database on first use, creating and migrating it if needed"""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # A crash never corrupts the WAL, at worst loses the last flush
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS city_names ("
+                    "key TEXT PRIMARY KEY, english TEXT, hebrew TEXT, yiddish TEXT, german TEXT, other TEXT, "
+                    "status TEXT, updated_at REAL, schema_version INTEGER)")
+            self._connection = connection
+            self._migrate()
+        return self._connection
+
+    def _migrate(self):
+        """Import the old JSON cache into a new store
+
+        Version 0 means the JSON cache was never imported. Old entries without
+        any name may be left over from failed lookups, so they become already
+        expired errors.
+        """
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self._connection:
+            entries = self._read_json()
+            self._connection.executemany(self._insert_sql("INSERT OR IGNORE"), [
+                self._row(key, CacheEntry(names, STATUS_HIT if has_names(names) else STATUS_ERROR,
+                                          0, SCHEMA_VERSION))
+                for key, names in entries.items()])
+            if entries:
+                print(f"Migrated {len(entries)} city names from {self.json_path}")
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _read_json(self):
+        """Read the old JSON cache, if there is one"""
+        if not self.json_path or not os.path.exists(self.json_path):
+            return {}
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading {self.json_path} for migration: {e}")
+            return {}
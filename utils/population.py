@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Vectorized population of every community in every year
+helpers.js computes the population a marker shows one row at a time:
+    year_end undefined: parseInt(pop_start)
+    otherwise: Math.floor(((year_end - year)*pop_start + (year - year_start)*pop_end)/(year_end - year_start))
+with pop_end falling back to pop_start when empty. PopulationEngine evaluates
+the same expression in float64 (the doubles of JavaScript, in the same order of
+operations) for all rows and years at once with NumPy, so the results are
+identical, NaN included: a NaN population, or 0/0 for a one-year period, stays
+NaN. Years in which the page does not show a row are NaN as well.
+
+Rows are the non-blank lines of kehilot.csv after the header, numbered as the
+page (and temporal_index.py) numbers them.
+
+Usage:
+    engine = PopulationEngine.load()
+    years = np.arange(-1312, 2024)
+    engine.totals(years)       # Population shown on the map in each year
+    engine.series(row, years)  # One community's population over time
+
+    python population.py [--first -1312] [--last 2023] [--city Vilna]
+"""
+import time
+import argparse
+
+import numpy as np
+
+from build_shards import js_trim, parse_csv_line, kehila_record
+from dataset import KEHILOT_PATH
+
+def _number(value):
+    return np.nan if value is None else value
+
+
+class PopulationEngine:
+    def __init__(self, records, names=None):
+        """records: kehila_record() results (None for rows the page never shows)"""
+        shown = [record is not None and record['year_start'] is not None for record in records]
+        self.names = list(names) if names is not None else [record and record.get('name') for record in records]
+        self.year_starts = np.array([record['year_start'] if ok else np.nan
+                                     for record, ok in zip(records, shown)], dtype=np.float64)
+        self.year_ends = np.array([record.get('year_end', np.inf) if ok else np.nan
+                                   for record, ok in zip(records, shown)], dtype=np.float64)
+        self.pop_starts = np.array([_number(record['population_start']) if ok else np.nan
+                                    for record, ok in zip(records, shown)], dtype=np.float64)
+        self.pop_ends = np.array([_number(record['population_end']) if ok else np.nan
+                                  for record, ok in zip(records, shown)], dtype=np.float64)
+        self.open_ended = np.isinf(self.year_ends)
+
+    @classmethod
+    def load(cls, path=KEHILOT_PATH):
+        """Engine of a kehilot.csv file, read the way helpers.js reads it"""
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            lines = [line for line in f.read().split('\n')[1:] if js_trim(line)]
+        names = [(parse_csv_line(line) + ['', ''])[1] for line in lines]
+        return cls([kehila_record(line) for line in lines], names)
+
+    def __len__(self):
+        return len(self.year_starts)
+
+    def shown(self, years, rows=None):
+        """Boolean (rows x years) array: whether the page shows each row in each year"""
+        rows = slice(None) if rows is None else np.asarray(rows, dtype=np.intp)
+        years = np.asarray(years, dtype=np.float64)[np.newaxis, :]
+        return (self.year_starts[rows, np.newaxis] <= years) & (self.year_ends[rows, np.newaxis] >= years)
+
+    def cells(self, years, rows=None):
+        """(row positions, columns, populations) of the cells the page shows, as flat arrays
+
+        Row positions index into rows (every row by default), columns into years. Only the
+        years within each row's period are computed, a small part of rows x years.
+        """
+        years = np.asarray(years, dtype=np.float64)
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.intp)
+        order = np.argsort(years, kind='stable')
+        sorted_years = years[order]
+        # Sorted positions of each row's first and after-last shown year (NaN rows: none)
+        firsts = np.searchsorted(sorted_years, self.year_starts[rows], side='left')
+        lasts = np.searchsorted(sorted_years, self.year_ends[rows], side='right')
+        counts = np.maximum(lasts - firsts, 0)
+        starts = np.cumsum(counts) - counts
+        cell_positions = np.repeat(np.arange(len(rows)), counts)
+        cell_rows = rows[cell_positions]
+        positions = np.arange(counts.sum()) - np.repeat(starts - firsts, counts)
+
+        year = sorted_years[positions]
+        year_start = self.year_starts[cell_rows]
+        year_end = self.year_ends[cell_rows]
+        pop_start = self.pop_starts[cell_rows]
+        pop_end = self.pop_ends[cell_rows]
+        with np.errstate(invalid='ignore', divide='ignore'):  # 0/0 and inf - inf give NaN, as in JavaScript
+            interpolated = np.floor(((year_end - year) * pop_start + (year - year_start) * pop_end) /
+                                    (year_end - year_start))
+        values = np.where(self.open_ended[cell_rows], pop_start, interpolated)
+        return cell_positions, order[positions], values
+
+    def populations(self, years, rows=None):
+        """(rows x years) float64 array of the population the page shows; NaN where not shown"""
+        positions, columns, values = self.cells(years, rows)
+        result = np.full((len(self) if rows is None else len(rows), len(years)), np.nan)
+        result[positions, columns] = values
+        return result
+
+    def series(self, row, years):
+        """Population of one row in each year (NaN where not shown)"""
+        return self.populations(years, [row])[0]
+
+    def totals(self, years):
+        """Total population shown in each year; NaN populations count as nothing, as in the cluster sums"""
+        _, columns, values = self.cells(years)
+        return np.bincount(columns, weights=np.nan_to_num(values, nan=0.0), minlength=len(years))
+
+    def rows_named(self, name):
+        """Rows whose city is a name"""
+        return [row for row, row_name in enumerate(self.names) if row_name == name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interpolated Jewish population of kehilot.csv by year")
+    parser.add_argument("--first", type=int, default=-1312, help="first year (default: -1312)")
+    parser.add_argument("--last", type=int, default=2023, help="last year (default: 2023)")
+    parser.add_argument("--step", type=int, default=100, help="years between printed totals (default: 100)")
+    parser.add_argument("--city", help="print the population of a city's periods instead")
+    args = parser.parse_args()
+
+    engine = PopulationEngine.load()
+    years = np.arange(args.first, args.last + 1)
+    start = time.perf_counter()
+    if args.city:
+        rows = engine.rows_named(args.city)
+        table = engine.populations(years, rows)
+        for year, values in zip(years[::args.step], table[:, ::args.step].T):
+            shown = values[~np.isnan(values)]
+            if len(shown):
+                print(f"{year:6d}: {', '.join(str(int(value)) for value in shown)}")
+    else:
+        totals = engine.totals(years)
+        for year, total in zip(years[::args.step], totals[::args.step]):
+            print(f"{year:6d}: {int(total):>12,}")
+    print(f"{len(engine)} rows x {len(years)} years in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
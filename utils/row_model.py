@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Row model of the converter GUI
+Holds the rows shown in the table and tells listeners which rows changed,
+so views update only those rows instead of rebuilding everything
+"""
+
+RESET = 'reset'    # All rows were replaced; indices is None
+UPDATE = 'update'  # Cells of existing rows changed; indices lists the rows
+INSERT = 'insert'  # Rows were added at the end; indices is their range
+
+
+class RowModel:
+    def __init__(self, columns, rows=None):
+        self.columns = columns
+        self.rows = rows if rows is not None else []
+        self._column_indices = {name: index for index, name in enumerate(columns)}
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """Call listener(kind, indices) after every change"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a listener"""
+        self._listeners.remove(listener)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def column_index(self, name):
+        """Position of a column by name, or None"""
+        return self._column_indices.get(name)
+
+    def reset(self, rows):
+        """Replace all rows"""
+        self.rows = rows
+        self._notify(RESET, None)
+
+    def append(self, rows):
+        """Add rows at the end"""
+        start = len(self.rows)
+        self.rows.extend(rows)
+        if len(self.rows) > start:
+            self._notify(INSERT, range(start, len(self.rows)))
+
+    def get_cell(self, index, column):
+        """Value of a cell, or '' for a column the row is too short to have"""
+        row = self.rows[index]
+        return row[column] if column < len(row) else ''
+
+    def set_cell(self, index, column, value):
+        """Change one cell and return its previous value
+
+        Short rows are padded with empty cells up to the column.
+        """
+        row = self.rows[index]
+        while len(row) <= column:
+            row.append('')
+        old_value = row[column]
+        if old_value != value:
+            row[column] = value
+            self._notify(UPDATE, [index])
+        return old_value
+
+    def _notify(self, kind, indices):
+        """Tell every listener about a change"""
+        for listener in list(self._listeners):
+            listener(kind, indices)
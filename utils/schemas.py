@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Registry of the CSV layouts the converter accepts
+Each schema declares its columns and how its rows become kehilot.csv rows. A file
+is routed by its first row alone: a header names the schema, and a file without
+a header goes by its column count. New formats only need a register_schema call.
+"""
+from kehilot_converter import KEHILOT_COLUMNS, INPUT_COLUMNS, convert_rows
+
+SCHEMAS = []
+_by_header = {}   # Normalized header -> schema
+_by_width = {}    # Column count -> schema, for files without a header
+
+
+class Schema:
+    def __init__(self, name, label, columns, convert, aliases=(), headerless=False, needs_names=False):
+        self.name = name
+        self.label = label  # Shown in the status bar, e.g. "kehilot.csv format"
+        self.columns = columns
+        # convert(rows, get_city_names, **options) -> kehilot.csv rows, rows without the header;
+        # a sources list option is filled with the index in rows of each converted row's input row
+        self.convert = convert
+        self.aliases = aliases  # Other headers of the same layout, e.g. older column names
+        self.headerless = headerless  # Files may start with data; routed by column count then
+        # Rows need city name lookups, so they are converted as a whole once loaded;
+        # otherwise each row converts alone and rows are shown as they load
+        self.needs_names = needs_names
+
+
+def normalize_header(row):
+    """Header cells in comparable form: lower case, single spaces, no BOM or trailing empty cells"""
+    cells = [' '.join(cell.replace('\ufeff', '').split()).lower() for cell in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return tuple(cells)
+
+
+def register_schema(schema):
+    """Add a schema to the registry; later schemas win over earlier ones"""
+    SCHEMAS.append(schema)
+    for header in [schema.columns] + list(schema.aliases):
+        _by_header[normalize_header(header)] = schema
+    if schema.headerless:
+        _by_width[len(schema.columns)] = schema
+
+
+def detect_schema(first_row):
+    """Return (schema, has_header) for a file's first row, or (None, False) if no schema fits"""
+    schema = _by_header.get(normalize_header(first_row))
+    if schema is not None:
+        return schema, True
+    return _by_width.get(len(first_row)), False
+
+
+def remap_columns(columns):
+    """Converter for a layout holding kehilot.csv columns in another order or subset
+
+    Missing columns are left empty and unknown ones are dropped.
+    """
+    positions = [columns.index(name) if name in columns else None for name in KEHILOT_COLUMNS]
+
+    def convert(rows, get_city_names=None, sources=None, **options):
+        if sources is not None:
+            sources.extend(range(len(rows)))
+        return [[row[position] if position is not None and position < len(row) else ''
+                 for position in positions] for row in rows]
+    return convert
+
+
+def _keep_rows(rows, get_city_names=None, sources=None, **options):
+    """Converter for rows already in kehilot.csv format; rows with fewer cells than its columns are dropped"""
+    kept = [index for index, row in enumerate(rows) if len(row) >= len(KEHILOT_COLUMNS)]
+    if sources is not None:
+        sources.extend(kept)
+    return [rows[index] for index in kept]
+
+
+# kehilot.csv as written by the converter
+# (an early export misspelled year_estab as yead_estab)
+register_schema(Schema('kehilot', "kehilot.csv format", KEHILOT_COLUMNS, _keep_rows, headerless=True,
+                       aliases=[['yead_estab' if name == 'year_estab' else name for name in KEHILOT_COLUMNS]]))
+
+# kehilot.csv from before the year_estab column was added
+LEGACY_KEHILOT_COLUMNS = [name for name in KEHILOT_COLUMNS if name != 'year_estab']
+register_schema(Schema('kehilot_legacy', "kehilot.csv format without year_estab", LEGACY_KEHILOT_COLUMNS,
+                       remap_columns(LEGACY_KEHILOT_COLUMNS)))
+
+# The 9-column input format of the regional dumps, usually without a header
+register_schema(Schema('input', "input format", INPUT_COLUMNS, convert_rows,
+                       headerless=True, needs_names=True))
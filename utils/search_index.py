@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Inverted index for filtering the rows of the converter table
+Maps every word of the name columns, normalized without case, diacritics or
+Hebrew niqqud, to the rows that contain it. A query matches rows having a word
+that starts with each of its words, so typing "krak" finds Kraków and קְרָקוֹב finds קרקוב.
+"""
+import re
+import bisect
+import unicodedata
+
+from row_model import RESET, UPDATE, INSERT
+
+SEARCH_COLUMNS = ['country', 'city', 'city_english', 'city_hebrew', 'city_yid', 'city_german', 'city_other']
+
+WORD_PATTERN = re.compile(r'\w+')
+# Accents, niqqud, cantillation and other combining marks left by NFKD decomposition
+MARK_PATTERN = re.compile('[%s]' % ''.join(re.escape(chr(code)) for code in range(0x10000)
+                                           if unicodedata.combining(chr(code))))
+SHORT_PREFIX = 2  # Prefixes up to this length have their own postings; they match too many words to union
+
+
+def normalize(text):
+    """Text without case, accents or niqqud/cantillation marks, for matching"""
+    return MARK_PATTERN.sub('', unicodedata.normalize('NFKD', text)).casefold()
+
+
+def words(text):
+    """Normalized words of a text"""
+    return WORD_PATTERN.findall(normalize(text))
+
+
+def short_prefixes(row_words):
+    """Prefixes of up to SHORT_PREFIX letters of a set of words"""
+    return {word[:length] for word in row_words for length in range(1, SHORT_PREFIX + 1)}
+
+
+class SearchIndex:
+    def __init__(self, model, columns=SEARCH_COLUMNS):
+        self.model = model
+        self.columns = [index for index in map(model.column_index, columns) if index is not None]
+        self._postings = {}  # Word -> set of rows
+        self._sorted_words = []  # Words in order, to find those with a prefix by bisection
+        self._row_words = []  # Row -> its words, to remove them when it changes
+        self._short_prefixes = {}  # Prefix of SHORT_PREFIX letters or less -> rows with a word starting with it
+        self._built = False  # Built at the first search, so loading without searching costs nothing
+        model.subscribe(self._on_model_change)
+
+    def search(self, query):
+        """Rows, in order, with a word starting with each word of the query; None for an empty query"""
+        terms = words(query)
+        if not terms:
+            return None
+        if not self._built:
+            self._build()
+        result = None
+        for term in sorted(set(terms), key=len, reverse=True):  # Longest first, usually the fewest rows
+            rows = self._rows_with_prefix(term)
+            result = rows if result is None else result & rows
+            if not result:
+                return []
+        return sorted(result)
+
+    def _rows_with_prefix(self, prefix):
+        """Rows having a word that starts with prefix"""
+        if len(prefix) <= SHORT_PREFIX:
+            return set(self._short_prefixes.get(prefix, ()))
+        start = bisect.bisect_left(self._sorted_words, prefix)
+        end = bisect.bisect_left(self._sorted_words, prefix + '\U0010ffff')
+        postings = self._postings
+        return set().union(*[postings[word] for word in self._sorted_words[start:end]])
+
+    def _build(self):
+        """Index every row of the model"""
+        self._postings = {}
+        self._row_words = []
+        self._short_prefixes = {}
+        self._add_rows(range(len(self.model)))
+        self._sorted_words = sorted(self._postings)
+        self._built = True
+
+    def _row_text_words(self, row):
+        """The set of words in a row's searched columns"""
+        cells = self.model[row]
+        return set(words(' '.join(cells[column] for column in self.columns if column < len(cells))))
+
+    def _add_rows(self, rows):
+        """Index new rows at the end; returns words seen for the first time"""
+        new_words = []
+        for row in rows:
+            row_words = self._row_text_words(row)
+            self._row_words.append(row_words)
+            for word in row_words:
+                posting = self._postings.get(word)
+                if posting is None:
+                    posting = self._postings[word] = set()
+                    new_words.append(word)
+                posting.add(row)
+            for prefix in short_prefixes(row_words):
+                self._short_prefixes.setdefault(prefix, set()).add(row)
+        return new_words
+
+    def _update_row(self, row):
+        """Re-index an edited row"""
+        old_words = self._row_words[row]
+        new_words = self._row_text_words(row)
+        for word in old_words - new_words:
+            posting = self._postings[word]
+            posting.discard(row)
+            if not posting:
+                del self._postings[word]
+                del self._sorted_words[bisect.bisect_left(self._sorted_words, word)]
+        for word in new_words - old_words:
+            posting = self._postings.get(word)
+            if posting is None:
+                self._postings[word] = {row}
+                bisect.insort(self._sorted_words, word)
+            else:
+                posting.add(row)
+        self._row_words[row] = new_words
+        old_prefixes = short_prefixes(old_words)
+        new_prefixes = short_prefixes(new_words)
+        for prefix in old_prefixes - new_prefixes:
+            self._short_prefixes[prefix].discard(row)
+        for prefix in new_prefixes - old_prefixes:
+            self._short_prefixes.setdefault(prefix, set()).add(row)
+
+    def _on_model_change(self, kind, indices):
+        """Keep a built index in step with the model"""
+        if kind == RESET:
+            self._built = False
+            self._postings = {}
+            self._sorted_words = []
+            self._row_words = []
+            self._short_prefixes = {}
+        elif not self._built:
+            return
+        elif kind == UPDATE:
+            for row in indices:
+                self._update_row(row)
+        elif kind == INSERT:
+            new_words = self._add_rows(indices)
+            if new_words:
+                self._sorted_words.extend(new_words)
+                self._sorted_words.sort()  # A sorted run and a short tail: close to linear
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary snapshot of the project's CSV files
+kehilot.csv, events.csv, events_polygon.csv and historical_arrows.csv are
+compiled into one file: fixed-width number columns (64-bit ints, doubles),
+text columns as codes into an offset-indexed UTF-8 heap, and a versioned header
+holding the SHA-256 of the sources. Opening it maps the file and casts each
+column in place, so nothing is parsed or copied; when a source changes, the
+hash no longer matches and the tables are read from the CSVs and the snapshot
+rebuilt.
+
+File layout: magic, version and header size (4 bytes each, little-endian), the
+JSON header, then every column's blobs, each starting on an 8-byte boundary at
+the offset the header gives.
+
+Usage:
+    tables = load_tables()
+    kehilot = tables['kehilot']  # A KehilotDataset, read-only
+
+    python snapshot.py  # Build (or check) the snapshot
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+import tempfile
+import argparse
+
+from dataset import KehilotDataset, COLUMN_KINDS
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.snapshot')
+
+SNAPSHOT_MAGIC = b'KSNP'
+SNAPSHOT_VERSION = 2
+ALIGNMENT = 8
+
+# Table -> (CSV file in the project directory, kinds of the columns not typed like kehilot.csv's)
+SOURCES = {
+    'kehilot': ('kehilot.csv', {}),
+    'events': ('events.csv', {
+        'ellipse_center_long': 'float', 'ellipse_center_lat': 'float', 'radii_1': 'float', 'radii_2': 'float',
+        'tilt_deg': 'float', 'fillOpacity': 'float', 'color': 'category', 'fillColor': 'category'}),
+    'events_polygon': ('events_polygon.csv', {
+        'fillOpacity': 'float', 'color': 'category', 'fillColor': 'category'}),
+    'historical_arrows': ('historical_arrows.csv', {
+        'startLat': 'float', 'startLon': 'float', 'endLat': 'float', 'endLon': 'float',
+        'midLat': 'float', 'midLon': 'float', 'yearStart': 'int', 'yearEnd': 'int', 'color': 'category'}),
+}
+
+
+def source_hash(root=PROJECT_DIR):
+    """SHA-256 of the source CSV files, in table order"""
+    digest = hashlib.sha256()
+    for name, (file_name, _) in SOURCES.items():
+        with open(os.path.join(root, file_name), 'rb') as f:
+            data = f.read()
+        digest.update(f'{name}:{len(data)}:'.encode('utf-8'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def load_sources(root=PROJECT_DIR):
+    """{table: dataset} read from the CSV files"""
+    return {name: KehilotDataset.load(os.path.join(root, file_name), kinds)
+            for name, (file_name, kinds) in SOURCES.items()}
+
+
+def _padding(size):
+    return -size % ALIGNMENT
+
+
+def write_snapshot(path, tables, digest):
+    """Write tables to a snapshot file, atomically"""
+    header = {'version': SNAPSHOT_VERSION, 'source_hash': digest, 'byteorder': sys.byteorder, 'tables': {}}
+    blobs = []
+    offset = 0
+    for name, dataset in tables.items():
+        columns = []
+        for column_name in dataset.columns:
+            kind, typecodes, column_blobs = dataset.column(column_name).dump(fixed_width=True)
+            spans = []
+            for blob in column_blobs:
+                spans.append([offset, len(blob)])
+                blobs.append(blob)
+                offset += len(blob) + _padding(len(blob))
+            columns.append({'name': column_name, 'kind': kind, 'typecodes': typecodes, 'blobs': spans})
+        header['tables'][name] = {'length': len(dataset), 'columns': columns, **dataset.ragged_rows()}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    prefix = SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(4, 'little') + len(header_bytes).to_bytes(4, 'little')
+    prefix += header_bytes + bytes(_padding(len(prefix) + len(header_bytes)))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(prefix)
+            for blob in blobs:
+                f.write(blob)
+                f.write(bytes(_padding(len(blob))))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """(source hash, {table: dataset}) of a snapshot file, or None if it is missing or unusable
+
+    The datasets' columns are views into the mapped file and cannot be appended to.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # ValueError: empty file
+        return None
+    view = memoryview(mapped)
+    if bytes(view[:4]) != SNAPSHOT_MAGIC or int.from_bytes(view[4:8], 'little') != SNAPSHOT_VERSION:
+        return None
+    header_size = int.from_bytes(view[8:12], 'little')
+    try:
+        header = json.loads(str(view[12:12 + header_size], 'utf-8'))
+    except ValueError:
+        return None
+    if header['byteorder'] != sys.byteorder:
+        return None  # Rebuilt rather than byte-swapped, so columns stay views
+    start = 12 + header_size + _padding(12 + header_size)
+
+    tables = {}
+    for name, table in header['tables'].items():
+        dataset = KehilotDataset([column['name'] for column in table['columns']])
+        for column in table['columns']:
+            blobs = [view[start + offset:start + offset + size] for offset, size in column['blobs']]
+            dataset.data[column['name']] = COLUMN_KINDS[column['kind']].restore(column['typecodes'], blobs, False)
+        dataset.length = table['length']
+        dataset.set_ragged_rows(table)
+        tables[name] = dataset
+    return header['source_hash'], tables
+
+
+def load_tables(root=PROJECT_DIR, path=SNAPSHOT_PATH):
+    """{table: dataset} from the snapshot, or from the CSV files (rebuilding the snapshot) if they changed"""
+    digest = source_hash(root)
+    snapshot = read_snapshot(path)
+    if snapshot and snapshot[0] == digest:
+        return snapshot[1]
+    tables = load_sources(root)
+    try:
+        write_snapshot(path, tables, digest)
+    except OSError as e:  # e.g. read-only directory, or the old snapshot still mapped on Windows
+        print(f"Could not write snapshot {path}: {e}")
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the binary snapshot of the project's CSV files")
+    parser.add_argument("-o", "--output", default=SNAPSHOT_PATH, help="snapshot file (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the snapshot is up to date")
+    args = parser.parse_args()
+
+    digest = source_hash()
+    snapshot = None if args.force else read_snapshot(args.output)
+    if snapshot and snapshot[0] == digest:
+        print(f"{args.output} is up to date")
+    else:
+        start = time.perf_counter()
+        write_snapshot(args.output, load_sources(), digest)
+        print(f"Built {args.output} in {time.perf_counter() - start:.2f}s: {os.path.getsize(args.output)} bytes")
+    start = time.perf_counter()
+    _, tables = read_snapshot(args.output)
+    elapsed = time.perf_counter() - start
+    print(", ".join(f"{name}: {len(dataset)} rows" for name, dataset in tables.items()))
+    print(f"Opened in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
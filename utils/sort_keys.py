@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Typed, cached sort keys for the columns of the converter table
+Each column's values are parsed into keys once: numbers for years, populations
+and coordinates (so -650 sorts before 70 and "000" equals 0), case-folded text
+for the rest. Edits re-parse only the edited rows; multi-column sorts reuse the
+keys of every column they include.
+"""
+from row_model import RESET, UPDATE, INSERT
+
+NUMERIC_COLUMNS = {'long', 'lat', 'year_estab', 'year_start', 'year_end', 'pop_start', 'pop_end',
+                   'type', 'symbol'}
+
+# Keys of one column compare as (kind, number, text): numbers first, then text, empty cells last
+NUMBER, TEXT, EMPTY = 0, 1, 2
+EMPTY_KEY = (EMPTY, 0.0, '')
+
+
+def number_key(value):
+    """Key of a cell in a numeric column; text that is not a number sorts after the numbers"""
+    value = value.strip()
+    if not value or value == 'NA':
+        return EMPTY_KEY
+    try:
+        return (NUMBER, float(value.replace(',', '')), '')
+    except ValueError:
+        return (TEXT, 0.0, value.casefold())
+
+
+def text_key(value):
+    """Key of a cell in a text column"""
+    value = value.strip()
+    return (TEXT, 0.0, value.casefold()) if value else EMPTY_KEY
+
+
+class SortKeys:
+    def __init__(self, model):
+        self.model = model
+        self._keys = {}  # Column index -> key of every row
+        model.subscribe(self._on_model_change)
+
+    def keys(self, column):
+        """Keys of every row for a column index, parsed at the first use"""
+        keys = self._keys.get(column)
+        if keys is None:
+            keys = self._keys[column] = [self._key(column, row) for row in range(len(self.model))]
+        return keys
+
+    def sorted_rows(self, sort_columns, rows=None):
+        """Rows ordered by [(column index, descending), ...], most significant first
+
+        rows defaults to every row; ties keep their order.
+        """
+        rows = list(range(len(self.model)) if rows is None else rows)
+        # Stable sorts from the least significant column to the most significant one
+        for column, descending in reversed(sort_columns):
+            rows.sort(key=self.keys(column).__getitem__, reverse=descending)
+        return rows
+
+    def _key(self, column, row):
+        """Parse the key of one cell"""
+        value = self.model.get_cell(row, column)
+        if self.model.columns[column] in NUMERIC_COLUMNS:
+            return number_key(value)
+        return text_key(value)
+
+    def _on_model_change(self, kind, indices):
+        """Re-parse edited and new rows of the cached columns; drop everything on a reset"""
+        if kind == RESET:
+            self._keys = {}
+        elif kind == UPDATE:
+            for column, keys in self._keys.items():
+                for row in indices:
+                    keys[row] = self._key(column, row)
+        elif kind == INSERT:
+            for column, keys in self._keys.items():
+                keys.extend(self._key(column, row) for row in indices)
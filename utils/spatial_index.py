@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Grid index of the communities of kehilot.csv by their coordinates
+Rows are hashed into cells of CELL_DEGREES of longitude and latitude, so a
+query only looks at the rows of the cells it overlaps instead of scanning the
+file. Supports bounding boxes (also across the 180th meridian), radius and
+k-nearest queries on great-circle distance, each optionally limited to the
+rows active in a year (the rule of KehilotDataset.active_in).
+
+Usage:
+    index = SpatialIndex(load_tables()['kehilot'])
+    index.bbox(14.0, 49.0, 24.2, 55.0, year=1900)  # west, south, east, north
+    index.within(52.23, 21.01, 25)                  # [(km, row)] within 25 km of Warsaw
+    index.nearest(50.06, 19.94, k=3)                # The 3 closest to Kraków
+
+    python spatial_index.py LAT LON [-k 5] [--year 1800]
+"""
+import math
+import time
+import bisect
+import argparse
+
+from dataset import MISSING_INT
+
+CELL_DEGREES = 0.5
+EARTH_RADIUS_KM = 6371.0088  # Mean radius
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180  # Along a meridian
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points given in degrees"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat, lon, radius_km):
+    """(west, south, east, north) containing every point within a radius; west > east across the 180th meridian"""
+    angle = radius_km / EARTH_RADIUS_KM
+    south = lat - math.degrees(angle)
+    north = lat + math.degrees(angle)
+    if south <= -90 or north >= 90:
+        return -180.0, max(south, -90.0), 180.0, min(north, 90.0)  # Reaches a pole: every longitude
+    spread = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+    return (lon - spread + 180) % 360 - 180, south, (lon + spread + 180) % 360 - 180, north
+
+
+class SpatialIndex:
+    def __init__(self, dataset, cell_degrees=CELL_DEGREES):
+        self.dataset = dataset
+        self.cell_degrees = cell_degrees
+        self.longs = dataset.column('long')
+        self.lats = dataset.column('lat')
+        self.year_starts = dataset.column('year_start').values
+        self.year_ends = dataset.column('year_end').values
+        self.cells = {}  # (column, row) of a cell -> dataset rows in it
+        self.rows = 0
+        for row in range(len(dataset)):
+            lon, lat = self.longs[row], self.lats[row]
+            if lon is None or lat is None or not (-180 <= lon <= 180 and -90 <= lat <= 90):
+                continue  # No usable coordinates
+            self.cells.setdefault(self._cell(lon if lon < 180 else -180.0, lat), []).append(row)
+            self.rows += 1
+        self.columns_of_row = {}  # Cell row -> sorted cell columns holding rows, to walk a box's cells
+        for x, y in self.cells:
+            self.columns_of_row.setdefault(y, []).append(x)
+        for columns in self.columns_of_row.values():
+            columns.sort()
+
+    def _cell(self, lon, lat):
+        return math.floor(lon / self.cell_degrees), math.floor(lat / self.cell_degrees)
+
+    def active(self, row, year):
+        """Whether a row's period covers a year; always True without a year"""
+        if year is None:
+            return True
+        start, end = self.year_starts[row], self.year_ends[row]
+        return start != MISSING_INT and start <= year and (end == MISSING_INT or end >= year)
+
+    def _candidates(self, west, south, east, north):
+        """Rows of the cells overlapping a box (west > east: across the 180th meridian)"""
+        if west > east:
+            yield from self._candidates(west, south, 180.0, north)
+            yield from self._candidates(-180.0, south, east, north)
+            return
+        first_x, first_y = self._cell(west, south)
+        last_x, last_y = self._cell(east, north)
+        for y in range(first_y, last_y + 1):
+            columns = self.columns_of_row.get(y)
+            if not columns:
+                continue
+            for x in columns[bisect.bisect_left(columns, first_x):bisect.bisect_right(columns, last_x)]:
+                yield from self.cells[(x, y)]
+
+    def bbox(self, west, south, east, north, year=None):
+        """Rows, in order, whose coordinates are inside a box (west > east: across the 180th meridian)"""
+        longs, lats = self.longs, self.lats
+        found = []
+        for row in self._candidates(west, south, east, north):
+            lon, lat = longs[row], lats[row]
+            in_longs = west <= lon <= east if west <= east else (lon >= west or lon <= east)
+            if in_longs and south <= lat <= north and self.active(row, year):
+                found.append(row)
+        found.sort()
+        return found
+
+    def within(self, lat, lon, radius_km, year=None):
+        """[(distance in km, row)] of the rows within a radius of a point, nearest first"""
+        longs, lats = self.longs, self.lats
+        found = []
+        for row in self._candidates(*radius_bbox(lat, lon, radius_km)):
+            if self.active(row, year):
+                distance = haversine_km(lat, lon, lats[row], longs[row])
+                if distance <= radius_km:
+                    found.append((distance, row))
+        found.sort()
+        return found
+
+    def nearest(self, lat, lon, k=1, year=None, max_km=None):
+        """[(distance in km, row)] of the k rows nearest to a point, nearest first
+
+        Radius queries from the width of a cell, doubling the radius until k rows
+        are inside (or max_km, or half the globe, is reached).
+        """
+        if k <= 0:
+            return []
+        limit = math.pi * EARTH_RADIUS_KM if max_km is None else max_km
+        radius = min(self.cell_degrees * KM_PER_DEGREE, limit)
+        while True:
+            found = self.within(lat, lon, radius, year)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius = min(radius * 2, limit)
+
+
+def main():
+    from snapshot import load_tables
+
+    parser = argparse.ArgumentParser(description="Communities of kehilot.csv nearest to a point")
+    parser.add_argument("lat", type=float, help="latitude")
+    parser.add_argument("lon", type=float, help="longitude")
+    parser.add_argument("-k", type=int, default=5, help="number of communities (default: 5)")
+    parser.add_argument("--year", type=int, help="only communities active in this year")
+    args = parser.parse_args()
+
+    dataset = load_tables()['kehilot']
+    start = time.perf_counter()
+    index = SpatialIndex(dataset)
+    built = time.perf_counter()
+    nearest = index.nearest(args.lat, args.lon, args.k, args.year)
+    elapsed = time.perf_counter() - built
+    countries, cities = dataset.column('country'), dataset.column('city')
+    for distance, row in nearest:
+        print(f"{distance:8.1f} km  {cities[row]}, {countries[row]} "
+              f"({dataset.column('year_start').text(row)}-{dataset.column('year_end').text(row)})")
+    print(f"Indexed {index.rows} rows in {(built - start) * 1000:.1f} ms; query took {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
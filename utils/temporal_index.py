@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Interval-tree index of what the map shows in each year
+Each row of kehilot.csv, events.csv, events_polygon.csv and historical_arrows.csv
+becomes the closed interval of years in which helpers.js shows it, following
+the page's own rules:
+- kehilot (loadData): year_start <= year && (year_end === undefined || year_end >= year)
+- arrows (updateArrows): yearStart <= year <= yearEnd, and also yearEnd + 1 when
+  yearStart === yearEnd
+- ellipses and polygons (processEllipseEvents/processPolygonEvents): as arrows but
+  open-ended without year_end; the scan stops at the first event starting
+  after the year, so an event also waits for every event before it in the file
+Rows are numbered as the page numbers them: non-blank lines after the header.
+
+A centered interval tree then answers "what is shown in year Y" (stab) and
+"what is shown at some year of [A, B]" (overlapping) in O(log n + k). Indexes
+serialize to little-endian 64-bit arrays (to_bytes/write_indexes), so the build
+and a server can load them without re-reading the CSVs.
+
+Usage:
+    indexes = build_indexes()
+    indexes['historical_arrows'].stab(-586)  # Row numbers, in no particular order
+
+    python temporal_index.py [-o temporal.idx] [--year 1800]
+"""
+import os
+import sys
+import json
+import bisect
+import argparse
+from array import array
+
+from build_shards import js_parse_int, js_trim, parse_csv_line, kehila_record
+from dataset import KEHILOT_PATH
+
+PROJECT_DIR = os.path.dirname(KEHILOT_PATH)
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temporal.idx')
+
+INDEX_MAGIC = b'KTI1'
+OPEN_END = 2 ** 63 - 1  # Last year of an interval without an end
+NO_NODE = -1
+
+
+def _rows(csv_text):
+    """Cells of the rows the page reads: non-blank lines after the header, split by parseCSVLine"""
+    return [parse_csv_line(row) for row in csv_text.split('\n')[1:] if js_trim(row)]
+
+
+def _cell(cells, index):
+    return cells[index] if index < len(cells) else None
+
+
+def kehilot_intervals(csv_text):
+    """[(row, first year, last year)] of kehilot.csv; open-ended rows last until OPEN_END"""
+    intervals = []
+    rows = [row for row in csv_text.split('\n')[1:] if js_trim(row)]
+    for number, row in enumerate(rows):
+        record = kehila_record(row)
+        if record is not None and record['year_start'] is not None:
+            intervals.append((number, record['year_start'], record.get('year_end', OPEN_END)))
+    return intervals
+
+
+def arrow_intervals(csv_text):
+    """[(row, first year, last year)] of historical_arrows.csv"""
+    intervals = []
+    for number, cells in enumerate(_rows(csv_text)):
+        start, end = js_parse_int(_cell(cells, 6)), js_parse_int(_cell(cells, 7))
+        if start is None or end is None:
+            continue  # NaN: never shown
+        last = end + 1 if start == end else end
+        if start <= last:
+            intervals.append((number, start, last))
+    return intervals
+
+
+def event_intervals(csv_text, start_column, end_column):
+    """[(row, first year, last year)] of events.csv or events_polygon.csv, which the page scans in file order"""
+    intervals = []
+    latest_start = None  # Latest year_start before the row: the scan stops there in earlier years
+    for number, cells in enumerate(_rows(csv_text)):
+        start = js_parse_int(_cell(cells, start_column))
+        year_end = _cell(cells, end_column)
+        first = start if latest_start is None or start is None else max(start, latest_start)
+        if start is not None:
+            latest_start = start if latest_start is None else max(latest_start, start)
+        if start is None:
+            continue
+        if year_end is None or js_trim(year_end) == '':
+            intervals.append((number, first, OPEN_END))
+            continue
+        end = js_parse_int(year_end)
+        if end is None:
+            continue
+        last = end + 1 if start == end else end
+        if first <= last:
+            intervals.append((number, first, last))
+    return intervals
+
+
+# Dataset -> (CSV file in the project directory, function of its text giving the intervals)
+TEMPORAL_SOURCES = {
+    'kehilot': ('kehilot.csv', kehilot_intervals),
+    'events': ('events.csv', lambda text: event_intervals(text, 8, 9)),
+    'events_polygon': ('events_polygon.csv', lambda text: event_intervals(text, 4, 5)),
+    'historical_arrows': ('historical_arrows.csv', arrow_intervals),
+}
+
+
+class IntervalIndex:
+    """Static centered interval tree over (id, first, last) closed intervals of years"""
+
+    FIELDS = ['ids', 'firsts', 'lasts', 'by_first', 'by_last',
+              'centers', 'lefts', 'rights', 'node_starts', 'node_counts']
+
+    def __init__(self, intervals=()):
+        # Intervals ending before they start (year_end < year_start) contain no year
+        intervals = sorted((interval for interval in intervals if interval[1] <= interval[2]),
+                           key=lambda interval: interval[1])
+        self.ids = array('q', [interval[0] for interval in intervals])
+        self.firsts = array('q', [interval[1] for interval in intervals])  # Sorted, for range queries
+        self.lasts = array('q', [interval[2] for interval in intervals])
+        # Items of each node, by first year ascending and by last year descending, node after node
+        self.by_first = array('q')
+        self.by_last = array('q')
+        self.centers = array('q')
+        self.lefts = array('q')
+        self.rights = array('q')
+        self.node_starts = array('q')
+        self.node_counts = array('q')
+        self.root = self._build(list(range(len(self.ids))))
+
+    def _build(self, items):
+        """Add the subtree of a list of items; returns its node number"""
+        if not items:
+            return NO_NODE
+        firsts, lasts = self.firsts, self.lasts
+        points = sorted([firsts[item] for item in items] +
+                        [lasts[item] for item in items if lasts[item] != OPEN_END])
+        center = points[len(points) // 2]  # An endpoint, so some item contains it
+        left = [item for item in items if lasts[item] < center]
+        right = [item for item in items if firsts[item] > center]
+        here = [item for item in items if firsts[item] <= center <= lasts[item]]
+
+        node = len(self.centers)
+        self.centers.append(center)
+        self.lefts.append(NO_NODE)
+        self.rights.append(NO_NODE)
+        self.node_starts.append(len(self.by_first))
+        self.node_counts.append(len(here))
+        self.by_first.extend(sorted(here, key=firsts.__getitem__))
+        self.by_last.extend(sorted(here, key=lasts.__getitem__, reverse=True))
+        self.lefts[node] = self._build(left)
+        self.rights[node] = self._build(right)
+        return node
+
+    def __len__(self):
+        return len(self.ids)
+
+    def stab(self, year):
+        """Ids of the intervals containing a year"""
+        result = []
+        ids, firsts, lasts = self.ids, self.firsts, self.lasts
+        node = self.root
+        while node != NO_NODE:
+            center = self.centers[node]
+            start = self.node_starts[node]
+            end = start + self.node_counts[node]
+            if year < center:
+                for position in range(start, end):  # Not a slice: stop without copying the rest
+                    item = self.by_first[position]
+                    if firsts[item] > year:
+                        break
+                    result.append(ids[item])
+                node = self.lefts[node]
+            elif year > center:
+                for position in range(start, end):
+                    item = self.by_last[position]
+                    if lasts[item] < year:
+                        break
+                    result.append(ids[item])
+                node = self.rights[node]
+            else:
+                result.extend(ids[item] for item in self.by_first[start:end])
+                break
+        return result
+
+    def overlapping(self, first, last):
+        """Ids of the intervals sharing a year with [first, last]"""
+        if first > last:
+            return []
+        # Those containing first, then those starting within (first, last]
+        start = bisect.bisect_right(self.firsts, first)
+        end = bisect.bisect_right(self.firsts, last)
+        return self.stab(first) + list(self.ids[start:end])
+
+    def to_bytes(self):
+        """The index as a count header and its arrays of little-endian 64-bit ints"""
+        header = array('q', [len(self.ids), len(self.centers), self.root])
+        arrays = [header] + [getattr(self, field) for field in self.FIELDS]
+        if sys.byteorder == 'big':
+            arrays = [array('q', values) for values in arrays]
+            for values in arrays:
+                values.byteswap()
+        return b''.join(values.tobytes() for values in arrays)
+
+    @classmethod
+    def from_bytes(cls, data):
+        values = array('q')
+        values.frombytes(data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        count, nodes, root = values[:3]
+        index = cls()
+        position = 3
+        for field in cls.FIELDS:
+            length = count if field in ('ids', 'firsts', 'lasts', 'by_first', 'by_last') else nodes
+            setattr(index, field, values[position:position + length])
+            position += length
+        index.root = root
+        return index
+
+
+def build_indexes(root=PROJECT_DIR):
+    """{dataset: IntervalIndex} of the project's CSV files"""
+    indexes = {}
+    for name, (file_name, intervals) in TEMPORAL_SOURCES.items():
+        with open(os.path.join(root, file_name), 'r', encoding='utf-8-sig', newline='') as f:
+            indexes[name] = IntervalIndex(intervals(f.read()))
+    return indexes
+
+
+def write_indexes(path, indexes):
+    """Write indexes to a file: magic, a JSON header of their names and sizes, then each index's bytes"""
+    blobs = {name: index.to_bytes() for name, index in indexes.items()}
+    header = json.dumps({name: len(blob) for name, blob in blobs.items()}).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(INDEX_MAGIC + len(header).to_bytes(4, 'little') + header)
+        for blob in blobs.values():
+            f.write(blob)
+
+
+def read_indexes(path=INDEX_PATH):
+    """{dataset: IntervalIndex} of a file written by write_indexes()"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        raise ValueError(f"{path} is not a temporal index file")
+    position = len(INDEX_MAGIC) + 4
+    header_size = int.from_bytes(data[len(INDEX_MAGIC):position], 'little')
+    sizes = json.loads(data[position:position + header_size].decode('utf-8'))
+    position += header_size
+    indexes = {}
+    for name, size in sizes.items():
+        indexes[name] = IntervalIndex.from_bytes(data[position:position + size])
+        position += size
+    return indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the temporal index of the map's CSV files")
+    parser.add_argument("-o", "--output", default=INDEX_PATH, help="index file (default: %(default)s)")
+    parser.add_argument("--year", type=int, help="print how many rows of each file are shown in a year")
+    args = parser.parse_args()
+
+    indexes = build_indexes()
+    write_indexes(args.output, indexes)
+    print(f"Wrote {args.output}: {os.path.getsize(args.output)} bytes")
+    for name, index in indexes.items():
+        shown = f", {len(index.stab(args.year))} shown in {args.year}" if args.year is not None else ""
+        print(f"  {name}: {len(index)} intervals{shown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Windowed Treeview for large tables
+Only the rows in the viewport exist as Treeview items; scrolling re-fills those
+items from the backing rows, so opening a file costs the same at any size
+"""
+import tkinter as tk
+from tkinter import ttk
+from row_model import RowModel, RESET, UPDATE
+
+DEFAULT_ROW_HEIGHT = 20  # Treeview row height in pixels when the theme does not set one
+
+
+class RowWindow:
+    """Which slice of the rows is visible: first row, number of rows shown, total rows"""
+
+    def __init__(self, total=0, size=1):
+        self.total = total
+        self.size = max(1, size)
+        self.first = 0
+
+    def clamp(self):
+        """Keep the window inside the rows; returns the first visible row"""
+        self.first = max(0, min(self.first, self.total - self.size))
+        return self.first
+
+    def scroll(self, rows):
+        """Move the window by a number of rows (negative moves up)"""
+        self.first += rows
+        return self.clamp()
+
+    def moveto(self, fraction):
+        """Move the window so it starts at a fraction of the rows"""
+        self.first = int(round(float(fraction) * self.total))
+        return self.clamp()
+
+    def show(self, row):
+        """Move the window as little as possible so it contains a row"""
+        if row < self.first:
+            self.first = row
+        elif row >= self.first + self.size:
+            self.first = row - self.size + 1
+        return self.clamp()
+
+    def fractions(self):
+        """(top, bottom) of the visible rows as fractions, as scrollbars expect"""
+        if self.total <= self.size:
+            return 0.0, 1.0
+        return self.first / self.total, (self.first + self.size) / self.total
+
+
+class VirtualTable:
+    def __init__(self, parent, columns, model=None, line_numbers=True, **tree_options):
+        self.columns = columns
+        self.line_numbers = line_numbers  # First column shows the 1-based row number
+        self.model = model if model is not None else RowModel(columns[1:] if line_numbers else columns)
+        self.model.subscribe(self._on_model_change)
+        self.window = RowWindow()
+        self.selected_row = None  # Row index of the selection, kept while scrolling
+        self.order = None  # Rows shown, in display order (e.g. filtered); None shows all rows in order
+        self._order_positions = None  # Row -> display position in order, built when first needed
+        self._items = []  # Treeview items, top to bottom
+        self._positions = {}  # Item -> position in the window
+
+        self.tree = ttk.Treeview(parent, columns=columns, show='headings', **tree_options)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', lambda e: self._on_wheel(-1 if e.delta > 0 else 1))
+        self.tree.bind('<Button-4>', lambda e: self._on_wheel(-1))
+        self.tree.bind('<Button-5>', lambda e: self._on_wheel(1))
+        for key, step in [('<Up>', -1), ('<Down>', 1), ('<Prior>', 'page-up'), ('<Next>', 'page-down'),
+                          ('<Home>', 'home'), ('<End>', 'end')]:
+            self.tree.bind(key, lambda e, step=step: self._on_key(step))
+
+    @property
+    def rows(self):
+        return self.model.rows
+
+    def refresh(self):
+        """Re-read the visible rows after the backing rows changed"""
+        self.window.total = self.shown_count()
+        self.window.clamp()
+        self._render()
+
+    def set_order(self, order):
+        """Show only the given rows, in the given order; None shows every row"""
+        self.order = order
+        self._order_positions = None
+        self.window.first = 0
+        self.refresh()
+
+    def shown_count(self):
+        """Number of rows shown"""
+        return len(self.order) if self.order is not None else len(self.rows)
+
+    def row_at(self, position):
+        """Row shown at a display position"""
+        return self.order[position] if self.order is not None else position
+
+    def position_of(self, row):
+        """Display position of a row, or None if the order leaves it out"""
+        if self.order is None:
+            return row
+        if self._order_positions is None:
+            self._order_positions = {row: position for position, row in enumerate(self.order)}
+        return self._order_positions.get(row)
+
+    def refresh_row(self, row):
+        """Re-read one row, if it is visible"""
+        item = self.item_of(row)
+        if item is not None:
+            self.tree.item(item, values=self._values(row))
+
+    def row_of(self, item):
+        """Row index shown by a Treeview item, or None"""
+        position = self._positions.get(item)
+        if position is None:
+            return None
+        position += self.window.first
+        return self.row_at(position) if position < self.shown_count() else None
+
+    def item_of(self, row):
+        """Treeview item showing a row, or None when it is scrolled out of view"""
+        position = self.position_of(row)
+        if position is None or position >= self.shown_count():
+            return None
+        position -= self.window.first
+        if 0 <= position < len(self._items):
+            return self._items[position]
+        return None
+
+    def select(self, item):
+        """Select the row shown by a Treeview item"""
+        self.select_row(self.row_of(item))
+
+    def select_row(self, row, see=True):
+        """Select a row (None clears the selection), scrolling to it if asked"""
+        self.selected_row = row
+        first = self.window.first
+        position = self.position_of(row) if row is not None else None
+        if position is not None and see and self.window.show(position) != first:
+            self._render()
+        else:
+            self._show_selection()  # Nothing scrolled, the items keep their rows
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', count, 'units'|'pages')"""
+        if args[0] == 'moveto':
+            self.window.moveto(args[1])
+        elif args[0] == 'scroll':
+            count = int(args[1])
+            self.window.scroll(count * self.window.size if args[2] == 'pages' else count)
+        self._render()
+
+    def _on_model_change(self, kind, indices):
+        """Show model changes: a reset scrolls back to the top, updates touch visible rows only"""
+        if kind == RESET:
+            self.window.first = 0
+            self.selected_row = None
+            self.order = None
+            self._order_positions = None
+            self.refresh()
+        elif kind == UPDATE:
+            for row in indices:
+                self.refresh_row(row)
+        else:
+            # Rows added at the end change the scrollbar, and the view if it was short;
+            # with an order set they stay hidden until the order is set again
+            self.refresh()
+
+    def _values(self, row):
+        """Treeview values of a row"""
+        values = list(self.rows[row])
+        if self.line_numbers:
+            values.insert(0, row + 1)
+        return values
+
+    def _render(self):
+        """Fill the Treeview items with the visible rows and update the scrollbar"""
+        count = self.shown_count()
+        for position, item in enumerate(self._items):
+            position += self.window.first
+            self.tree.item(item, values=self._values(self.row_at(position)) if position < count else [])
+        self._show_selection()
+        self.scrollbar.set(*self.window.fractions())
+
+    def _show_selection(self):
+        """Select the item of the selected row, if it is visible"""
+        selected_item = self.item_of(self.selected_row) if self.selected_row is not None else None
+        self.tree.selection_set(selected_item or ())
+        if selected_item:
+            self.tree.focus(selected_item)
+
+    def _on_configure(self, event):
+        """Match the number of Treeview items to the rows that fit in the widget"""
+        row_height = int(float(ttk.Style().lookup('Treeview', 'rowheight') or DEFAULT_ROW_HEIGHT))
+        heading_height = row_height + 5
+        if self._items:
+            bbox = self.tree.bbox(self._items[0])
+            if bbox:
+                heading_height = bbox[1]
+        size = max(1, (event.height - heading_height) // row_height)
+
+        while len(self._items) < size:
+            item = self.tree.insert('', 'end', values=[])
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+        while len(self._items) > size:
+            item = self._items.pop()
+            del self._positions[item]
+            self.tree.delete(item)
+
+        self.window.size = size
+        self.window.clamp()
+        self._render()
+
+    def _on_wheel(self, direction):
+        """Scroll three rows per mouse wheel notch"""
+        self.window.scroll(3 * direction)
+        self._render()
+        return 'break'
+
+    def _on_key(self, step):
+        """Move the selection with the arrow, page and home/end keys"""
+        count = self.shown_count()
+        if not count:
+            return 'break'
+        position = self.position_of(self.selected_row) if self.selected_row is not None else None
+        if position is None:
+            position = self.window.first
+        if step == 'home':
+            position = 0
+        elif step == 'end':
+            position = count - 1
+        elif step == 'page-up':
+            position -= self.window.size
+        elif step == 'page-down':
+            position += self.window.size
+        else:
+            position += step
+        self.select_row(self.row_at(max(0, min(position, count - 1))))
+        return 'break'
@@ -6,12 +6,20 @@ This script searches for real historical data and adds it to kehilot.csv
 
 import csv
 import shutil
-import requests
+import argparse
+import itertools
+from export import export_file
+from build_shards import refresh_shards
+from snapshot import load_tables
+from spatial_index import SpatialIndex
 from bs4 import BeautifulSoup
 import time
 import re
 from datetime import datetime
 
+NEARBY_KM = 5  # A known community this close may be the same town under another spelling
+NEARBY_REPORT = 'near_duplicates_{timestamp}.csv'  # Cities added near known communities, for review
+
 def backup_csv():
     """Create backup of original CSV"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -20,12 +28,8 @@ def backup_csv():
     print(f"Created backup: {backup_name}")
 
 def load_existing_data():
-    """Load existing CSV data"""
-    with open('../kehilot.csv', 'r', encoding='utf-8-sig') as file:
-        reader = csv.DictReader(file)
-        fieldnames = reader.fieldnames
-        existing_data = list(reader)
-    return fieldnames, existing_data
+    """Load existing CSV data (from the snapshot while kehilot.csv is unchanged)"""
+    return load_tables()['kehilot']
 
 def search_jewish_population_data(city, country):
     """Search for historical Jewish population data for a city"""
@@ -40,7 +44,7 @@ def search_jewish_population_data(city, country):
     ]
     
     # This is a placeholder - in a real implementation, you would:
-    # 1. Use a web scraping library to search Google or other sources
+    # 1. Fetch pages through the shared client (http_client.get_client().get(url)) to search Google or other sources
     # 2. Parse results from Jewish Virtual Library, JewishGen, etc.
     # 3. Extract population figures from the results
     
@@ -159,12 +163,28 @@ def create_community_entries(city, country, lat, lon, year_estab, hebrew_name=""
     
     return entries
 
-def add_communities_from_web():
-    """Add communities with web-searched data"""
+def write_nearby_report(nearby_cities):
+    """Write the cities found near a known community to a CSV file to review by hand"""
+    report_name = NEARBY_REPORT.format(timestamp=datetime.now().strftime("%Y%m%d_%H%M%S"))
+    with open(report_name, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['city', 'country', 'nearby_city', 'nearby_country', 'distance_km', 'added'])
+        writer.writerows(nearby_cities)
+    print(f"\n{len(nearby_cities)} cities are within {NEARBY_KM} km of a known community, "
+          f"listed for review in {report_name}")
+
+def add_communities_from_web(skip_nearby=False):
+    """Add communities with web-searched data
+
+    A city near a known community may be that community under another spelling,
+    or a real neighbour (Buda and Pest, Kazimierz and Kraków). It is added and
+    listed in a report for review; with skip_nearby it is left out instead.
+    """
     
     # Load existing data
-    fieldnames, existing_data = load_existing_data()
-    print(f"Loaded {len(existing_data)} existing communities")
+    dataset = load_existing_data()
+    print(f"Loaded {len(dataset)} existing communities")
+    spatial_index = SpatialIndex(dataset)
     
     # Major European cities to add with real historical data
     cities_to_add = [
@@ -203,18 +223,30 @@ def add_communities_from_web():
     ]
     
     new_entries = []
+    nearby_cities = []  # Rows of the review report
     
     for city_info in cities_to_add:
         print(f"\nProcessing {city_info['city']}, {city_info['country']}...")
         
         # Check if city already exists
-        city_exists = any(entry['city'] == city_info['city'] and entry['country'] == city_info['country'] 
-                         for entry in existing_data)
+        city_exists = bool(dataset.select(dataset.equals('city', city_info['city']),
+                                          dataset.equals('country', city_info['country'])))
         
         if city_exists:
             print(f"  {city_info['city']} already exists, skipping...")
             continue
         
+        nearby = spatial_index.nearest(city_info['lat'], city_info['lon'], max_km=NEARBY_KM)
+        if nearby:
+            distance, row = nearby[0]
+            nearby_city = dataset.column('city')[row]
+            nearby_cities.append([city_info['city'], city_info['country'], nearby_city,
+                                  dataset.column('country')[row], f'{distance:.1f}', 'no' if skip_nearby else 'yes'])
+            if skip_nearby:
+                print(f"  {nearby_city} is {distance:.1f} km away, maybe the same town, skipping...")
+                continue
+            print(f"  {nearby_city} is {distance:.1f} km away, maybe the same town, adding it for review...")
+        
         # Create entries for this city
         entries = create_community_entries(
             city_info['city'], city_info['country'], 
@@ -229,21 +261,23 @@ def add_communities_from_web():
             print(f"  No data found for {city_info['city']}")
     
     if new_entries:
-        # Combine existing and new data
-        all_data = existing_data + new_entries
-        
-        # Write updated CSV
-        with open('../kehilot.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(all_data)
+        # Write updated CSV: the existing rows as they were, then the new ones
+        export_file('../kehilot.csv', itertools.chain(dataset.text_rows(), new_entries), dataset.columns)
+        refresh_shards('../kehilot.csv')  # Shards of the map's timeline
         
         print(f"\n✅ Added {len(new_entries)} new entries")
-        print(f"Total communities: {len(all_data)}")
+        print(f"Total communities: {len(dataset) + len(new_entries)}")
     else:
         print("\nNo new data to add.")
+    if nearby_cities:
+        write_nearby_report(nearby_cities)
 
 def main():
+    parser = argparse.ArgumentParser(description="Add historical Jewish population data to kehilot.csv")
+    parser.add_argument("--skip-nearby", action="store_true",
+                        help=f"leave out cities within {NEARBY_KM} km of a known community instead of adding them for review")
+    args = parser.parse_args()
+    
     print("WEB-BASED JEWISH POPULATION DATA COLLECTOR")
     print("=" * 50)
     print("\nThis script adds real historical Jewish population data")
@@ -259,7 +293,7 @@ def main():
     
     if choice == "1":
         backup_csv()
-        add_communities_from_web()
+        add_communities_from_web(skip_nearby=args.skip_nearby)
     elif choice == "2":
         city = input("Enter city name: ").strip()
         country = input("Enter country: ").strip()